@@ -0,0 +1,40 @@
+import itertools
+import threading
+
+class Activity:
+    """Реестр фоновой работы для строки состояния
+
+    Фоновый код регистрирует задачу и обновляет ее описание, интерфейс
+    периодически забирает snapshot() и показывает его пользователю.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._tasks = {}
+
+    def start(self, text):
+        """Зарегистрировать задачу и вернуть ее идентификатор"""
+        task_id = next(self._ids)
+        with self._lock:
+            self._tasks[task_id] = text
+        return task_id
+
+    def update(self, task_id, text):
+        """Обновить описание задачи"""
+        with self._lock:
+            if task_id in self._tasks:
+                self._tasks[task_id] = text
+
+    def finish(self, task_id):
+        """Убрать задачу из реестра"""
+        with self._lock:
+            self._tasks.pop(task_id, None)
+
+    def snapshot(self):
+        """Описания текущих задач в порядке регистрации"""
+        with self._lock:
+            return [self._tasks[task_id] for task_id in sorted(self._tasks)]
+
+# Общий реестр программы
+activity = Activity()
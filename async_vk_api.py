@@ -0,0 +1,558 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from config import (
+    KATE_USER_AGENT,
+    VK_API_URL,
+    VK_API_VERSION,
+    CDN_HEADERS,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    AUDIO_PAGE_SIZE,
+    AUDIO_PAGE_WORKERS,
+    FRIENDS_PAGE_SIZE,
+    API_RATE_LIMIT,
+    API_RATE_BURST,
+    API_MAX_RETRIES,
+    API_BACKOFF_BASE,
+    API_BACKOFF_MAX,
+    CACHE_TTLS,
+    ASYNC_CONNECTION_LIMIT,
+    ASYNC_CONNECTIONS_PER_HOST,
+    URL_REFRESH_BATCH,
+    URL_EXPIRED_STATUSES
+)
+from errors import (
+    VKAPIError,
+    VKNetworkError,
+    VKTimeoutError,
+    VKHTTPError,
+    DownloadError,
+    make_api_error,
+    is_retryable
+)
+from metrics import APIMetrics
+from ratelimit import TokenBucket
+from ledger import track_key
+from resumable import part_paths, load_state, save_state, STATE_SAVE_INTERVAL
+from vk_api import clean_filename
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+class AsyncVKMusicManager:
+    """Асинхронный вариант VKMusicManager для массовой загрузки библиотек
+
+    Повторяет основные методы VKMusicManager и возвращает результаты в том же
+    формате. Работает поверх aiohttp с ограничением числа соединений, общим
+    с синхронным менеджером ограничителем частоты запросов и статистикой.
+    """
+
+    def __init__(self, token=None, user_id=None, headers=None, metrics=None, rate_limiter=None, cache=None,
+                 ledger=None, links=None, connection_limit=ASYNC_CONNECTION_LIMIT, connections_per_host=ASYNC_CONNECTIONS_PER_HOST):
+        if aiohttp is None:
+            raise ImportError("Для асинхронного режима установите библиотеку aiohttp: pip install aiohttp")
+
+        self.token = token
+        self.user_id = user_id
+        self.headers = headers or {'User-Agent': KATE_USER_AGENT}
+        self.metrics = metrics or APIMetrics()
+        self.rate_limiter = rate_limiter or TokenBucket(API_RATE_LIMIT, API_RATE_BURST)
+        self.cache = cache
+        self.ledger = ledger
+        # LinkRefresher синхронного менеджера: обновление устаревших ссылок
+        self.links = links
+        self.max_retries = API_MAX_RETRIES
+        self.connection_limit = connection_limit
+        self.connections_per_host = connections_per_host
+        self._session = None
+        # Имена файлов, выбранные для идущих загрузок
+        self._reserved_paths = set()
+
+    @classmethod
+    def from_manager(cls, manager, **kwargs):
+        """Создать асинхронный менеджер с токеном, лимитами и статистикой синхронного"""
+        return cls(
+            token=manager.token,
+            user_id=manager.user_id,
+            headers=manager.headers,
+            metrics=manager.metrics,
+            rate_limiter=manager.rate_limiter,
+            cache=manager.cache,
+            ledger=manager.ledger,
+            links=manager.links,
+            **kwargs
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def _get_session(self):
+        """Создать сессию aiohttp при первом запросе (внутри цикла событий)"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.connection_limit,
+                limit_per_host=self.connections_per_host
+            )
+            timeout = aiohttp.ClientTimeout(sock_connect=HTTP_CONNECT_TIMEOUT, sock_read=HTTP_READ_TIMEOUT)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout, headers=self.headers)
+        return self._session
+
+    async def close(self):
+        """Закрыть все соединения"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def call(self, method, **params):
+        """Вызвать метод VK API и вернуть содержимое поля response"""
+        key = None
+        if self.cache is not None and method in CACHE_TTLS:
+            key = self.cache.make_key(method, params, self.user_id)
+            cached = self.cache.get(key)
+            if cached is not None and time.time() - cached[1] < CACHE_TTLS[method]:
+                self.cache.count("hits")
+                return cached[0]
+            self.cache.count("misses")
+
+        attempt = 0
+        while True:
+            delay = self.rate_limiter.reserve()
+            if delay > 0:
+                self.metrics.increment("throttled")
+                self.metrics.increment("throttle_wait", delay)
+                await asyncio.sleep(delay)
+
+            try:
+                response = (await self._send_request(method, params))["response"]
+                break
+            except VKAPIError as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = min(API_BACKOFF_MAX, API_BACKOFF_BASE * 2 ** attempt)
+                delay = delay / 2 + random.uniform(0, delay / 2)
+                attempt += 1
+                self.metrics.increment("retried")
+                logger.info("%s: %s, повтор %d через %.1f с", method, e, attempt, delay)
+                await asyncio.sleep(delay)
+
+        if key is not None:
+            self.cache.set(key, method, response)
+        return response
+
+    async def _send_request(self, method, params):
+        """Одна попытка запроса к VK API с записью статистики"""
+        request_params = {
+            "access_token": self.token,
+            "v": VK_API_VERSION
+        }
+        request_params.update({key: str(value) for key, value in params.items() if value is not None})
+
+        started = time.monotonic()
+        size = 0
+        status = "ok"
+        try:
+            try:
+                async with self._get_session().get(VK_API_URL + method, params=request_params) as response:
+                    body = await response.read()
+                    size = len(body)
+                    if response.status >= 500:
+                        raise VKHTTPError(response.status, method)
+                    data = await response.json(content_type=None)
+            except asyncio.TimeoutError as e:
+                raise VKTimeoutError(f"Таймаут при подключении к VK: {e}", method) from e
+            except aiohttp.ClientError as e:
+                raise VKNetworkError(f"Ошибка запроса: {e}", method) from e
+            except ValueError as e:
+                raise VKNetworkError(f"Некорректный ответ сервера: {e}", method) from e
+
+            if "error" in data:
+                raise make_api_error(data["error"], method)
+            if "response" not in data:
+                raise VKNetworkError("Ответ сервера не содержит данных", method)
+
+            return data
+        except VKAPIError as e:
+            status = e.error_code or "network"
+            raise
+        finally:
+            self.metrics.record(method, time.monotonic() - started, size, status)
+
+    async def get_audio(self, owner_id, album_id=None, access_key=None,
+                        page_size=AUDIO_PAGE_SIZE, max_workers=AUDIO_PAGE_WORKERS, first_page=None):
+        """Получить все аудиозаписи владельца, запрашивая страницы параллельно
+
+        Уже полученную первую страницу можно передать в first_page.
+        """
+        params = {
+            "owner_id": owner_id,
+            "album_id": album_id,
+            "access_key": access_key,
+            "count": page_size
+        }
+        if first_page is None:
+            first_page = await self.call("audio.get", offset=0, **params)
+        total = first_page.get("count", 0)
+        items = list(first_page.get("items", []))
+        if not items or len(items) >= total:
+            return items
+
+        semaphore = asyncio.Semaphore(max(1, max_workers))
+
+        async def get_page(offset):
+            async with semaphore:
+                page = await self.call("audio.get", offset=offset, **params)
+                return page.get("items", [])
+
+        pages = await asyncio.gather(*(get_page(offset) for offset in range(len(items), total, page_size)))
+        for page in pages:
+            items.extend(page)
+        return items
+
+    async def get_friends_list(self):
+        """Получить список друзей"""
+        if not self.token or not self.user_id:
+            return {"success": False, "error": "Токен не установлен или user_id не определен"}
+
+        try:
+            friends = []
+            while True:
+                response = await self.call(
+                    "friends.get",
+                    count=FRIENDS_PAGE_SIZE,
+                    offset=len(friends),
+                    fields="first_name,last_name,photo_100",
+                    order="name"
+                )
+                friends.extend(response["items"])
+                if not response["items"] or len(friends) >= response["count"]:
+                    break
+            return {"success": True, "friends": friends}
+        except VKAPIError as e:
+            return {"success": False, "error": e.error_msg}
+
+    async def get_friend_audio_list(self, friend_id):
+        """Получить список аудиозаписей друга"""
+        if not self.token:
+            return {"success": False, "error": "Токен не установлен"}
+
+        try:
+            return {"success": True, "audio_list": await self.get_audio(friend_id)}
+        except VKAPIError as e:
+            return {"success": False, "error": e.error_msg}
+
+    async def get_playlists_with_access(self):
+        """Получить плейлисты с дополнительной информацией"""
+        if not self.token or not self.user_id:
+            return {"success": False, "error": "Токен не установлен или user_id не определен"}
+
+        try:
+            response = await self.call("audio.getPlaylists", owner_id=self.user_id, count=100, extended=1)
+        except VKAPIError as e:
+            return {"success": False, "error": e.error_msg}
+
+        playlists = response["items"]
+        playlist_info = []
+        for playlist in playlists:
+            playlist_info.append({
+                'id': playlist.get('id'),
+                'owner_id': playlist.get('owner_id'),
+                'title': playlist.get('title', f'Плейлист #{playlist.get("id")}'),
+                'description': playlist.get('description', ''),
+                'count': playlist.get('count', 0),
+                'followers': playlist.get('followers', 0),
+                'access_key': playlist.get('access_key', ''),
+                'url': f"https://vk.com/music/playlist/{playlist.get('owner_id')}_{playlist.get('id')}"
+            })
+
+        return {"success": True, "playlists": playlist_info, "raw_data": playlists}
+
+    async def get_playlist_tracks(self, playlist_id, owner_id=None, access_key=None, strategy=None):
+        """Получить треки из плейлиста
+
+        strategy - способ открытия, сработавший для плейлиста раньше
+        ("album", "access_key" или "filter"). Если он неизвестен или больше
+        не работает, первые страницы способов с album_id запрашиваются
+        одновременно, а остальные страницы - только у сработавшего.
+        В результате возвращается и сработавший способ (strategy).
+        """
+        if not self.token:
+            return {"success": False, "error": "Токен не установлен"}
+
+        if owner_id is None:
+            owner_id = self.user_id
+
+        params = {
+            "album": {"album_id": playlist_id},
+            "access_key": {"album_id": playlist_id, "access_key": access_key},
+        }
+
+        async def get_tracks(**extra):
+            # Ошибка API означает, что подход не сработал; сетевые ошибки пробрасываем
+            try:
+                return await self.get_audio(owner_id, **extra)
+            except VKNetworkError:
+                raise
+            except VKAPIError:
+                return []
+
+        async def probe(name):
+            # Только первая страница: ее хватает, чтобы понять, сработал ли способ
+            try:
+                page = await self.call("audio.get", offset=0, owner_id=owner_id, album_id=playlist_id,
+                                       access_key=params[name].get("access_key"), count=AUDIO_PAGE_SIZE)
+            except VKNetworkError:
+                raise
+            except VKAPIError:
+                page = None
+            return name, page
+
+        try:
+            if strategy in params and (strategy != "access_key" or access_key):
+                tracks = await get_tracks(**params[strategy])
+                if tracks:
+                    return {"success": True, "audio_list": tracks, "strategy": strategy}
+
+            if strategy != "filter":
+                candidates = [asyncio.ensure_future(probe(name)) for name in params if name != "access_key" or access_key]
+                try:
+                    for next_done in asyncio.as_completed(candidates):
+                        name, page = await next_done
+                        if page and page.get("items"):
+                            tracks = await self.get_audio(owner_id, first_page=page, **params[name])
+                            return {"success": True, "audio_list": tracks, "strategy": name}
+                finally:
+                    for candidate in candidates:
+                        candidate.cancel()
+
+            tracks = [
+                track for track in await get_tracks()
+                if str(track.get('album_id', '')) == str(playlist_id)
+            ]
+            return {"success": True, "audio_list": tracks, "strategy": "filter" if tracks else None}
+        except VKAPIError as e:
+            return {"success": False, "error": e.error_msg}
+
+    async def search_audio(self, query):
+        """Поиск музыки"""
+        if not self.token:
+            return {"success": False, "error": "Токен не установлен"}
+
+        try:
+            response = await self.call("audio.search", q=query, count=100, auto_complete=1)
+            return {
+                "success": True,
+                "results": response["items"],
+                "total_count": response["count"]
+            }
+        except VKAPIError as e:
+            return {"success": False, "error": e.error_msg}
+
+    async def download_file(self, url, filename, key=None):
+        """Скачать файл с докачкой после обрыва - как resumable.download_file
+
+        Данные пишутся в <filename>.part с состоянием в <filename>.part.json,
+        прерванная загрузка продолжается запросом Range, а в итоговый файл
+        .part переименовывается, только когда получен весь объем. key -
+        ключ трека, он сохраняется в состоянии, чтобы недокачанный файл
+        не достался другому треку с тем же именем.
+        Возвращает размер файла, при ошибке бросает DownloadError.
+        """
+        part_path, state_path = part_paths(filename)
+        state = load_state(state_path) if os.path.exists(part_path) else None
+        offset = os.path.getsize(part_path) if state else 0
+
+        # Без валидатора докачка безопасна только с той же ссылки
+        validator = state and (state.get("etag") or state.get("last_modified"))
+        if state and not validator and state.get("url") != url:
+            offset = 0
+
+        headers = dict(CDN_HEADERS, **{'Accept-Encoding': 'identity'})
+        if offset:
+            headers['Range'] = f"bytes={offset}-"
+            if validator:
+                headers['If-Range'] = validator
+
+        try:
+            async with self._get_session().get(url, headers=headers) as response:
+                if response.status == 416:
+                    if state and offset == state.get("total"):
+                        os.replace(part_path, filename)
+                        os.remove(state_path)
+                        return offset
+                    # Недокачанный файл не соответствует серверному - начинаем заново
+                    os.remove(part_path)
+                    os.remove(state_path)
+                    return await self.download_file(url, filename, key)
+
+                if response.status == 206:
+                    content_range = response.headers.get('content-range', '')
+                    if not content_range.startswith(f"bytes {offset}-"):
+                        raise DownloadError(f"Сервер вернул неожиданный диапазон: {content_range}", 206)
+                    total = int(content_range.rsplit('/', 1)[-1]) if not content_range.endswith('/*') else None
+                    mode = 'ab'
+                elif response.status == 200:
+                    offset = 0
+                    length = response.headers.get('content-length')
+                    total = int(length) if length else None
+                    mode = 'wb'
+                else:
+                    raise DownloadError(f"Ошибка HTTP: {response.status}", response.status)
+
+                previous = state if mode == 'ab' else {}
+                state = {
+                    "url": url,
+                    "track": key,
+                    "etag": response.headers.get('etag') or previous.get("etag"),
+                    "last_modified": response.headers.get('last-modified') or previous.get("last_modified"),
+                    "total": total,
+                    "received": offset
+                }
+                save_state(state_path, state)
+
+                received = offset
+                saved_at = offset
+                try:
+                    with open(part_path, mode) as f:
+                        async for chunk in response.content.iter_chunked(65536):
+                            f.write(chunk)
+                            received += len(chunk)
+                            if received - saved_at >= STATE_SAVE_INTERVAL:
+                                state["received"] = received
+                                save_state(state_path, state)
+                                saved_at = received
+                finally:
+                    state["received"] = received
+                    save_state(state_path, state)
+
+            if total is not None and received != total:
+                raise DownloadError(f"Загрузка прервана: получено {received} из {total} байт")
+
+            os.replace(part_path, filename)
+            os.remove(state_path)
+            return received
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise DownloadError(f"Ошибка соединения: {e}") from e
+        except OSError as e:
+            raise DownloadError(f"Ошибка записи файла: {e}") from e
+
+    async def fetch_track(self, track, filename, neighbours=()):
+        """Скачать трек, обновляя устаревшую ссылку - как VKMusicManager.fetch_track"""
+        loop = asyncio.get_running_loop()
+        if self.links:
+            # audio.getById идет через синхронный клиент - не в цикле событий
+            await loop.run_in_executor(None, self.links.ensure_fresh, track, neighbours)
+        track_url = track.get('url')
+        try:
+            return await self.download_file(track_url, filename, track_key(track))
+        except DownloadError as e:
+            if not self.links or e.status_code not in URL_EXPIRED_STATUSES:
+                raise
+            batch = [track] + list(neighbours)[:self.links.batch_size - 1]
+            await loop.run_in_executor(None, self.links.refresh, batch)
+            if track.get('url') == track_url:
+                raise
+            return await self.download_file(track['url'], filename, track_key(track))
+
+    def _reserve_path(self, name, download_dir, key):
+        """Выбрать имя файла, не занятое другими загрузками
+
+        Занятым считается и имя с недокачанным .part другого трека; свой
+        .part (того же key) остается за треком для докачки. Между проверкой
+        и резервированием нет await, поэтому блокировка не нужна.
+        """
+        base = os.path.join(download_dir, clean_filename(name))
+        filepath = f"{base}.mp3"
+        counter = 1
+        while filepath in self._reserved_paths or os.path.exists(filepath) or self._part_taken(filepath, key):
+            filepath = f"{base}_{counter}.mp3"
+            counter += 1
+        self._reserved_paths.add(filepath)
+        return filepath
+
+    @staticmethod
+    def _part_taken(filepath, key):
+        """Недокачанный файл по этому пути принадлежит другому треку"""
+        part_path, state_path = part_paths(filepath)
+        if not os.path.exists(part_path):
+            return False
+        state = load_state(state_path) or {}
+        return not key or state.get("track") != key
+
+    async def download_track_with_name(self, track, download_dir="downloads", neighbours=()):
+        """Скачать трек с именем "Исполнитель - Название.mp3"
+
+        В отличие от синхронной версии ничего не спрашивает: если файл
+        уже существует, к имени добавляется номер. Прерванная загрузка
+        продолжается с места остановки, устаревшая ссылка обновляется.
+        """
+        track_url = track.get('url') if track else None
+        if not track_url:
+            return {"success": False, "error": "У трека нет ссылки для скачивания"}
+
+        artist = track.get('artist', 'Unknown Artist')
+        title = track.get('title', 'Unknown Title')
+        os.makedirs(download_dir, exist_ok=True)
+
+        filepath = self._reserve_path(f"{artist} - {title}", download_dir, track_key(track))
+        try:
+            size = await self.fetch_track(track, filepath, neighbours)
+        except DownloadError as e:
+            # Недокачанный .part остается на диске для докачки при следующем запуске
+            return {"success": False, "error": e.reason}
+        finally:
+            self._reserved_paths.discard(filepath)
+
+        if self.ledger:
+            # Хэширование файла не должно блокировать цикл событий
+            await asyncio.get_running_loop().run_in_executor(None, self.ledger.record, track, filepath)
+        return {"success": True, "path": filepath, "bytes": size}
+
+    async def mirror_libraries(self, owner_ids, download_dir="downloads", concurrency=ASYNC_CONNECTIONS_PER_HOST):
+        """Скачать библиотеки нескольких владельцев в подпапки download_dir
+
+        Треки из журнала загрузок пропускаются. Возвращает словарь
+        owner_id -> {"tracks", "downloaded", "existing", "failed", "error"}.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def download(track, owner_dir, neighbours):
+            async with semaphore:
+                return await self.download_track_with_name(track, owner_dir, neighbours)
+
+        async def mirror(owner_id):
+            audio_result = await self.get_friend_audio_list(owner_id)
+            if not audio_result["success"]:
+                return owner_id, {"tracks": 0, "downloaded": 0, "existing": 0, "failed": 0,
+                                  "error": audio_result["error"]}
+
+            owner_dir = os.path.join(download_dir, str(owner_id))
+            tracks = audio_result["audio_list"]
+            existing = self.ledger.lookup(tracks) if self.ledger else {}
+            pending = [track for track in tracks if track_key(track) not in existing]
+            if self.links:
+                # Истекшие и истекающие ссылки обновляем заранее пачками
+                await asyncio.get_running_loop().run_in_executor(None, self.links.refresh_expiring, pending)
+            # Вместе с устаревшей ссылкой обновляются ссылки следующих треков
+            results = await asyncio.gather(*(
+                download(track, owner_dir, pending[i + 1:i + URL_REFRESH_BATCH])
+                for i, track in enumerate(pending)
+            ))
+            downloaded = sum(1 for result in results if result["success"])
+            return owner_id, {
+                "tracks": len(tracks),
+                "downloaded": downloaded,
+                "existing": len(tracks) - len(pending),
+                "failed": len(pending) - downloaded,
+                "error": None
+            }
+
+        return dict(await asyncio.gather(*(mirror(owner_id) for owner_id in owner_ids)))
@@ -0,0 +1,144 @@
+import logging
+import os
+import shutil
+import threading
+import time
+from config import AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_BYTES
+from errors import DownloadError
+from ledger import track_key
+
+logger = logging.getLogger(__name__)
+
+class AudioCache:
+    """Кэш аудиофайлов на диске, ключ - owner_id_id трека
+
+    Размер ограничен max_bytes, при превышении удаляются давно не
+    проигрывавшиеся файлы. Время последнего использования хранится
+    в mtime файла, поэтому кэш переживает перезапуск программы.
+    """
+
+    def __init__(self, directory=AUDIO_CACHE_DIR, max_bytes=AUDIO_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.total_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "bytes_saved": 0}
+
+        try:
+            os.makedirs(directory, exist_ok=True)
+            for name in os.listdir(directory):
+                if name.endswith(".mp3"):
+                    stat = os.stat(os.path.join(directory, name))
+                    self._entries[name[:-4]] = (stat.st_size, stat.st_mtime)
+                    self.total_bytes += stat.st_size
+        except OSError as e:
+            logger.warning("Не удалось открыть кэш аудио %s: %s", directory, e)
+
+    def path_for(self, track):
+        """Путь к файлу трека в кэше (файла может еще не быть) или None"""
+        key = track_key(track)
+        return os.path.join(self.directory, f"{key}.mp3") if key else None
+
+    def get(self, track):
+        """Путь к закэшированному файлу трека или None"""
+        key = track_key(track)
+        with self._lock:
+            entry = self._entries.get(key) if key else None
+            path = self.path_for(track) if entry else None
+            if path and not os.path.exists(path):
+                # Файл удалили снаружи
+                self._entries.pop(key)
+                self.total_bytes -= entry[0]
+                path = None
+
+            if path is None:
+                self.stats["misses"] += 1
+                return None
+
+            self.stats["hits"] += 1
+            self.stats["bytes_saved"] += entry[0]
+            now = time.time()
+            self._entries[key] = (entry[0], now)
+
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+        return path
+
+    def has(self, track):
+        """Есть ли трек в кэше (без учета в статистике)"""
+        key = track_key(track)
+        with self._lock:
+            return key is not None and key in self._entries
+
+    def add(self, track):
+        """Учесть файл, записанный по path_for(track), и вытеснить лишнее"""
+        key = track_key(track)
+        path = self.path_for(track)
+        try:
+            size = os.path.getsize(path)
+        except (OSError, TypeError):
+            return
+
+        with self._lock:
+            old = self._entries.get(key)
+            if old:
+                self.total_bytes -= old[0]
+            self._entries[key] = (size, time.time())
+            self.total_bytes += size
+            self._evict(keep=key)
+
+    def download(self, vk_manager, track, progress=None):
+        """Скачать трек в кэш и вернуть путь; при ошибке бросает DownloadError"""
+        path = self.path_for(track)
+        if path is None:
+            raise DownloadError("У трека нет идентификатора")
+        vk_manager.fetch_track(track, path, progress)
+        self.add(track)
+        return path
+
+    def fetch(self, vk_manager, track, progress=None):
+        """Путь к файлу трека: из кэша или после загрузки в кэш"""
+        return self.get(track) or self.download(vk_manager, track, progress)
+
+    def _evict(self, keep=None):
+        """Удалять давно не использованные файлы, пока кэш больше лимита"""
+        while self.total_bytes > self.max_bytes:
+            candidates = [key for key in self._entries if key != keep]
+            if not candidates:
+                break
+            key = min(candidates, key=lambda k: self._entries[k][1])
+            size, _ = self._entries.pop(key)
+            self.total_bytes -= size
+            self.stats["evictions"] += 1
+            try:
+                os.remove(os.path.join(self.directory, f"{key}.mp3"))
+            except OSError:
+                pass
+
+    def summary(self):
+        """Сводка по кэшу: счетчики, число файлов, размер и доля попаданий"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self.total_bytes
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+def export_file(source_path, filepath, keep_source=False):
+    """Перенести файл в папку загрузок без копирования данных
+
+    Файл из кэша (keep_source) выносится жесткой ссылкой, остальные
+    переименовываются. Копия делается, только если это невозможно
+    (например, другой диск).
+    """
+    if keep_source:
+        try:
+            os.link(source_path, filepath)
+        except OSError:
+            shutil.copy2(source_path, filepath)
+    else:
+        shutil.move(source_path, filepath)
@@ -0,0 +1,113 @@
+import json
+import threading
+import time
+from concurrent.futures import Future
+from config import EXECUTE_MAX_CALLS, EXECUTE_MAX_DELAY
+from errors import VKAPIError, make_api_error
+
+class VKBatcher:
+    """Объединяет независимые вызовы API в запросы execute
+
+    Вызовы копятся в очереди и отправляются фоновым потоком одним запросом,
+    как только набралось max_calls вызовов или с момента первого вызова
+    в очереди прошло max_delay секунд. Результат каждого вызова приходит
+    в его Future (или в колбэк через add_done_callback).
+    """
+
+    def __init__(self, manager, max_calls=EXECUTE_MAX_CALLS, max_delay=EXECUTE_MAX_DELAY):
+        self.manager = manager
+        self.max_calls = max_calls
+        self.max_delay = max_delay
+
+        self._queue = []
+        self._deadline = None
+        self._flush_requested = False
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def submit(self, method, **params):
+        """Поставить вызов в очередь и вернуть Future с его результатом"""
+        future = Future()
+        params = {key: value for key, value in params.items() if value is not None}
+
+        with self._cond:
+            self._queue.append((method, params, future))
+            if self._deadline is None:
+                self._deadline = time.monotonic() + self.max_delay
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="vk-batcher", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+        return future
+
+    def flush(self):
+        """Отправить накопленные вызовы, не дожидаясь таймаута"""
+        with self._cond:
+            if self._queue:
+                self._flush_requested = True
+                self._cond.notify()
+
+    def _run(self):
+        """Цикл фонового потока: ждать заполнения пакета или таймаута и отправлять"""
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+
+                while len(self._queue) < self.max_calls and not self._flush_requested:
+                    remaining = self._deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+                batch = self._queue[:self.max_calls]
+                del self._queue[:self.max_calls]
+
+                if self._queue:
+                    self._deadline = time.monotonic() + self.max_delay
+                else:
+                    self._deadline = None
+                    self._flush_requested = False
+
+            self._send(batch)
+
+    def _send(self, batch):
+        """Отправить пакет и разложить ответы по Future"""
+        # Одиночный вызов выгоднее отправить напрямую, без execute
+        if len(batch) == 1:
+            method, params, future = batch[0]
+            try:
+                future.set_result(self.manager.call(method, **params))
+            except Exception as e:
+                future.set_exception(e)
+            return
+
+        code = "return [" + ",".join(
+            f"API.{method}({json.dumps(params, ensure_ascii=False)})"
+            for method, params, _ in batch
+        ) + "];"
+
+        try:
+            results, errors = self.manager.execute(code)
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        # Для неудачных вызовов VK возвращает false, а ошибки перечисляет
+        # в execute_errors в том же порядке
+        errors = iter(errors)
+        for (method, _, future), result in zip(batch, results):
+            if result is False:
+                error = next(errors, None)
+                if error is not None:
+                    future.set_exception(make_api_error(error, method))
+                else:
+                    future.set_exception(VKAPIError(0, "Неизвестная ошибка", method))
+            else:
+                future.set_result(result)
+
+        for method, _, future in batch[len(results):]:
+            future.set_exception(VKAPIError(0, "Нет ответа в результате execute", method))
@@ -0,0 +1,110 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from config import CACHE_DB_FILE, CACHE_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """Кэш ответов VK API на диске (SQLite) с ограничением размера и вытеснением LRU"""
+
+    def __init__(self, path=CACHE_DB_FILE, max_bytes=CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "evictions": 0, "revalidations": 0}
+
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+        except (OSError, sqlite3.Error) as e:
+            # Без доступа к диску работаем с кэшем в памяти
+            logger.warning("Не удалось открыть кэш %s: %s", path, e)
+            self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, method TEXT, value TEXT, size INTEGER, "
+                "created REAL, accessed REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            self._conn.commit()
+            self.total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(method, params, user_id):
+        """Ключ кэша: метод, нормализованные параметры и пользователь"""
+        normalized = {
+            key: str(value)
+            for key, value in params.items()
+            if value is not None and key not in ("access_token", "v")
+        }
+        return f"{user_id}:{method}:{json.dumps(normalized, sort_keys=True, ensure_ascii=False)}"
+
+    def get(self, key):
+        """Получить (значение, время создания) или None"""
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return json.loads(row[0]), row[1]
+
+    def set(self, key, method, value):
+        """Сохранить ответ и при необходимости вытеснить старые записи"""
+        data = json.dumps(value, ensure_ascii=False)
+        size = len(data.encode("utf-8"))
+        now = time.time()
+
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if old is not None:
+                self.total_bytes -= old[0]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, method, value, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, method, data, size, now, now)
+            )
+            self.total_bytes += size
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Удалять давно не использованные записи, пока кэш больше лимита"""
+        while self.total_bytes > self.max_bytes:
+            row = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY accessed LIMIT 1"
+            ).fetchone()
+            if row is None:
+                self.total_bytes = 0
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (row[0],))
+            self.total_bytes -= row[1]
+            self.stats["evictions"] += 1
+
+    def count(self, name):
+        """Увеличить счетчик статистики"""
+        with self._lock:
+            self.stats[name] += 1
+
+    def clear(self):
+        """Очистить кэш"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self.total_bytes = 0
+
+    def summary(self):
+        """Сводка по кэшу: счетчики, число записей и размер"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+        stats["entries"] = entries
+        stats["bytes"] = self.total_bytes
+        stats["hit_rate"] = (stats["hits"] + stats["stale_hits"]) / lookups if lookups else 0.0
+        return stats
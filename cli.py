@@ -0,0 +1,271 @@
+"""
+Неинтерактивный режим для скриптов и cron
+
+    python3 main.py download --playlist OWNER_ID_PLAYLIST_ID --jobs 8 --out DIR
+    python3 main.py export --mine --format jsonl
+    python3 main.py search "запрос" --limit 500
+
+Данные (экспорт, результаты поиска, итоги загрузки) выводятся в stdout,
+ход работы и сообщения - строками JSON в stderr. Никаких вопросов,
+очистки экрана и цветов.
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from config import TOKEN_FILE, DOWNLOAD_DIR, DOWNLOAD_WORKERS
+from ui import ConsoleUI
+
+# Коды завершения
+EXIT_OK = 0
+EXIT_PARTIAL = 1  # часть треков не скачана
+EXIT_USAGE = 2  # неверные аргументы (так же завершается argparse)
+EXIT_AUTH = 3  # нет токена или он недействителен
+EXIT_API = 4  # ошибка VK API или сети
+EXIT_INTERRUPTED = 130  # прервано Ctrl-C
+
+# Поля трека для экспорта в CSV
+CSV_FIELDS = ["owner_id", "id", "artist", "title", "duration", "album", "url"]
+
+def emit(event, **fields):
+    """Вывести событие строкой JSON в stderr"""
+    record = {"event": event, "time": round(time.time(), 3), **fields}
+    sys.stderr.write(json.dumps(record, ensure_ascii=False) + "\n")
+    sys.stderr.flush()
+
+class JSONLogHandler(logging.Handler):
+    """Записи logging - тоже события JSON"""
+
+    def emit(self, record):
+        emit("log", level=record.levelname.lower(), logger=record.name, message=record.getMessage())
+
+class HeadlessUI(ConsoleUI):
+    """Интерфейс без терминала: сообщения - события JSON, на вопросы ответ пустой"""
+
+    def __init__(self, quiet=False):
+        self.quiet = quiet
+
+    def _log(self, level, msg):
+        if not self.quiet or level in ("warning", "error"):
+            emit("log", level=level, message=str(msg).strip())
+
+    def clear_screen(self):
+        pass
+
+    def print_header(self, title):
+        pass
+
+    def print_menu_item(self, number, text, color=None):
+        pass
+
+    def print_success(self, msg):
+        self._log("info", msg)
+
+    def print_error(self, msg):
+        self._log("error", msg)
+
+    def print_warning(self, msg):
+        self._log("warning", msg)
+
+    def print_info(self, msg):
+        self._log("info", msg)
+
+    def print_playing(self, msg):
+        self._log("info", msg)
+
+    def print_downloading(self, msg):
+        self._log("info", msg)
+
+    def print_box(self, content, title=None, color=None):
+        pass
+
+    def print_progress_bar(self, iteration, total, prefix='', suffix='', length=50, fill='█'):
+        pass
+
+    def print_centered(self, text, color=None):
+        pass
+
+    def get_input(self, prompt, color=None):
+        return ""
+
+def build_parser():
+    """Разбор аргументов командной строки"""
+    parser = argparse.ArgumentParser(prog="vkmoosic", description="VK Music Player - неинтерактивный режим")
+    parser.add_argument("--token", help="токен VK (по умолчанию переменная VK_TOKEN или файл vk_token.txt)")
+    parser.add_argument("--token-file", default=TOKEN_FILE, help="файл с токеном")
+    parser.add_argument("--quiet", action="store_true", help="не выводить информационные сообщения")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_source(command):
+        source = command.add_mutually_exclusive_group(required=True)
+        source.add_argument("--mine", action="store_true", help="моя музыка")
+        source.add_argument("--playlist", metavar="OWNER_ID_PLAYLIST_ID[_KEY]",
+                            help="плейлист, например 12345_67 или -12345_67_abcdef")
+        source.add_argument("--friend", type=int, metavar="USER_ID", help="музыка друга")
+
+    download = commands.add_parser("download", help="скачать треки")
+    add_source(download)
+    download.add_argument("--jobs", type=int, default=DOWNLOAD_WORKERS, help="параллельных загрузок")
+    download.add_argument("--out", default=DOWNLOAD_DIR, help="папка загрузок")
+
+    export = commands.add_parser("export", help="выгрузить список треков")
+    add_source(export)
+    export.add_argument("--format", choices=["jsonl", "json", "csv"], default="jsonl")
+    export.add_argument("--output", help="файл (по умолчанию stdout)")
+
+    search = commands.add_parser("search", help="найти треки")
+    search.add_argument("query")
+    search.add_argument("--limit", type=int, default=100, help="сколько результатов получить")
+    search.add_argument("--format", choices=["jsonl", "json", "csv"], default="jsonl")
+    search.add_argument("--output", help="файл (по умолчанию stdout)")
+    return parser
+
+def parse_playlist(value):
+    """OWNER_ID_PLAYLIST_ID[_KEY] -> (owner_id, playlist_id, access_key)"""
+    parts = value.split("_")
+    if len(parts) not in (2, 3):
+        raise ValueError(value)
+    return int(parts[0]), int(parts[1]), parts[2] if len(parts) == 3 else None
+
+def load_tracks(vk_manager, args):
+    """Треки источника, выбранного в аргументах; (треки, ошибка)"""
+    if args.mine:
+        result = vk_manager.get_my_audio_list()
+    elif args.friend is not None:
+        result = vk_manager.get_friend_audio_list(args.friend)
+    else:
+        owner_id, playlist_id, access_key = parse_playlist(args.playlist)
+        result = vk_manager.get_playlist_tracks(playlist_id, owner_id=owner_id, access_key=access_key)
+    if not result.get("success"):
+        return None, result.get("error")
+    return result["audio_list"], None
+
+def write_tracks(tracks, fmt, output=None):
+    """Записать треки в файл или stdout в выбранном формате"""
+    stream = open(output, "w", encoding="utf-8", newline="") if output else sys.stdout
+    try:
+        if fmt == "json":
+            json.dump(tracks, stream, ensure_ascii=False, indent=2)
+            stream.write("\n")
+        elif fmt == "csv":
+            writer = csv.DictWriter(stream, fieldnames=CSV_FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            for track in tracks:
+                writer.writerow(dict(track, album=(track.get("album") or {}).get("title", "")))
+        else:
+            for track in tracks:
+                stream.write(json.dumps(track, ensure_ascii=False) + "\n")
+    finally:
+        if output:
+            stream.close()
+
+def authorize(vk_manager, args):
+    """Установить токен; False, если его нет или он недействителен"""
+    token = args.token or os.getenv("VK_TOKEN")
+    if token:
+        vk_manager.set_token(token.strip())
+    elif not vk_manager.load_token_from_file(args.token_file):
+        return False
+
+    validity = vk_manager.check_token_validity()
+    if not validity["valid"]:
+        emit("error", message=f"Токен невалиден: {validity.get('error_msg')}")
+        return False
+    return True
+
+def run_download(vk_manager, args):
+    from downloader import DownloadManager
+
+    tracks, error = load_tracks(vk_manager, args)
+    if tracks is None:
+        emit("error", message=error)
+        return EXIT_API
+    emit("tracks", count=len(tracks))
+
+    downloader = DownloadManager(vk_manager, workers=args.jobs)
+
+    def on_result(result, done, total):
+        emit("track", done=done, total=total, name=result["name"], success=result["success"],
+             existing=result["existing"], bytes=result["bytes"], path=result["path"], error=result["error"])
+
+    summary = downloader.download_all(tracks, args.out, on_result=on_result)
+    sys.stdout.write(json.dumps(summary, ensure_ascii=False) + "\n")
+    if summary["cancelled"]:
+        return EXIT_INTERRUPTED
+    return EXIT_PARTIAL if summary["failed"] else EXIT_OK
+
+def run_export(vk_manager, args):
+    tracks, error = load_tracks(vk_manager, args)
+    if tracks is None:
+        emit("error", message=error)
+        return EXIT_API
+    write_tracks(tracks, args.format, args.output)
+    emit("done", count=len(tracks))
+    return EXIT_OK
+
+def run_search(vk_manager, args):
+    from errors import VKAPIError
+
+    tracks = []
+    try:
+        for track in vk_manager.iter_search(args.query, args.limit):
+            tracks.append(track)
+            if len(tracks) % 100 == 0:
+                emit("progress", received=len(tracks), limit=args.limit)
+    except VKAPIError as e:
+        emit("error", message=e.error_msg)
+        return EXIT_API
+    write_tracks(tracks, args.format, args.output)
+    emit("done", count=len(tracks))
+    return EXIT_OK
+
+COMMANDS = {
+    "download": run_download,
+    "export": run_export,
+    "search": run_search,
+}
+
+def main(argv=None):
+    """Точка входа неинтерактивного режима; возвращает код завершения"""
+    from errors import VKAPIError
+    from vk_api import VKMusicManager
+
+    args = build_parser().parse_args(argv)
+    if args.command in ("download", "export") and args.playlist:
+        try:
+            parse_playlist(args.playlist)
+        except ValueError:
+            emit("error", message=f"Неверный плейлист: {args.playlist}, ожидается OWNER_ID_PLAYLIST_ID[_KEY]")
+            return EXIT_USAGE
+
+    # Пути из аргументов - относительно текущей папки, а кэш и журнал
+    # загрузок - в папке программы, как в интерактивном режиме
+    for name in ("out", "output", "token_file"):
+        if getattr(args, name, None):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+    if getattr(sys, 'frozen', False):
+        os.chdir(os.path.dirname(sys.executable))
+    else:
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    root = logging.getLogger()
+    root.handlers = [JSONLogHandler()]
+    root.setLevel(logging.WARNING if args.quiet else logging.INFO)
+
+    vk_manager = VKMusicManager(HeadlessUI(args.quiet))
+    try:
+        if not authorize(vk_manager, args):
+            return EXIT_AUTH
+        return COMMANDS[args.command](vk_manager, args)
+    except KeyboardInterrupt:
+        emit("error", message="Прервано пользователем")
+        return EXIT_INTERRUPTED
+    except VKAPIError as e:
+        emit("error", message=e.error_msg)
+        return EXIT_API
+    finally:
+        vk_manager.jobs.shutdown()
@@ -69,4 +69,120 @@ KATE_USER_AGENT = "KateMobileAndroid/51.1-442 (Android 11; SDK 30; arm64-v8a; Sa
 POPULAR_QUERIES = [
     "популярные песни 2024", "хиты", "top hits", "новинки музыки",
     "русские хиты", "зарубежные хиты", "топ чарт", "billboard top 100"
-]
\ No newline at end of file
+]
+
+# Сетевые настройки
+VK_API_URL = "https://api.vk.com/method/"
+HTTP_CONNECT_TIMEOUT = 5  # секунд на установку соединения
+HTTP_READ_TIMEOUT = 30  # секунд ожидания данных от сервера
+HTTP_API_POOL_SIZE = 10  # соединений к api.vk.com
+HTTP_CDN_POOL_SIZE = 20  # соединений к CDN аудиозаписей
+CDN_HEADERS = {
+    'Referer': 'https://vk.com/',
+    'Origin': 'https://vk.com'
+}
+
+# Пагинация
+AUDIO_PAGE_SIZE = 100  # треков за один запрос audio.get
+AUDIO_PAGE_WORKERS = 3  # параллельных запросов страниц, когда известно общее число треков
+FRIENDS_PAGE_SIZE = 5000  # друзей за один запрос friends.get (максимум VK)
+GROUPS_PAGE_SIZE = 1000  # групп за один запрос groups.get (максимум VK)
+SEARCH_PAGE_SIZE = 100  # результатов за один запрос audio.search (максимум VK)
+SEARCH_MAX_RESULTS = 1000  # сколько результатов поиска можно подгрузить при прокрутке
+
+# Пакетные запросы через execute
+EXECUTE_MAX_CALLS = 25  # ограничение VK на число вызовов API в одном execute
+EXECUTE_MAX_DELAY = 0.05  # секунд ожидания новых вызовов перед отправкой пакета
+
+# Ограничение частоты запросов к API
+API_RATE_LIMIT = 3  # запросов в секунду на токен (лимит VK)
+API_RATE_BURST = 3  # сколько запросов можно отправить подряд без ожидания
+API_MAX_RETRIES = 4  # повторов при ошибках 6/9/10/28 и ответах 5xx
+API_BACKOFF_BASE = 0.5  # секунд до первого повтора, дальше удваивается
+API_BACKOFF_MAX = 8  # максимальная пауза между повторами
+
+# Кэш ответов API
+CACHE_DIR = "cache"
+CACHE_DB_FILE = os.path.join(CACHE_DIR, "responses.sqlite")
+CACHE_MAX_BYTES = 50 * 1024 * 1024  # размер кэша ответов, дальше вытесняются давно не использованные
+CACHE_MAX_STALE = 24 * 60 * 60  # сколько секунд после TTL можно отдавать устаревший ответ, обновляя его в фоне
+CACHE_TTLS = {  # время жизни ответа в секундах по методам API
+    "friends.get": 60 * 60,
+    "groups.get": 60 * 60,
+    "audio.getPlaylists": 10 * 60,
+    "audio.get": 10 * 60,
+    "audio.search": 30 * 60,
+}
+# Ссылки на треки в ответах audio.get и audio.search действуют ограниченное время,
+# поэтому такие ответы нельзя отдавать дольше, чем живут ссылки
+AUDIO_URL_LIFETIME = 3 * 60 * 60
+CACHE_MAX_AGES = {  # предельный возраст ответа с учетом устаревания (по умолчанию TTL + CACHE_MAX_STALE)
+    "audio.get": AUDIO_URL_LIFETIME,
+    "audio.search": AUDIO_URL_LIFETIME,
+}
+
+# Асинхронный клиент (требует aiohttp)
+USE_ASYNC_CLIENT = os.getenv("VK_USE_ASYNC", "0") == "1"  # выполнять запросы меню через AsyncVKMusicManager
+ASYNC_CONNECTION_LIMIT = 100  # всего одновременных соединений
+ASYNC_CONNECTIONS_PER_HOST = 10  # соединений к одному хосту
+
+# Загрузки
+DOWNLOAD_DIR = "downloads"
+DOWNLOAD_WORKERS = 4  # параллельных загрузок по умолчанию
+DOWNLOAD_PER_HOST = 4  # одновременных загрузок с одного хоста CDN
+LEDGER_DB_FILE = os.path.join(CACHE_DIR, "downloads.sqlite")  # журнал скачанных треков
+
+# Обновление устаревших ссылок на треки (audio.getById)
+URL_REFRESH_BATCH = 100  # треков в одном запросе audio.getById (максимум VK)
+URL_EXPIRY_MARGIN = 5 * 60  # ссылку, истекающую раньше чем через столько секунд, обновляем заранее
+URL_REFRESH_MIN_INTERVAL = 60  # одну и ту же ссылку обновляем не чаще, сек
+URL_EXPIRED_STATUSES = (403, 410)  # ответы CDN на устаревшую ссылку
+
+# Локальный поиск по загруженным спискам
+SEARCH_INDEX_FILE = os.path.join(CACHE_DIR, "search.sqlite")
+SEARCH_INDEX_LIMIT = 200  # сколько результатов показывать
+LOCAL_SEARCH_PREVIEW = 15  # сколько результатов с источниками выводить до открытия плеера
+
+# Загрузка всех плейлистов сразу
+PLAYLIST_LOAD_WORKERS = 4  # плейлистов, загружаемых одновременно
+PLAYLIST_SHARED_MIN = 3  # "общие" треки - те, что есть хотя бы в стольких плейлистах
+
+# Обход музыки всех друзей
+CRAWL_WORKERS = 2  # пачек друзей, запрашиваемых одновременно
+CRAWL_BATCH_SIZE = 25  # друзей в пачке (первые страницы - через execute)
+CRAWL_DB_TEMPLATE = os.path.join(CACHE_DIR, "friends_crawl_{user_id}.sqlite")  # точка продолжения обхода
+
+# Фоновые задачи
+JOB_WORKERS = 3  # задач, выполняемых одновременно (загрузки списков, скачивание)
+JOB_HISTORY = 50  # сколько задач помнит экран фоновых задач
+
+# Кэш аудио
+AUDIO_CACHE_DIR = os.path.join(CACHE_DIR, "audio")
+AUDIO_CACHE_MAX_BYTES = 1024 * 1024 * 1024  # размер кэша прослушанных треков, дальше вытесняются давно не игравшие
+
+# Потоковое воспроизведение
+STREAM_PLAYERS = ["mpv", "ffplay"]  # плееры, которые ищутся в PATH, в порядке предпочтения
+STREAM_CHUNK_SIZE = 16 * 1024  # небольшие фрагменты, чтобы звук начинался быстрее
+STREAM_START_TIMEOUT = 15  # сколько секунд ждать начала воспроизведения
+
+# Предзагрузка следующих треков очереди
+PREFETCH_DEPTH = 2  # сколько следующих треков держать в кэше заранее
+PREFETCH_MAX_RATE = 2 * 1024 * 1024  # ограничение скорости предзагрузки, байт/с (0 - без ограничения)
+PREFETCH_MAX_BYTES = 100 * 1024 * 1024  # сколько может занимать загруженное заранее, но еще не сыгранное
+
+# Плеер
+PLAYER_BACKEND = os.getenv("VK_PLAYER", "auto")  # auto - mpv с управлением, если установлен; mpv; system - системный плеер
+MPV_START_TIMEOUT = 5  # сколько секунд ждать запуска mpv и ответа на команду
+PLAYER_SEEK_STEP = 10  # шаг перемотки, сек
+PLAYER_VOLUME_STEP = 5  # шаг громкости, %
+
+# Вывод списков
+LIST_RESERVED_LINES = 12  # строк терминала под заголовки и подсказки вокруг списка
+LIST_MIN_PAGE_SIZE = 10  # минимум строк списка на странице
+PLAYER_RESERVED_LINES = 30  # то же для плеера, где над списком статистика, а под ним подсказки
+FRIENDS_RESERVED_LINES = 10  # то же для списка друзей
+
+# Интерфейс
+UI_MODE = os.getenv("VK_UI", "console")  # console - обычный вывод; tui - полноэкранный (curses), если терминал поддерживает
+TUI_REFRESH_INTERVAL = 0.1  # период обновления строки состояния, с
+TUI_SCROLLBACK = 1000  # сколько строк вывода хранит полноэкранный интерфейс
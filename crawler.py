@@ -0,0 +1,162 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from config import CRAWL_WORKERS, CRAWL_BATCH_SIZE, CRAWL_DB_TEMPLATE
+from jobs import current_job
+from ledger import track_key
+from search import track_identity
+
+logger = logging.getLogger(__name__)
+
+class FriendsCrawler:
+    """Обход музыки всех друзей с сохранением прогресса
+
+    Друзья запрашиваются пачками (первые страницы библиотек - одним
+    execute на пачку), несколько пачек одновременно; ограничение частоты
+    запросов клиента при этом соблюдается. После каждой пачки результат
+    записывается в SQLite, поэтому прерванный обход продолжается с того
+    же места. Треки сохраняются без дублей, друзья с закрытыми
+    аудиозаписями запоминаются и больше не запрашиваются.
+    """
+
+    def __init__(self, vk_manager, path=None, workers=CRAWL_WORKERS, batch_size=CRAWL_BATCH_SIZE):
+        self.vk_manager = vk_manager
+        self.workers = workers
+        self.batch_size = batch_size
+        self.path = path or CRAWL_DB_TEMPLATE.format(user_id=vk_manager.user_id)
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS friends ("
+                "id INTEGER PRIMARY KEY, name TEXT, status TEXT, tracks INTEGER, error TEXT, updated REAL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tracks ("
+                "key TEXT PRIMARY KEY, identity TEXT UNIQUE, data TEXT, friend_id INTEGER)"
+            )
+            conn.commit()
+
+    def _connect(self):
+        return sqlite3.connect(self.path)
+
+    def crawl(self, restart=False):
+        """Загрузить музыку всех друзей, продолжая прерванный обход
+
+        restart - начать заново (друзья с закрытой музыкой все равно
+        пропускаются). Возвращает словарь success, audio_list (все треки
+        без дублей), friends, crawled, closed, failed и resumed (сколько
+        друзей было загружено раньше).
+
+        Соединение с базой принадлежит обходу и закрывается, только когда
+        он завершится, - в том числе после отмены, которую вызывающий
+        не дожидается.
+        """
+        friends_result = self.vk_manager.get_friends_list()
+        if not friends_result.get("success"):
+            return friends_result
+        friends = {friend.get('id'): friend for friend in friends_result["friends"]}
+
+        with closing(self._connect()) as conn:
+            if restart:
+                self._reset(conn, keep_closed=True)
+
+            finished = {row[0]: row[1] for row in conn.execute(
+                "SELECT id, status FROM friends WHERE status IN ('done', 'closed')"
+            )}
+            pending = [friend_id for friend_id in friends if friend_id not in finished]
+            resumed = sum(1 for friend_id in friends if finished.get(friend_id) == "done")
+            batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+
+            job = current_job()
+            processed = len(friends) - len(pending)
+            if job:
+                job.update(done=processed, total=len(friends))
+
+            # Одновременно выполняется не больше workers пачек, чтобы отмена
+            # не ждала всей очереди
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="crawl") as executor:
+                running = {}
+                try:
+                    while batches or running:
+                        while batches and len(running) < self.workers:
+                            batch = batches.pop(0)
+                            running[executor.submit(self.vk_manager.get_friends_audio_lists, batch)] = batch
+                        done, _ = wait(running, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            batch = running.pop(future)
+                            self._save(conn, friends, batch, future.result())
+                            processed += len(batch)
+                        if job:
+                            job.update(done=processed)
+                            job.check()
+                finally:
+                    # После отмены сохраняем пачки, которые уже запрошены
+                    for future, batch in running.items():
+                        if not future.cancel() and future.exception() is None:
+                            self._save(conn, friends, batch, future.result())
+
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM friends GROUP BY status").fetchall())
+            audio_list = self._tracks(conn)
+        return {
+            "success": True,
+            "audio_list": audio_list,
+            "friends": len(friends),
+            "crawled": counts.get("done", 0),
+            "closed": counts.get("closed", 0),
+            "failed": counts.get("failed", 0),
+            "resumed": resumed
+        }
+
+    def _save(self, conn, friends, batch, results):
+        """Записать результат пачки друзей - точка продолжения обхода"""
+        now = time.time()
+        for friend_id in batch:
+            friend = friends.get(friend_id, {})
+            name = f"{friend.get('first_name', '')} {friend.get('last_name', '')}".strip()
+            result = results.get(friend_id, {"success": False, "error": "Нет ответа"})
+            if result.get("success"):
+                audio_list = result["audio_list"]
+                conn.executemany(
+                    "INSERT OR IGNORE INTO tracks (key, identity, data, friend_id) VALUES (?, ?, ?, ?)",
+                    [(track_key(track), track_identity(track), json.dumps(track, ensure_ascii=False), friend_id)
+                     for track in audio_list if track_key(track)]
+                )
+                status, count, error = "done", len(audio_list), None
+            else:
+                status = "closed" if result.get("closed") else "failed"
+                count, error = 0, result.get("error")
+                if status == "failed":
+                    logger.warning("Не удалось загрузить музыку друга %s: %s", name or friend_id, error)
+            conn.execute(
+                "INSERT OR REPLACE INTO friends (id, name, status, tracks, error, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                (friend_id, name, status, count, error, now)
+            )
+        conn.commit()
+
+    @staticmethod
+    def _tracks(conn):
+        return [json.loads(row[0]) for row in conn.execute("SELECT data FROM tracks ORDER BY rowid")]
+
+    @staticmethod
+    def _reset(conn, keep_closed=False):
+        if keep_closed:
+            conn.execute("DELETE FROM friends WHERE status != 'closed'")
+        else:
+            conn.execute("DELETE FROM friends")
+        conn.execute("DELETE FROM tracks")
+        conn.commit()
+
+    def tracks(self):
+        """Все сохраненные треки друзей без дублей, в порядке загрузки"""
+        with closing(self._connect()) as conn:
+            return self._tracks(conn)
+
+    def reset(self, keep_closed=False):
+        """Забыть прогресс обхода (keep_closed - кроме закрытых друзей)"""
+        with closing(self._connect()) as conn:
+            self._reset(conn, keep_closed)
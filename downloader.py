@@ -0,0 +1,220 @@
+import logging
+import os
+import queue
+import threading
+import time
+from urllib.parse import urlparse
+from config import Colors, DOWNLOAD_DIR, DOWNLOAD_WORKERS, DOWNLOAD_PER_HOST
+from errors import DownloadError
+from ledger import track_key
+
+logger = logging.getLogger(__name__)
+
+class DownloadManager:
+    """Параллельная загрузка треков пулом потоков из общей очереди
+
+    Число одновременных загрузок ограничено числом потоков и отдельно
+    для каждого хоста CDN. По итогам возвращается общая сводка.
+    """
+
+    def __init__(self, vk_manager, workers=DOWNLOAD_WORKERS, per_host=DOWNLOAD_PER_HOST):
+        self.vk_manager = vk_manager
+        self.workers = max(1, workers)
+        self.per_host = max(1, per_host)
+
+        self._lock = threading.Lock()
+        self._host_limits = {}
+        self._reserved_paths = set()
+        self._pending = {}  # ключ -> еще не скачанный трек, в порядке очереди
+        self._stop = threading.Event()
+
+    def _host_limit(self, url):
+        """Семафор, ограничивающий загрузки с одного хоста"""
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.Semaphore(self.per_host)
+            return self._host_limits[host]
+
+    def _reserve_path(self, name, download_dir):
+        """Выбрать свободное имя файла, не занятое другими потоками"""
+        from vk_api import clean_filename
+
+        base = os.path.join(download_dir, clean_filename(name))
+        with self._lock:
+            filepath = f"{base}.mp3"
+            counter = 1
+            while os.path.exists(filepath) or filepath in self._reserved_paths:
+                filepath = f"{base}_{counter}.mp3"
+                counter += 1
+            self._reserved_paths.add(filepath)
+        return filepath
+
+    def download_one(self, track, download_dir=DOWNLOAD_DIR):
+        """Скачать один трек и вернуть словарь с результатом"""
+        artist = track.get('artist', 'Unknown Artist')
+        title = track.get('title', 'Unknown Title')
+        name = f"{artist} - {title}"
+        track_url = track.get('url')
+
+        result = {"success": False, "name": name, "track": track, "path": None, "bytes": 0,
+                  "error": None, "existing": False}
+        if not track_url:
+            result["error"] = "У трека нет ссылки для скачивания"
+            return result
+
+        filepath = self._reserve_path(name, download_dir)
+        try:
+            with self._host_limit(track_url):
+                # Устаревшие ссылки обновляются вместе со ссылками следующих треков очереди
+                with self._lock:
+                    upcoming = list(self._pending.values())[:self.vk_manager.links.batch_size]
+                result["bytes"] = self.vk_manager.fetch_track(track, filepath, neighbours=upcoming)
+            self.vk_manager.add_id3_tags(filepath, track, quiet=True)
+            self.vk_manager.ledger.record(track, filepath)
+            result["success"] = True
+            result["path"] = filepath
+        except DownloadError as e:
+            # Недокачанный .part остается на диске для докачки при следующем запуске
+            result["error"] = e.reason
+        except Exception as e:
+            # Любая другая ошибка тоже должна попасть в сводку, а не уронить рабочий поток
+            logger.warning("Не удалось скачать %s: %s", name, e, exc_info=True)
+            result["error"] = str(e)
+        finally:
+            with self._lock:
+                self._reserved_paths.discard(filepath)
+
+        return result
+
+    def download_all(self, tracks, download_dir=DOWNLOAD_DIR, on_result=None):
+        """Скачать все треки и вернуть сводку
+
+        on_result(result, done, total) вызывается из рабочих потоков
+        после каждого трека. Треки из журнала загрузок не скачиваются заново.
+        Ctrl-C или cancel() останавливают загрузку после текущих треков.
+        """
+        os.makedirs(download_dir, exist_ok=True)
+
+        total = len(tracks)
+        results = []
+        self._stop.clear()
+        self._pending.clear()
+
+        # Журнал проверяется одним запросом на весь список
+        existing = self.vk_manager.ledger.lookup(tracks)
+        jobs = queue.Queue()
+        for track in tracks:
+            entry = existing.get(track_key(track))
+            if entry:
+                results.append(self.existing_result(track, entry))
+            else:
+                jobs.put(track)
+                self._pending[track_key(track)] = track
+        # Истекшие и истекающие ссылки обновляем заранее пачками
+        self.vk_manager.links.refresh_expiring(list(self._pending.values()))
+
+        def worker():
+            while not self._stop.is_set():
+                try:
+                    track = jobs.get_nowait()
+                except queue.Empty:
+                    return
+                result = self.download_one(track, download_dir)
+                with self._lock:
+                    self._pending.pop(track_key(track), None)
+                    results.append(result)
+                    done = len(results)
+                if on_result:
+                    on_result(result, done, total)
+
+        started = time.monotonic()
+        threads = [
+            threading.Thread(target=worker, name=f"download-{i}", daemon=True)
+            for i in range(min(self.workers, jobs.qsize()))
+        ]
+        for thread in threads:
+            thread.start()
+
+        cancelled = False
+        try:
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            cancelled = True
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+
+        cancelled = cancelled or self._stop.is_set()
+        return self.summarize(results, total, time.monotonic() - started, cancelled)
+
+    @staticmethod
+    def existing_result(track, entry):
+        """Результат для трека, который уже есть в журнале загрузок"""
+        return {
+            "success": True,
+            "name": f"{track.get('artist', 'Unknown Artist')} - {track.get('title', 'Unknown Title')}",
+            "track": track,
+            "path": entry["path"],
+            "bytes": 0,
+            "error": None,
+            "existing": True
+        }
+
+    def cancel(self):
+        """Остановить загрузку после текущих треков"""
+        self._stop.set()
+
+    @staticmethod
+    def summarize(results, total, elapsed, cancelled=False):
+        """Собрать общую сводку по результатам загрузки"""
+        downloaded = [r for r in results if r["success"] and not r["existing"]]
+        existing = sum(1 for r in results if r["existing"])
+        total_bytes = sum(r["bytes"] for r in downloaded)
+        return {
+            "success": True,
+            "total": total,
+            "downloaded": len(downloaded),
+            "existing": existing,
+            "failed": len(results) - len(downloaded) - existing,
+            "skipped": total - len(results),
+            "bytes": total_bytes,
+            "elapsed": elapsed,
+            "speed": total_bytes / 1024 / 1024 / elapsed if elapsed > 0 else 0.0,
+            "failures": [{"name": r["name"], "error": r["error"]} for r in results if not r["success"]],
+            "cancelled": cancelled
+        }
+
+    def print_result(self, result, done, total):
+        """Вывести результат одного трека"""
+        ui = self.vk_manager.ui
+        with self._lock:
+            if result["success"]:
+                ui.print_success(f"[{done}/{total}] {result['name']} ({result['bytes'] / 1024 / 1024:.1f} MB)")
+            else:
+                ui.print_error(f"[{done}/{total}] {result['name']}: {result['error']}")
+
+    def print_summary(self, summary):
+        """Вывести сводку по загрузке"""
+        ui = self.vk_manager.ui
+        if summary["cancelled"]:
+            ui.print_warning("Загрузка прервана пользователем")
+        else:
+            ui.print_success("Скачивание завершено!")
+
+        print(f"\n{Colors.BRIGHT_CYAN}📊 Итоги загрузки:{Colors.RESET}")
+        print(f"   {Colors.BRIGHT_WHITE}Успешно:{Colors.RESET} {Colors.BRIGHT_GREEN}{summary['downloaded']}{Colors.RESET}"
+              f" из {summary['total']}")
+        if summary["existing"]:
+            print(f"   {Colors.BRIGHT_WHITE}Уже были скачаны:{Colors.RESET} {summary['existing']}")
+        print(f"   {Colors.BRIGHT_WHITE}Не удалось:{Colors.RESET} {Colors.BRIGHT_RED}{summary['failed']}{Colors.RESET}")
+        if summary["skipped"]:
+            print(f"   {Colors.BRIGHT_WHITE}Не начаты:{Colors.RESET} {summary['skipped']}")
+        print(f"   {Colors.BRIGHT_WHITE}Объем:{Colors.RESET} {summary['bytes'] / 1024 / 1024:.1f} MB"
+              f" за {summary['elapsed']:.1f} с ({summary['speed']:.2f} MB/s)")
+
+        if summary["failures"]:
+            print(f"\n{Colors.BRIGHT_RED}✗ Ошибки:{Colors.RESET}")
+            for failure in summary["failures"]:
+                print(f"   {Colors.WHITE}{failure['name']}: {failure['error']}{Colors.RESET}")
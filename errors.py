@@ -0,0 +1,84 @@
+class VKAPIError(Exception):
+    """Ошибка, возвращенная VK API"""
+    
+    def __init__(self, error_code, error_msg, method=None):
+        super().__init__(f"{error_msg} (код: {error_code})")
+        self.error_code = error_code
+        self.error_msg = error_msg
+        self.method = method
+
+class VKAuthError(VKAPIError):
+    """Токен недействителен (5)"""
+
+class VKTooManyRequestsError(VKAPIError):
+    """Слишком много запросов в секунду (6)"""
+
+class VKFloodControlError(VKAPIError):
+    """Flood control (9)"""
+
+class VKInternalServerError(VKAPIError):
+    """Внутренняя ошибка сервера (10)"""
+
+class VKRateLimitError(VKAPIError):
+    """Превышен лимит вызовов метода (28, 29)"""
+
+class VKAccessDeniedError(VKAPIError):
+    """Нет доступа к данным (15, 18, 30, 200, 201, 203)"""
+
+class VKNetworkError(VKAPIError):
+    """Сетевая ошибка или некорректный ответ сервера"""
+    
+    def __init__(self, error_msg, method=None):
+        super().__init__(0, error_msg, method)
+
+class VKTimeoutError(VKNetworkError):
+    """Таймаут при обращении к VK"""
+
+class VKHTTPError(VKNetworkError):
+    """Сервер VK ответил ошибочным HTTP-статусом"""
+    
+    def __init__(self, status_code, method=None):
+        super().__init__(f"Ошибка HTTP: {status_code}", method)
+        self.status_code = status_code
+
+class JobCancelledError(Exception):
+    """Фоновая задача отменена"""
+
+VK_ERRORS = {
+    5: VKAuthError,
+    6: VKTooManyRequestsError,
+    9: VKFloodControlError,
+    10: VKInternalServerError,
+    15: VKAccessDeniedError,
+    18: VKAccessDeniedError,
+    28: VKRateLimitError,
+    29: VKRateLimitError,
+    30: VKAccessDeniedError,
+    200: VKAccessDeniedError,
+    201: VKAccessDeniedError,
+    203: VKAccessDeniedError,
+}
+
+class DownloadError(Exception):
+    """Не удалось скачать аудиофайл"""
+    
+    def __init__(self, reason, status_code=None):
+        super().__init__(reason)
+        self.reason = reason
+        self.status_code = status_code
+
+# Временные ошибки, после которых запрос имеет смысл повторить
+RETRYABLE_ERROR_CODES = {6, 9, 10, 28}
+
+def make_api_error(error, method=None):
+    """Создать исключение нужного типа из поля error ответа VK"""
+    error_code = error.get("error_code", 0)
+    error_msg = error.get("error_msg", "Неизвестная ошибка")
+    error_class = VK_ERRORS.get(error_code, VKAPIError)
+    return error_class(error_code, error_msg, method)
+
+def is_retryable(error):
+    """Можно ли повторить запрос после этой ошибки"""
+    if isinstance(error, VKHTTPError):
+        return error.status_code >= 500
+    return error.error_code in RETRYABLE_ERROR_CODES
@@ -0,0 +1,220 @@
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from activity import activity
+from config import JOB_WORKERS, JOB_HISTORY
+from errors import JobCancelledError
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+def current_job():
+    """Задача, которую выполняет текущий поток, или None"""
+    return getattr(_local, "job", None)
+
+class Job:
+    """Фоновая задача: загрузка списка треков, скачивание и т.п.
+
+    Функция задачи получает саму задачу и сообщает через нее прогресс
+    (update), а между шагами проверяет отмену (check). Пока задача
+    выполняется, она видна в строке состояния.
+    """
+
+    def __init__(self, job_id, title, func):
+        self.id = job_id
+        self.title = title
+        self.func = func
+        self.status = "queued"
+        self.done = 0
+        self.total = None
+        self.bytes = 0
+        self.detail = None
+        self.error = None
+        self.exception = None
+        self.result = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+        self._cancel = threading.Event()
+        self._finished = threading.Event()
+        self._on_cancel = []
+        self._activity_id = None
+        self._future = None
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def active(self):
+        return self.status in ("queued", "running")
+
+    def update(self, done=None, total=None, bytes_done=None):
+        """Сообщить прогресс: сколько сделано, сколько всего, сколько байт"""
+        if done is not None:
+            self.done = done
+        if total is not None:
+            self.total = total
+        if bytes_done is not None:
+            self.bytes = bytes_done
+        if self._activity_id:
+            activity.update(self._activity_id, self.describe())
+
+    def check(self):
+        """Прервать выполнение, если задачу отменили"""
+        if self._cancel.is_set():
+            raise JobCancelledError(self.title)
+
+    def on_cancel(self, callback):
+        """Вызвать callback при отмене (например, остановить загрузчик)"""
+        self._on_cancel.append(callback)
+        if self._cancel.is_set():
+            callback()
+
+    def cancel(self):
+        """Отменить задачу; выполняющаяся остановится на ближайшей проверке"""
+        if not self.active or self._cancel.is_set():
+            return
+        self._cancel.set()
+        if self._future is not None and self._future.cancel():
+            self._finish("cancelled")
+            return
+        for callback in list(self._on_cancel):
+            try:
+                callback()
+            except Exception as e:
+                logger.warning("Ошибка при отмене задачи %s: %s", self.title, e)
+
+    def wait(self, timeout=None):
+        """Дождаться завершения; True, если задача завершилась"""
+        return self._finished.wait(timeout)
+
+    def elapsed(self):
+        """Время выполнения в секундах"""
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def throughput(self):
+        """Скорость: (элементов в секунду, байт в секунду)"""
+        elapsed = self.elapsed()
+        if elapsed <= 0:
+            return 0.0, 0.0
+        return self.done / elapsed, self.bytes / elapsed
+
+    def describe(self):
+        """Короткое описание для строки состояния"""
+        text = self.title
+        if self.total:
+            text += f" {self.done}/{self.total}"
+        elif self.done:
+            text += f" {self.done}"
+        if self.bytes:
+            text += f" ({self.throughput()[1] / 1024 / 1024:.1f} MB/s)"
+        return text
+
+    def _run(self):
+        if self._cancel.is_set():
+            self._finish("cancelled")
+            return
+        self.status = "running"
+        self.started = time.time()
+        self._activity_id = activity.start(self.describe())
+        _local.job = self
+        try:
+            self.result = self.func(self)
+            status = "cancelled" if self._cancel.is_set() else "done"
+        except JobCancelledError:
+            status = "cancelled"
+        except Exception as e:
+            logger.warning("Задача %s завершилась с ошибкой: %s", self.title, e)
+            self.error = str(e)
+            self.exception = e
+            status = "failed"
+        finally:
+            _local.job = None
+            activity.finish(self._activity_id)
+        self._finish(status)
+
+    def _finish(self, status):
+        self.status = status
+        self.finished = time.time()
+        self._finished.set()
+
+class JobManager:
+    """Очередь фоновых задач, выполняемых пулом потоков
+
+    Хранит последние history задач для экрана фоновых задач.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, history=JOB_HISTORY):
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._jobs = []
+
+    def _add(self, title, func):
+        job = Job(next(self._ids), title, func)
+        with self._lock:
+            self._jobs.append(job)
+            finished = [j for j in self._jobs if not j.active]
+            # Старые завершенные задачи забываем
+            for old in finished[:max(0, len(self._jobs) - self.history)]:
+                self._jobs.remove(old)
+        return job
+
+    def submit(self, title, func):
+        """Поставить func(job) в очередь и вернуть задачу"""
+        job = self._add(title, func)
+        job._future = self._executor.submit(job._run)
+        return job
+
+    def run(self, title, func):
+        """Выполнить задачу, которую ждет пользователь, и вернуть результат
+
+        Задача запускается сразу в отдельном потоке, не дожидаясь очереди
+        фоновых. Ctrl-C отменяет задачу, а не программу: возвращается None.
+        Исключение из задачи пробрасывается вызывающему.
+        """
+        job = self._add(title, func)
+        threading.Thread(target=job._run, name=f"job-{job.id}", daemon=True).start()
+        try:
+            while not job.wait(0.1):
+                pass
+        except KeyboardInterrupt:
+            job.cancel()
+            return None
+        if job.status == "failed":
+            raise job.exception
+        return job.result if job.status == "done" else None
+
+    def jobs(self):
+        """Все задачи, от старых к новым"""
+        with self._lock:
+            return list(self._jobs)
+
+    def get(self, job_id):
+        """Задача по номеру или None"""
+        with self._lock:
+            return next((job for job in self._jobs if job.id == job_id), None)
+
+    def active_count(self):
+        """Сколько задач выполняется или ждет очереди"""
+        with self._lock:
+            return sum(1 for job in self._jobs if job.active)
+
+    def clear_finished(self):
+        """Убрать завершенные задачи из списка"""
+        with self._lock:
+            self._jobs = [job for job in self._jobs if job.active]
+
+    def shutdown(self):
+        """Отменить все задачи и дождаться выполняющихся"""
+        for job in self.jobs():
+            job.cancel()
+        self._executor.shutdown(wait=True)
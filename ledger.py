@@ -0,0 +1,181 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from config import LEDGER_DB_FILE, DOWNLOAD_DIR
+
+logger = logging.getLogger(__name__)
+
+# Ограничение SQLite на число параметров в одном запросе
+LOOKUP_CHUNK = 500
+
+def track_key(track):
+    """Идентификатор трека ВКонтакте в виде owner_id_id или None"""
+    if not track or track.get('owner_id') is None or track.get('id') is None:
+        return None
+    return f"{track['owner_id']}_{track['id']}"
+
+def file_hash(path):
+    """SHA-256 содержимого файла"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class DownloadLedger:
+    """Журнал скачанных треков (SQLite): owner_id_id -> путь, размер, хэш, время
+
+    Трек считается скачанным, пока его файл есть на диске. Если файл
+    переименовали или перенесли в другую подпапку, он находится по размеру
+    и хэшу, и путь в журнале обновляется, поэтому переименование по тегам
+    или совпадение имен у разных треков не приводят к повторной загрузке
+    или перезаписи. Записи, файлы которых не нашлись, удаляются - трек
+    скачивается заново, а поиск не повторяется при каждом обращении.
+    """
+
+    def __init__(self, path=LEDGER_DB_FILE):
+        self._lock = threading.Lock()
+
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("Не удалось открыть журнал загрузок %s: %s", path, e)
+            self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS downloads ("
+                "key TEXT PRIMARY KEY, path TEXT, size INTEGER, hash TEXT, downloaded REAL)"
+            )
+            self._conn.commit()
+
+    def lookup(self, tracks):
+        """Найти уже скачанные треки
+
+        Возвращает словарь owner_id_id -> запись журнала для треков, файлы
+        которых на месте или найдены под новым именем. Журнал опрашивается
+        одним запросом на пачку, пропавшие файлы ищутся одним обходом папок.
+        """
+        keys = list({key for key in map(track_key, tracks) if key})
+        rows = []
+        with self._lock:
+            for start in range(0, len(keys), LOOKUP_CHUNK):
+                chunk = keys[start:start + LOOKUP_CHUNK]
+                rows.extend(self._conn.execute(
+                    "SELECT key, path, size, hash, downloaded FROM downloads "
+                    f"WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall())
+
+        found = {}
+        missing = []
+        for key, path, size, digest, downloaded in rows:
+            if os.path.exists(path):
+                found[key] = {"path": path, "size": size, "hash": digest, "downloaded": downloaded}
+            else:
+                missing.append((key, path, size, digest, downloaded))
+
+        moved = self._relocate(missing) if missing else {}
+        for key, path, size, digest, downloaded in missing:
+            if key in moved:
+                found[key] = {"path": moved[key], "size": size, "hash": digest, "downloaded": downloaded}
+        return found
+
+    def _relocate(self, missing, roots=(DOWNLOAD_DIR,)):
+        """Найти переименованные или перенесенные файлы по размеру и хэшу
+
+        missing - записи журнала, файлов которых нет по записанному пути.
+        Папка загрузок обходится с подпапками, папки, где файлы были, -
+        без них (это может быть, например, домашняя папка); каждая папка
+        просматривается один раз, хэш считается только у файлов подходящего
+        размера. Найденные пути записываются в журнал, ненайденные записи
+        удаляются. Возвращает ключ -> новый путь.
+        """
+        wanted = {}
+        for key, path, size, digest, _ in missing:
+            if digest:
+                wanted.setdefault(size, []).append((key, path, digest))
+
+        # Папка -> ее файлы; каждая папка читается один раз
+        directories = {}
+        if wanted:
+            for root in roots:
+                for directory, _, files in os.walk(os.path.abspath(root)):
+                    directories.setdefault(directory, files)
+            for directory in {os.path.dirname(path) for _, path, _, _, _ in missing} - set(directories):
+                try:
+                    directories[directory] = [entry.name for entry in os.scandir(directory) if entry.is_file()]
+                except OSError:
+                    continue
+
+        moved = {}
+        for directory, files in directories.items():
+            for name in files:
+                candidate = os.path.join(directory, name)
+                try:
+                    entries = wanted.get(os.path.getsize(candidate))
+                    digest = file_hash(candidate) if entries else None
+                except OSError:
+                    continue
+                for entry in list(entries or ()):
+                    key, path, expected = entry
+                    if digest == expected and key not in moved:
+                        moved[key] = candidate
+                        entries.remove(entry)
+                        logger.info("Файл %s найден под новым именем: %s", path, candidate)
+                        break
+
+        lost = [key for key, _, _, _, _ in missing if key not in moved]
+        with self._lock:
+            self._conn.executemany("UPDATE downloads SET path = ? WHERE key = ?",
+                                   [(path, key) for key, path in moved.items()])
+            self._conn.executemany("DELETE FROM downloads WHERE key = ?", [(key,) for key in lost])
+            self._conn.commit()
+        if lost:
+            logger.info("Файлы %d треков не найдены, они удалены из журнала", len(lost))
+        return moved
+
+    def get(self, track):
+        """Запись журнала для одного трека или None"""
+        key = track_key(track)
+        return self.lookup([track]).get(key) if key else None
+
+    def record(self, track, path):
+        """Записать скачанный трек в журнал"""
+        key = track_key(track)
+        if not key:
+            return
+        try:
+            size = os.path.getsize(path)
+            digest = file_hash(path)
+        except OSError as e:
+            logger.warning("Не удалось прочитать %s для журнала: %s", path, e)
+            return
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO downloads (key, path, size, hash, downloaded) VALUES (?, ?, ?, ?, ?)",
+                (key, os.path.abspath(path), size, digest, time.time())
+            )
+            self._conn.commit()
+
+    def forget(self, track):
+        """Удалить трек из журнала, чтобы скачать его заново"""
+        key = track_key(track)
+        if not key:
+            return
+        with self._lock:
+            self._conn.execute("DELETE FROM downloads WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def summary(self):
+        """Число записей и суммарный размер скачанного"""
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM downloads"
+            ).fetchone()
+        return {"entries": entries, "bytes": total}
@@ -0,0 +1,100 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from config import PLAYLIST_LOAD_WORKERS, PLAYLIST_SHARED_MIN
+from jobs import current_job
+from ledger import track_key
+from search import track_identity
+
+logger = logging.getLogger(__name__)
+
+def library_key(track):
+    """Ключ трека в библиотеке: owner_id_id, а без него - исполнитель и название"""
+    return track_key(track) or track_identity(track)
+
+class PlaylistLibrary:
+    """Треки всех плейлистов и индекс "трек -> плейлисты, где он есть"
+
+    Плейлисты загружаются одновременно; пробные запросы неизвестных
+    плейлистов при этом объединяются в execute. Общие треки хранятся
+    один раз, поэтому выборки по библиотеке и ее полное скачивание
+    не требуют новых запросов.
+    """
+
+    def __init__(self, playlists):
+        self.playlists = list(playlists)
+        self.tracks = {}  # ключ -> трек (первый встреченный)
+        self.index = {}  # ключ -> номера плейлистов, где есть трек
+        self.contents = {}  # номер плейлиста -> ключи его треков по порядку
+        self.errors = {}  # номер плейлиста -> ошибка загрузки
+
+    def load(self, vk_manager, workers=PLAYLIST_LOAD_WORKERS):
+        """Загрузить треки всех плейлистов; возвращает саму библиотеку"""
+        job = current_job()
+        if job:
+            job.update(done=0, total=len(self.playlists))
+
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="playlists")
+        try:
+            futures = {
+                executor.submit(
+                    vk_manager.get_playlist_tracks,
+                    playlist.get('id'),
+                    owner_id=playlist.get('owner_id', vk_manager.user_id),
+                    access_key=playlist.get('access_key') or None
+                ): number
+                for number, playlist in enumerate(self.playlists)
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                number = futures[future]
+                result = future.result()
+                if result.get("success"):
+                    self.add(number, result["audio_list"])
+                else:
+                    self.errors[number] = result.get("error")
+                    logger.warning("Не удалось загрузить плейлист %s: %s",
+                                   self.playlists[number].get('title'), result.get("error"))
+                if job:
+                    job.update(done=done)
+                    job.check()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return self
+
+    def add(self, number, audio_list):
+        """Добавить треки плейлиста с номером number"""
+        keys = []
+        for track in audio_list:
+            key = library_key(track)
+            self.tracks.setdefault(key, track)
+            self.index.setdefault(key, set()).add(number)
+            keys.append(key)
+        self.contents[number] = keys
+
+    def playlists_of(self, track):
+        """Названия плейлистов, в которых есть трек"""
+        return [self.playlists[number].get('title', '') for number in sorted(self.index.get(library_key(track), ()))]
+
+    def shared(self, min_playlists=PLAYLIST_SHARED_MIN):
+        """Треки, которые есть хотя бы в min_playlists плейлистах (сначала самые частые)"""
+        keys = [key for key, numbers in self.index.items() if len(numbers) >= min_playlists]
+        keys.sort(key=lambda key: -len(self.index[key]))
+        return [self.tracks[key] for key in keys]
+
+    def only_in(self, number):
+        """Треки, которые есть только в плейлисте с номером number"""
+        return [self.tracks[key] for key in dict.fromkeys(self.contents.get(number, []))
+                if self.index[key] == {number}]
+
+    def all_tracks(self):
+        """Все треки библиотеки без повторов - для полного скачивания"""
+        return list(self.tracks.values())
+
+    def summary(self):
+        """Сводка: плейлисты, треки с повторами и без, общие треки, ошибки"""
+        return {
+            "playlists": len(self.contents),
+            "entries": sum(len(keys) for keys in self.contents.values()),
+            "unique": len(self.tracks),
+            "shared": sum(1 for numbers in self.index.values() if len(numbers) > 1),
+            "failed": len(self.errors)
+        }
@@ -0,0 +1,114 @@
+import logging
+import threading
+import time
+from urllib.parse import urlparse, parse_qs
+from config import URL_REFRESH_BATCH, URL_EXPIRY_MARGIN, URL_REFRESH_MIN_INTERVAL
+from errors import VKAPIError
+from ledger import track_key
+
+logger = logging.getLogger(__name__)
+
+def url_expires(url):
+    """Время истечения ссылки (unix time) из ее параметров или None"""
+    query = parse_qs(urlparse(url or "").query)
+    for name in ("expires", "expire"):
+        try:
+            return int(query[name][0])
+        except (KeyError, IndexError, ValueError):
+            continue
+    return None
+
+def is_expiring(url, margin=URL_EXPIRY_MARGIN):
+    """Ссылка уже истекла или истечет в ближайшие margin секунд"""
+    expires = url_expires(url)
+    return expires is not None and expires - time.time() < margin
+
+class LinkRefresher:
+    """Обновление устаревших ссылок на треки через audio.getById
+
+    Ссылки в ответах audio.get и audio.search действуют ограниченное время.
+    Новые ссылки запрашиваются пачками до batch_size треков и записываются
+    прямо в словари треков, поэтому списки плеера, очередь и загрузчик
+    сразу видят свежие ссылки. Трек, обновленный недавно, повторно
+    не запрашивается - так несколько потоков, одновременно получивших 403,
+    обходятся одним запросом.
+    """
+
+    def __init__(self, vk_manager, batch_size=URL_REFRESH_BATCH, min_interval=URL_REFRESH_MIN_INTERVAL):
+        self.vk_manager = vk_manager
+        self.batch_size = batch_size
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._refreshed = {}  # ключ трека -> время последнего обновления
+
+    @staticmethod
+    def _audio_id(track):
+        audio_id = track_key(track)
+        if track.get('access_key'):
+            audio_id += f"_{track['access_key']}"
+        return audio_id
+
+    def refresh(self, tracks):
+        """Получить новые ссылки для треков; сколько ссылок обновлено
+
+        Под блокировкой только выбираются треки и записываются ответы:
+        выбранные треки сразу отмечаются обновленными, поэтому другие потоки
+        их не запрашивают, но и не ждут окончания запроса.
+        """
+        with self._lock:
+            now = time.time()
+            wanted = {}
+            for track in tracks:
+                key = track_key(track)
+                if key and key not in wanted and now - self._refreshed.get(key, 0) >= self.min_interval:
+                    wanted[key] = track
+            previous = {key: self._refreshed.get(key) for key in wanted}
+            for key in wanted:
+                self._refreshed[key] = now
+
+        updated = 0
+        keys = list(wanted)
+        for start in range(0, len(keys), self.batch_size):
+            chunk = keys[start:start + self.batch_size]
+            try:
+                response = self.vk_manager.call(
+                    "audio.getById", audios=",".join(self._audio_id(wanted[key]) for key in chunk)
+                )
+            except VKAPIError as e:
+                logger.warning("Не удалось обновить ссылки на треки: %s", e.error_msg)
+                # Незапрошенные треки можно будет запросить снова
+                with self._lock:
+                    for key in keys[start:]:
+                        if self._refreshed.get(key) == now:
+                            if previous[key] is None:
+                                del self._refreshed[key]
+                            else:
+                                self._refreshed[key] = previous[key]
+                break
+            self.vk_manager.metrics.increment("url_refresh_calls")
+
+            with self._lock:
+                for item in response if isinstance(response, list) else response.get("items", []):
+                    track = wanted.get(track_key(item))
+                    if track is not None and item.get('url') and item['url'] != track.get('url'):
+                        track['url'] = item['url']
+                        updated += 1
+
+        if updated:
+            self.vk_manager.metrics.increment("url_refreshed", updated)
+        return updated
+
+    def refresh_expiring(self, tracks):
+        """Обновить ссылки треков, которые истекли или скоро истекут"""
+        return self.refresh([track for track in tracks if is_expiring(track.get('url'))])
+
+    def ensure_fresh(self, track, neighbours=()):
+        """Перед загрузкой трека обновить его ссылку, если она истекает
+
+        Вместе с ним обновляются истекающие ссылки соседних треков
+        (например, следующих в очереди) - в том же запросе.
+        """
+        if not is_expiring(track.get('url')):
+            return 0
+        expiring = [other for other in neighbours if other is not track and is_expiring(other.get('url'))]
+        return self.refresh([track] + expiring[:self.batch_size - 1])
@@ -6,17 +6,22 @@ VK Music Player - Console Edition
 
 import logging
 import sys
+import time
 import traceback
 import os
-import requests
-from config import Colors, PROGRAM_INFO
-from ui import ConsoleUI
-from vk_api import VKMusicManager
+from config import (
+    Colors, PROGRAM_INFO, FRIENDS_RESERVED_LINES, LOCAL_SEARCH_PREVIEW, CRAWL_BATCH_SIZE,
+    PLAYLIST_SHARED_MIN, DOWNLOAD_WORKERS
+)
+from ui import ListView, write_frame
+from tui import create_ui
+from vk_api import VKMusicManager, VKAPIError, VKNetworkError
 from utils import (
     show_program_info, 
     show_auth_help, 
     show_main_menu,
     interactive_audio_player,
+    format_track_row,
     play_audio
 )
 
@@ -27,6 +32,113 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def run_job(vk_manager, title, method, *args, **kwargs):
+    """Выполнить запрос к VK фоновой задачей и дождаться результата
+
+    Пока запрос выполняется, Ctrl-C отменяет только его, а не всю программу.
+    """
+    result = vk_manager.jobs.run(title, lambda job: method(*args, **kwargs))
+    if result is None:
+        return {"success": False, "error": "Отменено пользователем"}
+    return result
+
+def format_job_row(job):
+    """Строка задачи для экрана фоновых задач"""
+    colors = {
+        "queued": Colors.BRIGHT_BLACK,
+        "running": Colors.BRIGHT_CYAN,
+        "done": Colors.BRIGHT_GREEN,
+        "failed": Colors.BRIGHT_RED,
+        "cancelled": Colors.BRIGHT_YELLOW
+    }
+    labels = {
+        "queued": "в очереди",
+        "running": "выполняется",
+        "done": "готово",
+        "failed": "ошибка",
+        "cancelled": "отменено"
+    }
+    items_rate, bytes_rate = job.throughput()
+    progress = f"{job.done}/{job.total}" if job.total else str(job.done)
+    line = (f"{Colors.BRIGHT_YELLOW}#{job.id:<3}{Colors.RESET} {colors[job.status]}{labels[job.status]:<12}{Colors.RESET} "
+            f"{Colors.BRIGHT_WHITE}{job.title}{Colors.RESET} · {progress} · {job.elapsed():.0f} с · "
+            f"{items_rate:.1f}/с")
+    if job.bytes:
+        line += f" · {job.bytes / 1024 / 1024:.1f} MB, {bytes_rate / 1024 / 1024:.2f} MB/s"
+    if job.error:
+        line += f"\n      {Colors.BRIGHT_RED}{job.error}{Colors.RESET}"
+    elif job.detail:
+        line += f"\n      {Colors.WHITE}{job.detail}{Colors.RESET}"
+    return line
+
+def jobs_interactive(vk_manager):
+    """Экран фоновых задач: выполняющиеся, в очереди, завершенные"""
+    while True:
+        jobs = vk_manager.jobs.jobs()
+        vk_manager.ui.clear_screen()
+        vk_manager.ui.print_header("ФОНОВЫЕ ЗАДАЧИ")
+        
+        if jobs:
+            counts = {}
+            for job in jobs:
+                counts[job.status] = counts.get(job.status, 0) + 1
+            print(f"{Colors.BRIGHT_CYAN}Выполняется: {counts.get('running', 0)}, в очереди: {counts.get('queued', 0)}, "
+                  f"с ошибкой: {counts.get('failed', 0)}, завершено: {counts.get('done', 0)}{Colors.RESET}\n")
+            for job in reversed(jobs):
+                print(format_job_row(job))
+        else:
+            vk_manager.ui.print_info("Фоновых задач нет")
+        
+        print(f"\n{Colors.BRIGHT_CYAN}🎮 Управление:{Colors.RESET}")
+        print(f"   {Colors.BRIGHT_YELLOW}Enter{Colors.RESET} - Обновить")
+        print(f"   {Colors.BRIGHT_YELLOW}c[номер]{Colors.RESET} - Отменить задачу (например: c3), {Colors.BRIGHT_YELLOW}ca{Colors.RESET} - отменить все")
+        print(f"   {Colors.BRIGHT_YELLOW}x{Colors.RESET} - Убрать завершенные")
+        print(f"   {Colors.BRIGHT_YELLOW}q{Colors.RESET} - Выход в меню")
+        
+        choice = vk_manager.ui.get_input("\nВаш выбор: ").strip().lower()
+        
+        if choice == 'q':
+            break
+        elif choice == 'x':
+            vk_manager.jobs.clear_finished()
+        elif choice == 'ca':
+            for job in jobs:
+                job.cancel()
+        elif choice.startswith('c') and choice[1:].isdigit():
+            job = vk_manager.jobs.get(int(choice[1:]))
+            if job:
+                job.cancel()
+            else:
+                vk_manager.ui.print_error("Нет задачи с таким номером")
+                vk_manager.ui.get_input("\nНажмите Enter чтобы продолжить...")
+
+def all_friends_music(vk_manager, restart=False):
+    """Музыка всех друзей одним списком (обход продолжается после прерывания)"""
+    from crawler import FriendsCrawler
+    
+    crawler = FriendsCrawler(vk_manager)
+    vk_manager.ui.print_info("Загрузка музыки всех друзей... (Ctrl-C - прервать, прогресс сохранится)")
+    result = run_job(vk_manager, "Музыка всех друзей", crawler.crawl, restart)
+
+    if not result.get("success"):
+        if result.get("error") == "Отменено пользователем":
+            vk_manager.ui.print_warning("Обход прерван, в следующий раз он продолжится с того же места")
+        else:
+            vk_manager.ui.print_error(f"Не удалось загрузить музыку друзей: {result.get('error')}")
+        return
+
+    if result["resumed"]:
+        vk_manager.ui.print_info(f"Продолжен прежний обход: {result['resumed']} друзей уже были загружены")
+    vk_manager.ui.print_success(
+        f"Друзей: {result['friends']}, загружено: {result['crawled']}, "
+        f"музыка закрыта: {result['closed']}, ошибок: {result['failed']}"
+    )
+
+    if result["audio_list"]:
+        interactive_audio_player(result["audio_list"], "МУЗЫКА ВСЕХ ДРУЗЕЙ", vk_manager)
+    else:
+        vk_manager.ui.print_info("У друзей нет доступных аудиозаписей")
+
 def friends_music_interactive(vk_manager):
     """Интерактивное прослушивание музыки друзей"""
     if not vk_manager.token:
@@ -37,7 +149,7 @@ def friends_music_interactive(vk_manager):
     
     # Получаем список друзей
     vk_manager.ui.print_info("Загрузка списка друзей...")
-    friends_result = vk_manager.get_friends_list()
+    friends_result = run_job(vk_manager, "Список друзей", vk_manager.get_friends_list)
     
     if not friends_result.get("success"):
         vk_manager.ui.print_error(f"Не удалось получить список друзей: {friends_result.get('error')}")
@@ -49,30 +161,34 @@ def friends_music_interactive(vk_manager):
         vk_manager.ui.print_info("У вас нет друзей или доступ к списку друзей ограничен")
         return
     
+    def format_friend_row(number, friend, selected):
+        color = Colors.BRIGHT_WHITE if number % 2 == 0 else Colors.WHITE
+        return (f"{Colors.BRIGHT_YELLOW}{number:3d}.{Colors.RESET} "
+                f"{color}{friend.get('first_name', '')} {friend.get('last_name', '')}{Colors.RESET}")
+    
+    friends_view = ListView(friends, format_friend_row, reserved_lines=FRIENDS_RESERVED_LINES)
+    
     while True:
-        print(f"\n{Colors.BRIGHT_CYAN}👥 Список друзей:{Colors.RESET}")
-        print(f"{Colors.BRIGHT_BLACK}{'─' * 80}{Colors.RESET}")
-        
-        for i, friend in enumerate(friends, 1):
-            first_name = friend.get('first_name', '')
-            last_name = friend.get('last_name', '')
-            
-            if i % 2 == 0:
-                color = Colors.BRIGHT_WHITE
-            else:
-                color = Colors.WHITE
-            
-            print(f"{Colors.BRIGHT_YELLOW}{i:3d}.{Colors.RESET} {color}{first_name} {last_name}{Colors.RESET}")
-        
-        print(f"\n{Colors.BRIGHT_CYAN}🎮 Управление:{Colors.RESET}")
-        print(f"   {Colors.BRIGHT_YELLOW}[1-{len(friends)}]{Colors.RESET} - Выбрать друга для просмотра музыки")
-        print(f"   {Colors.BRIGHT_YELLOW}q{Colors.RESET} - Выход в меню")
-        print(f"   {Colors.BRIGHT_YELLOW}r{Colors.RESET} - Случайный друг")
+        write_frame([
+            f"\n{Colors.BRIGHT_CYAN}👥 Список друзей:{Colors.RESET}",
+            f"{Colors.BRIGHT_BLACK}{'─' * 80}{Colors.RESET}",
+            *friends_view.render(),
+            f"\n{Colors.BRIGHT_CYAN}🎮 Управление:{Colors.RESET}",
+            f"   {Colors.BRIGHT_YELLOW}[1-{len(friends)}]{Colors.RESET} - Выбрать друга для просмотра музыки",
+            f"   {Colors.BRIGHT_YELLOW}q{Colors.RESET} - Выход в меню",
+            f"   {Colors.BRIGHT_YELLOW}r{Colors.RESET} - Случайный друг",
+            f"   {Colors.BRIGHT_YELLOW}a{Colors.RESET} - Музыка всех друзей "
+            f"({Colors.BRIGHT_YELLOW}ar{Colors.RESET} - загрузить заново)"
+        ])
         
         choice = vk_manager.ui.get_input("\nВаш выбор: ").strip().lower()
         
         if choice == 'q':
             break
+        elif friends_view.handle_command(choice):
+            continue
+        elif choice in ('a', 'ar'):
+            all_friends_music(vk_manager, restart=choice == 'ar')
         elif choice == 'r':
             import random
             friend = random.choice(friends)
@@ -82,7 +198,7 @@ def friends_music_interactive(vk_manager):
             friend_name = f"{first_name} {last_name}"
             
             vk_manager.ui.print_info(f"Загружаем музыку случайного друга: {friend_name}")
-            audio_result = vk_manager.get_friend_audio_list(friend_id)
+            audio_result = run_job(vk_manager, f"Музыка друга: {friend_name}", vk_manager.get_friend_audio_list, friend_id)
             
             if audio_result.get("success"):
                 audio_list = audio_result["audio_list"]
@@ -103,7 +219,7 @@ def friends_music_interactive(vk_manager):
                     friend_name = f"{first_name} {last_name}"
                     
                     vk_manager.ui.print_info(f"Загружаем музыку друга: {friend_name}")
-                    audio_result = vk_manager.get_friend_audio_list(friend_id)
+                    audio_result = run_job(vk_manager, f"Музыка друга: {friend_name}", vk_manager.get_friend_audio_list, friend_id)
                     
                     if audio_result.get("success"):
                         audio_list = audio_result["audio_list"]
@@ -118,6 +234,186 @@ def friends_music_interactive(vk_manager):
             except ValueError:
                 vk_manager.ui.print_error("Неверный ввод")
 
+def all_groups_music(vk_manager, groups):
+    """Музыка всех групп одним списком без дублей"""
+    from jobs import current_job
+    from ledger import track_key
+    
+    def load():
+        job = current_job()
+        audio_list, seen, closed = [], set(), 0
+        group_ids = [group.get('id') for group in groups]
+        job.update(done=0, total=len(group_ids))
+        # Первые страницы библиотек пачки групп уходят одним execute
+        for start in range(0, len(group_ids), CRAWL_BATCH_SIZE):
+            chunk = group_ids[start:start + CRAWL_BATCH_SIZE]
+            for result in vk_manager.get_groups_audio_lists(chunk).values():
+                if not result.get("success"):
+                    closed += 1
+                    continue
+                for track in result["audio_list"]:
+                    key = track_key(track)
+                    if key not in seen:
+                        seen.add(key)
+                        audio_list.append(track)
+            job.update(done=start + len(chunk))
+            job.check()
+        return {"success": True, "audio_list": audio_list, "closed": closed}
+    
+    vk_manager.ui.print_info("Загрузка музыки всех групп... (Ctrl-C - прервать)")
+    result = run_job(vk_manager, "Музыка всех групп", load)
+    if not result.get("success"):
+        vk_manager.ui.print_error(f"Не удалось загрузить музыку групп: {result.get('error')}")
+        return
+    
+    if result["closed"]:
+        vk_manager.ui.print_info(f"Групп с недоступной музыкой: {result['closed']}")
+    if result["audio_list"]:
+        interactive_audio_player(result["audio_list"], "МУЗЫКА ВСЕХ ГРУПП", vk_manager)
+    else:
+        vk_manager.ui.print_info("В группах нет доступных аудиозаписей")
+
+def groups_music_interactive(vk_manager):
+    """Интерактивное прослушивание музыки групп"""
+    if not vk_manager.token:
+        vk_manager.ui.print_error("Токен не установлен")
+        return
+    
+    vk_manager.ui.print_header("МУЗЫКА ГРУПП")
+    
+    vk_manager.ui.print_info("Загрузка списка групп...")
+    groups_result = run_job(vk_manager, "Список групп", vk_manager.get_groups_list)
+    
+    if not groups_result.get("success"):
+        vk_manager.ui.print_error(f"Не удалось получить список групп: {groups_result.get('error')}")
+        return
+    
+    groups = groups_result["groups"]
+    
+    if not groups:
+        vk_manager.ui.print_info("Вы не состоите в группах или доступ к списку групп ограничен")
+        return
+    
+    def format_group_row(number, group, selected):
+        color = Colors.BRIGHT_WHITE if number % 2 == 0 else Colors.WHITE
+        return f"{Colors.BRIGHT_YELLOW}{number:3d}.{Colors.RESET} {color}{group.get('name', '')}{Colors.RESET}"
+    
+    groups_view = ListView(groups, format_group_row, reserved_lines=FRIENDS_RESERVED_LINES)
+    
+    while True:
+        write_frame([
+            f"\n{Colors.BRIGHT_CYAN}👥 Список групп:{Colors.RESET}",
+            f"{Colors.BRIGHT_BLACK}{'─' * 80}{Colors.RESET}",
+            *groups_view.render(),
+            f"\n{Colors.BRIGHT_CYAN}🎮 Управление:{Colors.RESET}",
+            f"   {Colors.BRIGHT_YELLOW}[1-{len(groups)}]{Colors.RESET} - Выбрать группу для просмотра музыки",
+            f"   {Colors.BRIGHT_YELLOW}q{Colors.RESET} - Выход в меню",
+            f"   {Colors.BRIGHT_YELLOW}a{Colors.RESET} - Музыка всех групп"
+        ])
+        
+        choice = vk_manager.ui.get_input("\nВаш выбор: ").strip().lower()
+        
+        if choice == 'q':
+            break
+        elif groups_view.handle_command(choice):
+            continue
+        elif choice == 'a':
+            all_groups_music(vk_manager, groups)
+        else:
+            try:
+                group_index = int(choice) - 1
+            except ValueError:
+                vk_manager.ui.print_error("Неверный ввод")
+                continue
+            if not 0 <= group_index < len(groups):
+                vk_manager.ui.print_error("Неверный номер группы")
+                continue
+            
+            group = groups[group_index]
+            group_name = group.get('name', '')
+            vk_manager.ui.print_info(f"Загружаем музыку группы: {group_name}")
+            audio_result = run_job(vk_manager, f"Музыка группы: {group_name}", vk_manager.get_group_audio_list, group.get('id'))
+            
+            if audio_result.get("success"):
+                if audio_result["audio_list"]:
+                    interactive_audio_player(audio_result["audio_list"], f"МУЗЫКА ГРУППЫ: {group_name}", vk_manager)
+                else:
+                    vk_manager.ui.print_info(f"В группе {group_name} нет аудиозаписей")
+            elif audio_result.get("closed"):
+                vk_manager.ui.print_info(f"Аудиозаписи группы {group_name} закрыты")
+            else:
+                vk_manager.ui.print_error(f"Не удалось загрузить музыку: {audio_result.get('error')}")
+
+def load_playlist_library(vk_manager, playlists):
+    """Загрузить треки всех плейлистов; PlaylistLibrary или None"""
+    from library import PlaylistLibrary
+    
+    vk_manager.ui.print_info(f"🔄 Загружаем треки всех плейлистов ({len(playlists)})... (Ctrl-C - прервать)")
+    library = vk_manager.jobs.run("Все плейлисты", lambda job: PlaylistLibrary(playlists).load(vk_manager))
+    if library is None:
+        vk_manager.ui.print_warning("Загрузка плейлистов прервана")
+        return None
+    
+    summary = library.summary()
+    vk_manager.ui.print_success(
+        f"✅ Загружено плейлистов: {summary['playlists']}, треков: {summary['entries']}, "
+        f"без повторов: {summary['unique']}"
+    )
+    if summary["failed"]:
+        vk_manager.ui.print_warning(f"Не удалось загрузить плейлистов: {summary['failed']}")
+    return library
+
+def playlist_library_interactive(vk_manager, library):
+    """Выборки по трекам всех плейлистов и полное скачивание"""
+    playlists = library.playlists
+    
+    while True:
+        summary = library.summary()
+        write_frame([
+            f"\n{Colors.BRIGHT_CYAN}📚 Все плейлисты:{Colors.RESET} "
+            f"{summary['playlists']} плейлистов, {summary['unique']} треков без повторов, "
+            f"{summary['shared']} в нескольких плейлистах",
+            f"\n{Colors.BRIGHT_CYAN}🎮 Управление:{Colors.RESET}",
+            f"   {Colors.BRIGHT_YELLOW}p{Colors.RESET} - Слушать все треки без повторов",
+            f"   {Colors.BRIGHT_YELLOW}m{Colors.RESET} - Треки, которые есть в {PLAYLIST_SHARED_MIN}+ плейлистах "
+            f"({Colors.BRIGHT_YELLOW}m<N>{Colors.RESET} - в N+ плейлистах)",
+            f"   {Colors.BRIGHT_YELLOW}u<N>{Colors.RESET} - Треки, которые есть только в плейлисте N",
+            f"   {Colors.BRIGHT_YELLOW}da{Colors.RESET} - Скачать все плейлисты (общие треки - один раз)",
+            f"   {Colors.BRIGHT_YELLOW}q{Colors.RESET} - Назад к списку плейлистов"
+        ])
+        
+        choice = vk_manager.ui.get_input("\nВаш выбор: ").strip().lower()
+        
+        if choice == 'q':
+            break
+        elif choice == 'p':
+            interactive_audio_player(library.all_tracks(), "ВСЕ ПЛЕЙЛИСТЫ", vk_manager)
+        elif choice.startswith('m') and (choice == 'm' or choice[1:].isdigit()):
+            min_playlists = int(choice[1:]) if choice[1:] else PLAYLIST_SHARED_MIN
+            tracks = library.shared(min_playlists)
+            if tracks:
+                interactive_audio_player(tracks, f"ТРЕКИ В {min_playlists}+ ПЛЕЙЛИСТАХ", vk_manager)
+            else:
+                vk_manager.ui.print_info(f"Нет треков, которые есть в {min_playlists}+ плейлистах")
+        elif choice.startswith('u') and choice[1:].isdigit():
+            number = int(choice[1:]) - 1
+            if not 0 <= number < len(playlists):
+                vk_manager.ui.print_error("Неверный номер плейлиста")
+                continue
+            title = playlists[number].get('title', 'Без названия')
+            tracks = library.only_in(number)
+            if tracks:
+                interactive_audio_player(tracks, f"ТОЛЬКО В ПЛЕЙЛИСТЕ: {title}", vk_manager)
+            else:
+                vk_manager.ui.print_info(f"Все треки плейлиста {title} есть и в других плейлистах")
+        elif choice == 'da':
+            tracks = library.all_tracks()
+            job = vk_manager.start_download(tracks, "downloads", DOWNLOAD_WORKERS, "Все плейлисты")
+            vk_manager.ui.print_info(f"Скачивание {len(tracks)} треков запущено в фоне (задача #{job.id}). "
+                                     f"Ход загрузки - в меню фоновых задач")
+        else:
+            vk_manager.ui.print_error("Неверный ввод")
+
 def playlists_interactive(vk_manager):
     """Интерактивное управление плейлистами - ИСПРАВЛЕННАЯ ВЕРСИЯ"""
     if not vk_manager.token or not vk_manager.user_id:
@@ -128,12 +424,12 @@ def playlists_interactive(vk_manager):
     
     vk_manager.ui.print_info("Загрузка плейлистов...")
     # Используем метод с полной информацией
-    playlists_result = vk_manager.get_playlists_with_access()
+    playlists_result = run_job(vk_manager, "Плейлисты", vk_manager.get_playlists_with_access)
     
     if not playlists_result.get("success"):
         vk_manager.ui.print_error(f"Не удалось получить список плейлистов: {playlists_result.get('error')}")
         vk_manager.ui.print_info("Попробуем альтернативный метод...")
-        playlists_result = vk_manager.get_playlists()
+        playlists_result = run_job(vk_manager, "Плейлисты", vk_manager.get_playlists)
         
         if not playlists_result.get("success"):
             vk_manager.ui.print_error(f"Альтернативный метод также не сработал: {playlists_result.get('error')}")
@@ -152,6 +448,7 @@ def playlists_interactive(vk_manager):
         return
     
     last_selected_playlist = None
+    library = None
     
     while True:
         vk_manager.ui.clear_screen()
@@ -208,6 +505,7 @@ def playlists_interactive(vk_manager):
         print(f"   {Colors.BRIGHT_YELLOW}l{Colors.RESET} - Открыть последний выбранный плейлист в браузере")
         print(f"   {Colors.BRIGHT_YELLOW}r{Colors.RESET} - Обновить список плейлистов")
         print(f"   {Colors.BRIGHT_YELLOW}d{Colors.RESET} - Подробная информация о плейлистах")
+        print(f"   {Colors.BRIGHT_YELLOW}a{Colors.RESET} - Все плейлисты сразу: общие треки, скачивание всего")
         print(f"   {Colors.BRIGHT_YELLOW}q{Colors.RESET} - Выход в главное меню")
         
         choice = vk_manager.ui.get_input("\nВаш выбор: ").strip().lower()
@@ -216,9 +514,10 @@ def playlists_interactive(vk_manager):
             break
         elif choice == 'r':
             vk_manager.ui.print_info("🔄 Обновление списка плейлистов...")
-            playlists_result = vk_manager.get_playlists_with_access()
+            playlists_result = run_job(vk_manager, "Плейлисты", vk_manager.get_playlists_with_access, refresh=True)
             if playlists_result.get("success"):
                 playlists = playlists_result["playlists"]
+                library = None
                 vk_manager.ui.print_success(f"✅ Обновлено! Найдено {len(playlists)} плейлистов")
             else:
                 vk_manager.ui.print_error("❌ Не удалось обновить список")
@@ -236,6 +535,12 @@ def playlists_interactive(vk_manager):
             print(f"   🎵 Всего треков во всех плейлистах: {total_tracks}")
             print(f"   👥 Всего подписчиков: {total_followers}")
             print(f"   🔐 Приватных плейлистов: {private_playlists}")
+            if library is not None:
+                summary = library.summary()
+                print(f"   🎶 Треков без повторов: {summary['unique']}")
+                print(f"   🔁 Треков в нескольких плейлистах: {summary['shared']}")
+            else:
+                print(f"   {Colors.BRIGHT_BLACK}(a - загрузить все плейлисты и посчитать повторы){Colors.RESET}")
             
             if 'raw_data' in playlists_result:
                 print(f"\n{Colors.BRIGHT_CYAN}🔧 Техническая информация:{Colors.RESET}")
@@ -243,6 +548,11 @@ def playlists_interactive(vk_manager):
                 print(f"   Токен: {'Есть' if vk_manager.token else 'Нет'}")
             
             vk_manager.ui.get_input("\nНажмите Enter чтобы продолжить...")
+        elif choice == 'a':
+            if library is None:
+                library = load_playlist_library(vk_manager, playlists)
+            if library is not None:
+                playlist_library_interactive(vk_manager, library)
         elif choice == 'l' and last_selected_playlist:
             # Открыть последний выбранный плейлист в браузере
             import webbrowser
@@ -273,7 +583,8 @@ def playlists_interactive(vk_manager):
                         vk_manager.ui.print_info(f"   Ключ доступа: {access_key[:10]}...")
                     
                     # Используем исправленный метод с ВСЕМИ параметрами
-                    tracks_result = vk_manager.get_playlist_tracks(
+                    tracks_result = run_job(
+                        vk_manager, f"Плейлист: {playlist_title}", vk_manager.get_playlist_tracks,
                         playlist_id=playlist_id,
                         owner_id=owner_id,
                         access_key=access_key
@@ -322,7 +633,7 @@ def playlists_interactive(vk_manager):
                         # Пробуем стандартный метод audio.get для владельца
                         if owner_id == vk_manager.user_id:
                             vk_manager.ui.print_info("Пробуем загрузить все мои аудиозаписи...")
-                            all_tracks = vk_manager.get_my_audio_list()
+                            all_tracks = run_job(vk_manager, "Моя музыка", vk_manager.get_my_audio_list)
                             if all_tracks.get("success") and all_tracks["audio_list"]:
                                 vk_manager.ui.print_success(f"✅ Загружено {len(all_tracks['audio_list'])} треков")
                                 vk_manager.ui.get_input("\nНажмите Enter чтобы открыть плеер...")
@@ -343,12 +654,17 @@ def search_tracks_interactive(vk_manager):
         return
     
     vk_manager.ui.print_header("ПОИСК ТРЕКОВ")
+    vk_manager.ui.print_info("l - поиск по уже загруженной музыке без обращения к VK")
     
     while True:
         query = vk_manager.ui.get_input("Введите запрос для поиска (или 'q' для выхода): ").strip()
         
         if query.lower() == 'q':
             break
+        
+        if query.lower() == 'l':
+            local_search_interactive(vk_manager)
+            continue
             
         if not query:
             vk_manager.ui.print_error("Запрос не может быть пустым")
@@ -356,7 +672,7 @@ def search_tracks_interactive(vk_manager):
         
         vk_manager.ui.print_info(f"Ищем: {query}")
         
-        result = vk_manager.search_audio(query)
+        result = run_job(vk_manager, f"Поиск: {query}", vk_manager.search_audio, query)
         if not result["success"]:
             vk_manager.ui.print_error(f"Ошибка поиска: {result.get('error')}")
             continue
@@ -367,8 +683,49 @@ def search_tracks_interactive(vk_manager):
             vk_manager.ui.print_info("По вашему запросу ничего не найдено")
             continue
         
-        vk_manager.ui.print_success(f"Найдено результатов: {len(audio_list)}")
-        interactive_audio_player(audio_list, "РЕЗУЛЬТАТЫ ПОИСКА", vk_manager)
+        vk_manager.ui.print_success(f"Найдено результатов: {result['total_count']}, загружено {len(audio_list)}")
+        interactive_audio_player(audio_list, "РЕЗУЛЬТАТЫ ПОИСКА", vk_manager, search=result.get("search"))
+
+def local_search_interactive(vk_manager):
+    """Поиск по локальному индексу загруженных списков (моя музыка, плейлисты, друзья)"""
+    stats = vk_manager.search_index.summary()
+    vk_manager.ui.print_header("ПОИСК ПО ЗАГРУЖЕННОЙ МУЗЫКЕ")
+    vk_manager.ui.print_info(f"В индексе {stats['tracks']} треков из {stats['sources']} списков")
+    
+    query = vk_manager.ui.get_input("Введите запрос (или 'q' для выхода): ").strip()
+    while query.lower() != 'q':
+        if not query:
+            query = vk_manager.ui.get_input("Введите запрос (или 'q' для выхода): ").strip()
+            continue
+        
+        started = time.perf_counter()
+        results = vk_manager.search_index.search(query)
+        elapsed = (time.perf_counter() - started) * 1000
+        
+        if not results:
+            vk_manager.ui.print_info(f"Ничего не найдено ({elapsed:.1f} мс)")
+            query = vk_manager.ui.get_input("\nНовый запрос (или 'q' для выхода): ").strip()
+            continue
+        
+        if results[0]["corrected"]:
+            vk_manager.ui.print_warning("Точных совпадений нет, показаны результаты с исправлением опечаток")
+        vk_manager.ui.print_success(f"Найдено: {len(results)} ({elapsed:.1f} мс)")
+        
+        # Первые результаты с источниками, весь список - в плеере
+        lines = []
+        for number, result in enumerate(results[:LOCAL_SEARCH_PREVIEW], 1):
+            lines.append(format_track_row(number, result["track"], False))
+            lines.append(f"      {Colors.BRIGHT_BLACK}{', '.join(result['sources'])}{Colors.RESET}")
+        if len(results) > LOCAL_SEARCH_PREVIEW:
+            lines.append(f"{Colors.BRIGHT_BLACK}... и еще {len(results) - LOCAL_SEARCH_PREVIEW}{Colors.RESET}")
+        write_frame(lines)
+        
+        choice = vk_manager.ui.get_input("\nEnter - открыть в плеере, новый запрос или 'q' для выхода: ").strip()
+        if not choice:
+            interactive_audio_player([result["track"] for result in results], f"ПОИСК: {query}", vk_manager)
+            query = vk_manager.ui.get_input("\nНовый запрос (или 'q' для выхода): ").strip()
+        else:
+            query = choice
 
 def get_recommendations_info(vk_manager):
     """Рекомендации по использованию VK API"""
@@ -397,29 +754,24 @@ def get_recommendations_info(vk_manager):
         ("photos.get", "Фотографии")
     ]
     
-    for method, description in test_methods:
-        url = f"https://api.vk.com/method/{method}"
-        params = {
-            "access_token": vk_manager.token,
-            "v": "5.131",
-            "count": 1
-        }
-        
+    # Все проверки независимы - отправляем их одним запросом execute
+    futures = [
+        (description, vk_manager.batcher.submit(method, count=1))
+        for method, description in test_methods
+    ]
+    vk_manager.batcher.flush()
+    
+    for description, future in futures:
         try:
-            response = requests.get(url, params=params, headers=vk_manager.headers)
-            data = response.json()
-            
-            if "response" in data:
-                available_methods.append(description)
-            else:
-                error_code = data.get("error", {}).get("error_code", 0)
-                if error_code == 15:
-                    unavailable_methods.append(f"{description} (нет доступа)")
-                else:
-                    unavailable_methods.append(f"{description} (ошибка: {error_code})")
-                    
-        except Exception:
+            future.result()
+            available_methods.append(description)
+        except VKNetworkError:
             unavailable_methods.append(f"{description} (ошибка запроса)")
+        except VKAPIError as e:
+            if e.error_code == 15:
+                unavailable_methods.append(f"{description} (нет доступа)")
+            else:
+                unavailable_methods.append(f"{description} (ошибка: {e.error_code})")
     
     recommendations.append("✅ Токен валиден и работает")
     recommendations.append(f"👤 Пользователь: {validity['user_info'].get('first_name', '')} {validity['user_info'].get('last_name', '')}")
@@ -493,52 +845,24 @@ def playlist_diagnostics(vk_manager):
     # Тест 2: Проверка метода getPlaylists
     vk_manager.ui.print_info("🔍 Проверка доступа к плейлистам...")
     
-    url = "https://api.vk.com/method/audio.getPlaylists"
-    params = {
-        "access_token": vk_manager.token,
-        "v": "5.131",
-        "owner_id": vk_manager.user_id,
-        "count": 1
-    }
-    
     try:
-        response = requests.get(url, params=params, headers=vk_manager.headers)
-        data = response.json()
-        
-        if "response" in data:
-            count = data["response"]["count"]
-            vk_manager.ui.print_success(f"✅ Метод audio.getPlaylists доступен (найдено: {count} плейлистов)")
-        else:
-            error_msg = data.get("error", {}).get("error_msg", "Неизвестная ошибка")
-            error_code = data.get("error", {}).get("error_code", 0)
-            vk_manager.ui.print_error(f"❌ Метод audio.getPlaylists недоступен: {error_msg} (код: {error_code})")
-    except Exception as e:
-        vk_manager.ui.print_error(f"❌ Ошибка запроса: {e}")
+        response = vk_manager.call("audio.getPlaylists", refresh=True, owner_id=vk_manager.user_id, count=1)
+        vk_manager.ui.print_success(f"✅ Метод audio.getPlaylists доступен (найдено: {response['count']} плейлистов)")
+    except VKNetworkError as e:
+        vk_manager.ui.print_error(f"❌ {e.error_msg}")
+    except VKAPIError as e:
+        vk_manager.ui.print_error(f"❌ Метод audio.getPlaylists недоступен: {e.error_msg} (код: {e.error_code})")
     
     # Тест 3: Проверка метода audio.get
     vk_manager.ui.print_info("🔍 Проверка доступа к аудиозаписям...")
     
-    url2 = "https://api.vk.com/method/audio.get"
-    params2 = {
-        "access_token": vk_manager.token,
-        "v": "5.131",
-        "owner_id": vk_manager.user_id,
-        "count": 1
-    }
-    
     try:
-        response2 = requests.get(url2, params=params2, headers=vk_manager.headers)
-        data2 = response2.json()
-        
-        if "response" in data2:
-            count2 = data2["response"]["count"]
-            vk_manager.ui.print_success(f"✅ Метод audio.get доступен (найдено: {count2} треков)")
-        else:
-            error_msg2 = data2.get("error", {}).get("error_msg", "Неизвестная ошибка")
-            error_code2 = data2.get("error", {}).get("error_code", 0)
-            vk_manager.ui.print_error(f"❌ Метод audio.get недоступен: {error_msg2} (код: {error_code2})")
-    except Exception as e:
-        vk_manager.ui.print_error(f"❌ Ошибка запроса: {e}")
+        response = vk_manager.call("audio.get", refresh=True, owner_id=vk_manager.user_id, count=1)
+        vk_manager.ui.print_success(f"✅ Метод audio.get доступен (найдено: {response['count']} треков)")
+    except VKNetworkError as e:
+        vk_manager.ui.print_error(f"❌ {e.error_msg}")
+    except VKAPIError as e:
+        vk_manager.ui.print_error(f"❌ Метод audio.get недоступен: {e.error_msg} (код: {e.error_code})")
     
     # Рекомендации
     vk_manager.ui.print_info("\n💡 Рекомендации по решению проблем:")
@@ -562,7 +886,18 @@ def main():
     
     os.chdir(app_path)
     
-    ui = ConsoleUI()
+    ui = create_ui()
+    vk_manager = VKMusicManager(ui)
+    try:
+        run_menu(ui, vk_manager)
+    finally:
+        if vk_manager.jobs.active_count():
+            ui.print_info("Останавливаю фоновые задачи...")
+        vk_manager.jobs.shutdown()
+        ui.close()
+
+def run_menu(ui, vk_manager):
+    """Приветствие и главное меню"""
     ui.clear_screen()
     
     # Приветственный экран
@@ -578,180 +913,233 @@ def main():
     """
     
     print(welcome_art)
-    print(f"\n{Colors.BRIGHT_BLACK}Нажмите Enter чтобы начать...{Colors.RESET}")
-    input()
-    
-    vk_manager = VKMusicManager(ui)
+    ui.get_input("\nНажмите Enter чтобы начать...", Colors.BRIGHT_BLACK)
     
     while True:
         ui.clear_screen()
-        show_main_menu()
+        show_main_menu(vk_manager.cache.summary(), vk_manager.jobs.active_count())
         
-        choice = ui.get_input("\nВаш выбор (1-12): ").strip()
+        choice = ui.get_input("\nВаш выбор (1-12, j): ").strip().lower()
         
-        if choice == "1":
-            ui.clear_screen()
-            ui.print_header("ЗАГРУЗКА ТОКЕНА ИЗ ФАЙЛА")
-            if vk_manager.load_token_from_file():
-                validity = vk_manager.check_token_validity()
-                if validity["valid"]:
-                    ui.print_success(f"Токен валиден! Добро пожаловать, {validity['user_info'].get('first_name', '')}!")
-                else:
-                    ui.print_error(f"Токен невалиден: {validity.get('error_msg')}")
+        try:
+            if not handle_menu_choice(choice, ui, vk_manager):
+                break
+        except KeyboardInterrupt:
+            # Ctrl-C прерывает текущее действие, а не всю программу
+            ui.print_warning("\nДействие прервано. Фоновые задачи продолжают работу")
             ui.get_input("\nНажмите Enter чтобы продолжить...")
+
+def handle_menu_choice(choice, ui, vk_manager):
+    """Выполнить пункт главного меню; False - выйти из программы"""
+    if choice == "1":
+        ui.clear_screen()
+        ui.print_header("ЗАГРУЗКА ТОКЕНА ИЗ ФАЙЛА")
+        if vk_manager.load_token_from_file():
+            validity = vk_manager.check_token_validity()
+            if validity["valid"]:
+                ui.print_success(f"Токен валиден! Добро пожаловать, {validity['user_info'].get('first_name', '')}!")
+            else:
+                ui.print_error(f"Токен невалиден: {validity.get('error_msg')}")
+        ui.get_input("\nНажмите Enter чтобы продолжить...")
+        
+    elif choice == "2":
+        ui.clear_screen()
+        if vk_manager.input_token_manually():
+            validity = vk_manager.check_token_validity()
+            if validity["valid"]:
+                ui.print_success(f"Токен установлен! Добро пожаловать, {validity['user_info'].get('first_name', '')}!")
+        ui.get_input("\nНажмите Enter чтобы продолжить...")
+        
+    elif choice == "3":
+        show_auth_help(ui)
+        ui.get_input("\nНажмите Enter чтобы продолжить...")
+        
+    elif choice == "4":
+        if not vk_manager.token:
+            ui.print_error("Токен не загружен. Сначала загрузите токен (пункт 1 или 2)")
+            ui.get_input("\nНажмите Enter чтобы продолжить...")
+            return True
             
-        elif choice == "2":
-            ui.clear_screen()
-            if vk_manager.input_token_manually():
-                validity = vk_manager.check_token_validity()
-                if validity["valid"]:
-                    ui.print_success(f"Токен установлен! Добро пожаловать, {validity['user_info'].get('first_name', '')}!")
+        validity = vk_manager.check_token_validity()
+        if not validity["valid"]:
+            ui.print_error(f"Токен невалиден: {validity.get('error_msg')}")
             ui.get_input("\nНажмите Enter чтобы продолжить...")
+            return True
+        
+        audio_result = run_job(vk_manager, "Моя музыка", vk_manager.get_my_audio_list)
+        if audio_result.get("success"):
+            interactive_audio_player(audio_result["audio_list"], "МОЯ МУЗЫКА", vk_manager)
+        else:
+            ui.print_error(f"Не удалось загрузить музыку: {audio_result.get('error')}")
             
-        elif choice == "3":
-            show_auth_help()
+    elif choice == "5":
+        if not vk_manager.token:
+            ui.print_error("Токен не загрушен. Сначала загрузите токен (пункт 1 или 2)")
             ui.get_input("\nНажмите Enter чтобы продолжить...")
+            return True
             
-        elif choice == "4":
-            if not vk_manager.token:
-                ui.print_error("Токен не загружен. Сначала загрузите токен (пункт 1 или 2)")
-                ui.get_input("\nНажмите Enter чтобы продолжить...")
-                continue
-                
-            validity = vk_manager.check_token_validity()
-            if not validity["valid"]:
-                ui.print_error(f"Токен невалиден: {validity.get('error_msg')}")
-                ui.get_input("\nНажмите Enter чтобы продолжить...")
-                continue
+        validity = vk_manager.check_token_validity()
+        if not validity["valid"]:
+            ui.print_error(f"Токен невалиден: {validity.get('error_msg')}")
+            ui.get_input("\nНажмите Enter чтобы продолжить...")
+            return True
+        
+        friends_music_interactive(vk_manager)
+        
+    elif choice == "g":
+        if not vk_manager.token:
+            ui.print_error("Токен не загружен. Сначала загрузите токен (пункт 1 или 2)")
+            ui.get_input("\nНажмите Enter чтобы продолжить...")
+            return True
+        
+        groups_music_interactive(vk_manager)
             
-            audio_result = vk_manager.get_my_audio_list()
-            if audio_result.get("success"):
-                interactive_audio_player(audio_result["audio_list"], "МОЯ МУЗЫКА", vk_manager)
-            else:
-                ui.print_error(f"Не удалось загрузить музыку: {audio_result.get('error')}")
-                
-        elif choice == "5":
-            if not vk_manager.token:
-                ui.print_error("Токен не загрушен. Сначала загрузите токен (пункт 1 или 2)")
-                ui.get_input("\nНажмите Enter чтобы продолжить...")
-                continue
-                
-            validity = vk_manager.check_token_validity()
-            if not validity["valid"]:
-                ui.print_error(f"Токен невалиден: {validity.get('error_msg')}")
-                ui.get_input("\nНажмите Enter чтобы продолжить...")
-                continue
+    elif choice == "6":
+        if not vk_manager.token:
+            ui.print_error("Токен не загружен. Сначала загрузите токен (пункт 1 или 2)")
+            ui.get_input("\nНажмите Enter чтобы продолжить...")
+            return True
             
-            friends_music_interactive(vk_manager)
-                
-        elif choice == "6":
-            if not vk_manager.token:
-                ui.print_error("Токен не загружен. Сначала загрузите токен (пункт 1 или 2)")
-                ui.get_input("\nНажмите Enter чтобы продолжить...")
-                continue
-                
-            validity = vk_manager.check_token_validity()
-            if not validity["valid"]:
-                ui.print_error(f"Токен невалиден: {validity.get('error_msg')}")
-                ui.get_input("\nНажмите Enter чтобы продолжить...")
-                continue
+        validity = vk_manager.check_token_validity()
+        if not validity["valid"]:
+            ui.print_error(f"Токен невалиден: {validity.get('error_msg')}")
+            ui.get_input("\nНажмите Enter чтобы продолжить...")
+            return True
+        
+        playlists_interactive(vk_manager)
             
-            playlists_interactive(vk_manager)
-                
-        elif choice == "7":
-            if not vk_manager.token:
-                ui.print_error("Токен не загружен. Сначала загрузите токен (пункт 1 или 2)")
-                ui.get_input("\nНажмите Enter чтобы продолжить...")
-                continue
-                
-            validity = vk_manager.check_token_validity()
-            if not validity["valid"]:
-                ui.print_error(f"Токен невалиден: {validity.get('error_msg')}")
-                ui.get_input("\nНажмите Enter чтобы продолжить...")
-                continue
+    elif choice == "7":
+        if not vk_manager.token:
+            ui.print_error("Токен не загружен. Сначала загрузите токен (пункт 1 или 2)")
+            ui.get_input("\nНажмите Enter чтобы продолжить...")
+            return True
             
-            audio_result = vk_manager.get_recommendations()
-            if audio_result.get("success"):
-                interactive_audio_player(audio_result["audio_list"], "РЕКОМЕНДАЦИИ", vk_manager)
-            else:
-                ui.print_error(f"Не удалось загрузить рекомендации: {audio_result.get('error')}")
-                
-        elif choice == "8":
-            if not vk_manager.token:
-                ui.print_error("Токен не загружен. Сначала загрузите токен (пункт 1 или 2)")
-                ui.get_input("\nНажмите Enter чтобы продолжить...")
-                continue
-                
-            validity = vk_manager.check_token_validity()
-            if not validity["valid"]:
-                ui.print_error(f"Токен невалиден: {validity.get('error_msg')}")
-                ui.get_input("\nНажмите Enter чтобы продолжить...")
-                continue
+        validity = vk_manager.check_token_validity()
+        if not validity["valid"]:
+            ui.print_error(f"Токен невалиден: {validity.get('error_msg')}")
+            ui.get_input("\nНажмите Enter чтобы продолжить...")
+            return True
+        
+        audio_result = run_job(vk_manager, "Рекомендации", vk_manager.get_recommendations)
+        if audio_result.get("success"):
+            interactive_audio_player(audio_result["audio_list"], "РЕКОМЕНДАЦИИ", vk_manager)
+        else:
+            ui.print_error(f"Не удалось загрузить рекомендации: {audio_result.get('error')}")
             
-            search_tracks_interactive(vk_manager)
-                
-        elif choice == "9":
-            if not vk_manager.token:
-                ui.print_error("Токен не загружен. Сначала загрузите токен (пункт 1 или 2)")
-                ui.get_input("\nНажмите Enter чтобы продолжить...")
-                continue
-                
-            recommendations = get_recommendations_info(vk_manager)
-            ui.clear_screen()
-            ui.print_header("ИНФОРМАЦИЯ О VK API")
+    elif choice == "8":
+        if not vk_manager.token:
+            ui.print_error("Токен не загружен. Сначала загрузите токен (пункт 1 или 2)")
+            ui.get_input("\nНажмите Enter чтобы продолжить...")
+            return True
             
-            for rec in recommendations:
-                if rec.startswith("✅"):
-                    print(f"{Colors.BRIGHT_GREEN}{rec}{Colors.RESET}")
-                elif rec.startswith("❌"):
+        validity = vk_manager.check_token_validity()
+        if not validity["valid"]:
+            ui.print_error(f"Токен невалиден: {validity.get('error_msg')}")
+            ui.get_input("\nНажмите Enter чтобы продолжить...")
+            return True
+        
+        search_tracks_interactive(vk_manager)
+            
+    elif choice == "9":
+        if not vk_manager.token:
+            ui.print_error("Токен не загружен. Сначала загрузите токен (пункт 1 или 2)")
+            ui.get_input("\nНажмите Enter чтобы продолжить...")
+            return True
+            
+        recommendations = get_recommendations_info(vk_manager)
+        ui.clear_screen()
+        ui.print_header("ИНФОРМАЦИЯ О VK API")
+        
+        for rec in recommendations:
+            if rec.startswith("✅"):
+                print(f"{Colors.BRIGHT_GREEN}{rec}{Colors.RESET}")
+            elif rec.startswith("❌"):
+                print(f"{Colors.BRIGHT_RED}{rec}{Colors.RESET}")
+            elif rec.startswith("👤"):
+                print(f"{Colors.BRIGHT_CYAN}{rec}{Colors.RESET}")
+            elif rec.startswith("💡"):
+                print(f"{Colors.BRIGHT_YELLOW}{rec}{Colors.RESET}")
+            elif "•" in rec:
+                if "Доступные" in rec or "Недоступные" in rec:
+                    print(f"{Colors.BRIGHT_WHITE}{rec}{Colors.RESET}")
+                elif "(нет доступа)" in rec:
                     print(f"{Colors.BRIGHT_RED}{rec}{Colors.RESET}")
-                elif rec.startswith("👤"):
-                    print(f"{Colors.BRIGHT_CYAN}{rec}{Colors.RESET}")
-                elif rec.startswith("💡"):
-                    print(f"{Colors.BRIGHT_YELLOW}{rec}{Colors.RESET}")
-                elif "•" in rec:
-                    if "Доступные" in rec or "Недоступные" in rec:
-                        print(f"{Colors.BRIGHT_WHITE}{rec}{Colors.RESET}")
-                    elif "(нет доступа)" in rec:
-                        print(f"{Colors.BRIGHT_RED}{rec}{Colors.RESET}")
-                    else:
-                        print(f"{Colors.WHITE}{rec}{Colors.RESET}")
                 else:
                     print(f"{Colors.WHITE}{rec}{Colors.RESET}")
-                    
-            ui.get_input("\nНажмите Enter чтобы продолжить...")
+            else:
+                print(f"{Colors.WHITE}{rec}{Colors.RESET}")
+        
+        cache_stats = vk_manager.cache.summary()
+        print(f"\n{Colors.BRIGHT_CYAN}📦 Кэш ответов API:{Colors.RESET}")
+        print(f"   {Colors.WHITE}Записей: {cache_stats['entries']}, размер: {cache_stats['bytes'] / 1024 / 1024:.1f} МБ{Colors.RESET}")
+        print(f"   {Colors.WHITE}Попаданий: {cache_stats['hits']}, устаревших: {cache_stats['stale_hits']}, "
+              f"промахов: {cache_stats['misses']}, вытеснено: {cache_stats['evictions']}, "
+              f"обновлено в фоне: {cache_stats['revalidations']}{Colors.RESET}")
+
+        audio_stats = vk_manager.audio_cache.summary()
+        print(f"\n{Colors.BRIGHT_CYAN}🎧 Кэш аудио:{Colors.RESET}")
+        print(f"   {Colors.WHITE}Треков: {audio_stats['entries']}, размер: {audio_stats['bytes'] / 1024 / 1024:.1f} МБ, "
+              f"вытеснено: {audio_stats['evictions']}{Colors.RESET}")
+        print(f"   {Colors.WHITE}Попаданий: {audio_stats['hits']} ({audio_stats['hit_rate']:.0%}), "
+              f"сэкономлено: {audio_stats['bytes_saved'] / 1024 / 1024:.1f} МБ{Colors.RESET}")
+
+        ledger_stats = vk_manager.ledger.summary()
+        print(f"\n{Colors.BRIGHT_CYAN}💾 Журнал загрузок:{Colors.RESET}")
+        print(f"   {Colors.WHITE}Треков: {ledger_stats['entries']}, объем: {ledger_stats['bytes'] / 1024 / 1024:.1f} МБ{Colors.RESET}")
+
+        index_stats = vk_manager.search_index.summary()
+        print(f"\n{Colors.BRIGHT_CYAN}🔎 Поисковый индекс:{Colors.RESET}")
+        print(f"   {Colors.WHITE}Треков: {index_stats['tracks']} из {index_stats['sources']} списков{Colors.RESET}")
+
+        metrics_lines = vk_manager.metrics.format_lines()
+        if metrics_lines:
+            print(f"\n{Colors.BRIGHT_CYAN}📈 Статистика запросов к API:{Colors.RESET}")
+            for line in metrics_lines:
+                print(f"   {Colors.WHITE}{line}{Colors.RESET}")
                 
-        elif choice == "10":
-            show_program_info()
+        ui.get_input("\nНажмите Enter чтобы продолжить...")
+            
+    elif choice == "10":
+        show_program_info()
+        ui.get_input("\nНажмите Enter чтобы продолжить...")
+        
+    elif choice == "11":
+        if not vk_manager.token:
+            ui.print_error("Токен не загружен. Сначала загрузите токен (пункт 1 или 2)")
             ui.get_input("\nНажмите Enter чтобы продолжить...")
+            return True
             
-        elif choice == "11":
-            if not vk_manager.token:
-                ui.print_error("Токен не загружен. Сначала загрузите токен (пункт 1 или 2)")
-                ui.get_input("\nНажмите Enter чтобы продолжить...")
-                continue
-                
-            playlist_diagnostics(vk_manager)
-                
-        elif choice == "12":
-            ui.clear_screen()
-            goodbye_art = f"""
-            {Colors.BRIGHT_CYAN}╔═══════════════════════════════════════════════════════╗{Colors.RESET}
-            {Colors.BRIGHT_CYAN}║                                                       ║{Colors.RESET}
-            {Colors.BRIGHT_CYAN}║    {Colors.BRIGHT_MAGENTA}    Спасибо за использование программы!           {Colors.BRIGHT_CYAN}║{Colors.RESET}
-            {Colors.BRIGHT_CYAN}║                                                       ║{Colors.RESET}
-            {Colors.BRIGHT_CYAN}║         {Colors.BRIGHT_GREEN}До новых встреч в мире музыки!{Colors.BRIGHT_CYAN}               ║{Colors.RESET}
-            {Colors.BRIGHT_CYAN}║                                                       ║{Colors.RESET}
-            {Colors.BRIGHT_CYAN}╚═══════════════════════════════════════════════════════╝{Colors.RESET}
-            """
-            print(goodbye_art)
-            break
+        playlist_diagnostics(vk_manager)
+        
+    elif choice == "j":
+        jobs_interactive(vk_manager)
             
-        else:
-            ui.print_error("Неверный выбор")
-            ui.get_input("\nНажмите Enter чтобы продолжить...")
+    elif choice == "12":
+        ui.clear_screen()
+        goodbye_art = f"""
+        {Colors.BRIGHT_CYAN}╔═══════════════════════════════════════════════════════╗{Colors.RESET}
+        {Colors.BRIGHT_CYAN}║                                                       ║{Colors.RESET}
+        {Colors.BRIGHT_CYAN}║    {Colors.BRIGHT_MAGENTA}    Спасибо за использование программы!           {Colors.BRIGHT_CYAN}║{Colors.RESET}
+        {Colors.BRIGHT_CYAN}║                                                       ║{Colors.RESET}
+        {Colors.BRIGHT_CYAN}║         {Colors.BRIGHT_GREEN}До новых встреч в мире музыки!{Colors.BRIGHT_CYAN}               ║{Colors.RESET}
+        {Colors.BRIGHT_CYAN}║                                                       ║{Colors.RESET}
+        {Colors.BRIGHT_CYAN}╚═══════════════════════════════════════════════════════╝{Colors.RESET}
+        """
+        print(goodbye_art)
+        return False
+        
+    else:
+        ui.print_error("Неверный выбор")
+        ui.get_input("\nНажмите Enter чтобы продолжить...")
+    
+    return True
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # Аргументы командной строки - неинтерактивный режим (см. cli.py)
+        from cli import main as cli_main
+        sys.exit(cli_main(sys.argv[1:]))
+    
     try:
         main()
     except KeyboardInterrupt:
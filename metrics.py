@@ -0,0 +1,70 @@
+import threading
+
+# Подписи счетчиков для вывода в консоль
+COUNTER_LABELS = {
+    "throttled": "Запросов задержано ограничителем",
+    "throttle_wait": "Суммарное ожидание ограничителя, сек",
+    "retried": "Повторов запросов после ошибок",
+    "url_refreshed": "Обновлено устаревших ссылок на треки",
+    "url_refresh_calls": "Запросов audio.getById для обновления ссылок",
+}
+
+class APIMetrics:
+    """Статистика вызовов VK API по методам"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.methods = {}
+        self.counters = {}
+
+    def record(self, method, latency, size, status):
+        """Записать результат одного вызова"""
+        with self._lock:
+            stats = self.methods.setdefault(method, {
+                "calls": 0,
+                "errors": 0,
+                "total_time": 0.0,
+                "max_time": 0.0,
+                "bytes": 0,
+                "statuses": {}
+            })
+            stats["calls"] += 1
+            if status != "ok":
+                stats["errors"] += 1
+            stats["total_time"] += latency
+            stats["max_time"] = max(stats["max_time"], latency)
+            stats["bytes"] += size
+            stats["statuses"][status] = stats["statuses"].get(status, 0) + 1
+
+    def increment(self, name, value=1):
+        """Увеличить именованный счетчик"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self):
+        """Получить копию текущей статистики"""
+        with self._lock:
+            return {
+                method: dict(stats, statuses=dict(stats["statuses"]))
+                for method, stats in self.methods.items()
+            }
+
+    def format_lines(self):
+        """Строки статистики для вывода в консоль"""
+        lines = []
+        for method, stats in sorted(self.snapshot().items()):
+            avg_ms = stats["total_time"] / stats["calls"] * 1000
+            lines.append(
+                f"{method}: {stats['calls']} вызовов, ошибок {stats['errors']}, "
+                f"среднее {avg_ms:.0f} мс, макс {stats['max_time'] * 1000:.0f} мс, "
+                f"{stats['bytes'] / 1024:.1f} КБ"
+            )
+        with self._lock:
+            counters = dict(self.counters)
+        for name, value in sorted(counters.items()):
+            label = COUNTER_LABELS.get(name, name)
+            if isinstance(value, float):
+                lines.append(f"{label}: {value:.2f}")
+            else:
+                lines.append(f"{label}: {value}")
+        return lines
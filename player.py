@@ -0,0 +1,292 @@
+import atexit
+import json
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from config import PLAYER_BACKEND, MPV_START_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+class PlayerBackend:
+    """Плеер, которому передаются треки
+
+    Базовая реализация ничего не умеет, кроме воспроизведения; методы
+    управления возвращают False, если плеер их не поддерживает.
+    """
+
+    name = "none"
+    controllable = False
+
+    def play(self, source):
+        """Начать воспроизведение файла или ссылки"""
+        raise NotImplementedError
+
+    def enqueue(self, source):
+        """Добавить трек в очередь плеера после текущего"""
+        return False
+
+    def toggle_pause(self):
+        """Пауза / продолжить"""
+        return False
+
+    def seek(self, seconds, relative=True):
+        """Перемотать на seconds секунд (или к позиции seconds)"""
+        return False
+
+    def change_volume(self, delta):
+        """Изменить громкость на delta процентов"""
+        return False
+
+    def stop(self):
+        """Остановить воспроизведение"""
+        return False
+
+    def status(self):
+        """Состояние плеера: позиция, длительность, пауза, громкость"""
+        return {}
+
+    def add_listener(self, listener):
+        """Подписаться на события плеера"""
+
+    def remove_listener(self, listener):
+        """Отписаться от событий плеера"""
+
+    def close(self):
+        """Завершить работу плеера"""
+
+class OpenBackend(PlayerBackend):
+    """Открытие файла системным приложением (xdg-open, open, os.startfile)"""
+
+    name = "system"
+
+    def play(self, source):
+        if os.name == 'nt':
+            os.startfile(source)
+        elif sys.platform == 'darwin':
+            subprocess.run(['open', source])
+        else:
+            subprocess.run(['xdg-open', source])
+        return True
+
+class MPVBackend(PlayerBackend):
+    """Один долгоживущий процесс mpv, управляемый через JSON IPC
+
+    Команды отправляются в UNIX-сокет mpv, ответы и события читает фоновый
+    поток. Позиция, длительность, пауза и громкость отслеживаются через
+    observe_property и доступны в status(); все события передаются
+    подписчикам add_listener.
+    """
+
+    name = "mpv"
+    controllable = True
+
+    # Свойства, изменения которых mpv присылает как события
+    OBSERVED = ("time-pos", "duration", "pause", "volume", "path")
+
+    def __init__(self, executable):
+        self.executable = executable
+        self.socket_path = os.path.join(tempfile.gettempdir(), f"vk-music-mpv-{os.getpid()}.sock")
+
+        self._process = None
+        self._socket = None
+        self._lock = threading.Lock()
+        self._request_id = 0
+        self._pending = {}
+        self._listeners = []
+        self._state = {}
+        # mpv запускается с --idle и сам не завершится вместе с программой
+        atexit.register(self.close)
+
+    def _ensure_running(self):
+        """Запустить mpv и подключиться к нему, если он еще не запущен"""
+        if self._process and self._process.poll() is None and self._socket:
+            return
+
+        self._disconnect()
+        if self._process and self._process.poll() is None:
+            # Процесс жив, но связь с ним потеряна - запускаем заново
+            self._process.kill()
+        self._process = subprocess.Popen(
+            [self.executable, "--idle=yes", "--no-video", "--no-terminal", "--force-window=no",
+             f"--input-ipc-server={self.socket_path}"],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+
+        deadline = time.monotonic() + MPV_START_TIMEOUT
+        while True:
+            try:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.connect(self.socket_path)
+                break
+            except OSError:
+                sock.close()
+                if time.monotonic() > deadline or self._process.poll() is not None:
+                    raise OSError("Не удалось подключиться к mpv")
+                time.sleep(0.05)
+
+        self._socket = sock
+        self._state = {}
+        threading.Thread(target=self._read_events, args=(sock,), name="mpv-ipc", daemon=True).start()
+        for observe_id, name in enumerate(self.OBSERVED, 1):
+            self._send(["observe_property", observe_id, name], wait=False)
+
+    def _disconnect(self):
+        """Закрыть соединение с mpv"""
+        if self._socket:
+            try:
+                self._socket.close()
+            except OSError:
+                pass
+            self._socket = None
+
+    def _send(self, command, wait=True):
+        """Отправить команду и дождаться ответа; None при ошибке"""
+        with self._lock:
+            self._request_id += 1
+            request_id = self._request_id
+            waiter = {"event": threading.Event(), "response": None}
+            self._pending[request_id] = waiter
+            message = json.dumps({"command": command, "request_id": request_id}) + "\n"
+            if self._socket is None:
+                self._pending.pop(request_id)
+                return None
+            try:
+                self._socket.sendall(message.encode("utf-8"))
+            except OSError as e:
+                self._pending.pop(request_id, None)
+                logger.warning("Ошибка отправки команды mpv: %s", e)
+                self._disconnect()
+                return None
+
+        if not wait:
+            return None
+        if not waiter["event"].wait(MPV_START_TIMEOUT):
+            self._pending.pop(request_id, None)
+            return None
+
+        response = waiter["response"]
+        if response.get("error") != "success":
+            logger.warning("mpv отклонил команду %s: %s", command, response.get("error"))
+            return None
+        # У команд без результата data пустое - успех отличаем от ошибки значением True
+        data = response.get("data")
+        return True if data is None else data
+
+    def _read_events(self, sock):
+        """Читать ответы и события mpv"""
+        buffer = b""
+        while True:
+            try:
+                data = sock.recv(65536)
+            except OSError:
+                break
+            if not data:
+                break
+            buffer += data
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    continue
+                self._dispatch(message)
+
+        # Соединение закрыто - никто не должен ждать ответа вечно
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for waiter in pending.values():
+            waiter["response"] = {"error": "disconnected"}
+            waiter["event"].set()
+
+    def _dispatch(self, message):
+        """Разобрать сообщение mpv: ответ на команду или событие"""
+        if "request_id" in message and "event" not in message:
+            with self._lock:
+                waiter = self._pending.pop(message["request_id"], None)
+            if waiter:
+                waiter["response"] = message
+                waiter["event"].set()
+            return
+
+        if message.get("event") == "property-change":
+            self._state[message.get("name")] = message.get("data")
+
+        for listener in list(self._listeners):
+            try:
+                listener(message)
+            except Exception as e:
+                logger.warning("Ошибка обработчика событий плеера: %s", e)
+
+    def command(self, *command):
+        """Выполнить команду mpv; None при ошибке"""
+        try:
+            self._ensure_running()
+        except OSError as e:
+            logger.warning("%s", e)
+            return None
+        return self._send(list(command))
+
+    def play(self, source):
+        return self.command("loadfile", source, "replace") is not None
+
+    def enqueue(self, source):
+        return self.command("loadfile", source, "append-play") is not None
+
+    def toggle_pause(self):
+        return self.command("cycle", "pause") is not None
+
+    def seek(self, seconds, relative=True):
+        return self.command("seek", seconds, "relative" if relative else "absolute") is not None
+
+    def change_volume(self, delta):
+        return self.command("add", "volume", delta) is not None
+
+    def stop(self):
+        return self.command("stop") is not None
+
+    def status(self):
+        return {
+            "position": self._state.get("time-pos"),
+            "duration": self._state.get("duration"),
+            "paused": bool(self._state.get("pause")),
+            "volume": self._state.get("volume"),
+            "path": self._state.get("path")
+        }
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def close(self):
+        if self._process and self._process.poll() is None:
+            if self._socket:
+                self._send(["quit"], wait=False)
+            try:
+                self._process.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+        self._disconnect()
+        try:
+            os.remove(self.socket_path)
+        except OSError:
+            pass
+
+def create_backend(kind=PLAYER_BACKEND):
+    """Создать плеер: mpv с управлением, если он установлен, иначе системный"""
+    mpv = shutil.which("mpv")
+    if kind in ("auto", "mpv") and mpv and hasattr(socket, "AF_UNIX"):
+        return MPVBackend(mpv)
+    if kind == "mpv":
+        logger.warning("mpv не найден, используется системный плеер")
+    return OpenBackend()
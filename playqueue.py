@@ -0,0 +1,263 @@
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from activity import activity
+from config import PREFETCH_DEPTH, PREFETCH_MAX_RATE, PREFETCH_MAX_BYTES
+from errors import DownloadError
+from ledger import track_key
+
+logger = logging.getLogger(__name__)
+
+class PlayQueue:
+    """Очередь воспроизведения: по порядку или вперемешку
+
+    Очередь меняют и цикл ввода, и поток событий mpv (переход к следующему
+    треку), поэтому все методы выполняются под блокировкой.
+    """
+
+    def __init__(self, tracks, shuffle=False):
+        self.tracks = tracks
+        self.shuffle = False
+        self.order = list(range(len(tracks)))
+        self.position = -1
+        self._lock = threading.RLock()
+        if shuffle:
+            self.set_shuffle(True)
+
+    def current(self):
+        """Текущий трек или None, если воспроизведение еще не начиналось"""
+        with self._lock:
+            if 0 <= self.position < len(self.order):
+                return self.tracks[self.order[self.position]]
+            return None
+
+    def current_index(self):
+        """Индекс текущего трека в исходном списке или None"""
+        with self._lock:
+            if 0 <= self.position < len(self.order):
+                return self.order[self.position]
+            return None
+
+    def is_last(self):
+        """Текущий трек - последний в очереди"""
+        with self._lock:
+            return self.position == len(self.order) - 1
+
+    def next(self):
+        """Перейти к следующему треку (после последнего - к первому)"""
+        with self._lock:
+            if not self.order:
+                return None
+            self.position = (self.position + 1) % len(self.order)
+            return self.current()
+
+    def previous(self):
+        """Вернуться к предыдущему треку"""
+        with self._lock:
+            if not self.order:
+                return None
+            self.position = max(self.position - 1, 0)
+            return self.current()
+
+    def jump(self, index):
+        """Сделать текущим трек с индексом index в исходном списке"""
+        with self._lock:
+            self.position = self.order.index(index)
+            return self.current()
+
+    def advance_to(self, track):
+        """Перейти вперед к этому треку (тот же объект, а не равный ему)
+
+        Ищется ближайшая позиция после текущей, поэтому повтор трека
+        раньше в списке не выбирается. Возвращает трек или None.
+        """
+        with self._lock:
+            for offset in range(1, len(self.order) + 1):
+                position = (self.position + offset) % len(self.order)
+                if self.tracks[self.order[position]] is track:
+                    self.position = position
+                    return track
+            return None
+
+    def upcoming(self, count):
+        """Следующие count треков после текущего"""
+        with self._lock:
+            if not self.order:
+                return []
+            return [
+                self.tracks[self.order[(self.position + offset) % len(self.order)]]
+                for offset in range(1, min(count, len(self.order) - 1) + 1)
+            ]
+
+    def extend(self):
+        """Учесть треки, добавленные в конец списка (например, подгруженные результаты поиска)"""
+        with self._lock:
+            added = list(range(len(self.order), len(self.tracks)))
+            if self.shuffle:
+                random.shuffle(added)
+            self.order.extend(added)
+
+    def set_shuffle(self, enabled):
+        """Включить или выключить перемешивание, не меняя текущий трек"""
+        with self._lock:
+            current = self.order[self.position] if 0 <= self.position < len(self.order) else None
+            self.shuffle = enabled
+            order = list(range(len(self.tracks)))
+            if enabled:
+                random.shuffle(order)
+                if current is not None:
+                    # Текущий трек становится первым, остальные идут в случайном порядке
+                    order.remove(current)
+                    order.insert(0, current)
+            self.order = order
+            if current is not None:
+                self.position = self.order.index(current)
+            elif enabled:
+                self.position = -1
+
+class Prefetcher:
+    """Фоновая загрузка следующих треков очереди в кэш аудио
+
+    Загрузка идет в один поток с ограничением скорости, чтобы не отбирать
+    канал у играющего трека. Объем загруженных, но еще не сыгранных треков
+    ограничен max_bytes и половиной кэша аудио. Ненужные больше загрузки
+    отменяются, а недокачанный .part остается для докачки. on_ready(track, path)
+    вызывается из фонового потока, когда трек загружен.
+    """
+
+    def __init__(self, vk_manager, depth=PREFETCH_DEPTH, max_rate=PREFETCH_MAX_RATE, max_bytes=PREFETCH_MAX_BYTES,
+                 on_ready=None):
+        self.vk_manager = vk_manager
+        self.on_ready = on_ready
+        self.audio_cache = vk_manager.audio_cache
+        self.depth = depth
+        self.max_rate = max_rate
+        self.max_bytes = min(max_bytes, self.audio_cache.max_bytes // 2)
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._ready = {}
+        self.stats = {"prefetched": 0, "cancelled": 0, "used": 0, "bytes": 0}
+
+    def prefetch(self, tracks):
+        """Загружать эти треки; загрузки других треков отменяются"""
+        wanted = [track for track in tracks[:self.depth] if track_key(track) and track.get('url')]
+        wanted_keys = {track_key(track) for track in wanted}
+
+        with self._lock:
+            for key in list(self._jobs):
+                if key not in wanted_keys:
+                    self._cancel(key)
+            # Ненужные больше треки остаются обычными записями кэша
+            for key in list(self._ready):
+                if key not in wanted_keys:
+                    self._ready.pop(key)
+
+            for track in wanted:
+                key = track_key(track)
+                if key in self._jobs or key in self._ready or self.audio_cache.has(track):
+                    continue
+                if sum(self._ready.values()) >= self.max_bytes:
+                    break
+                cancel = threading.Event()
+                urgent = threading.Event()
+                future = self._executor.submit(self._download, track, cancel, urgent)
+                self._jobs[key] = (future, cancel, urgent)
+
+    def take(self, track):
+        """Подготовить трек к воспроизведению
+
+        Если трек уже загружается, снимаем ограничение скорости и дожидаемся
+        окончания, а если загрузка еще не началась - отменяем ее.
+        """
+        key = track_key(track)
+        with self._lock:
+            job = self._jobs.pop(key, None)
+            if key in self._ready:
+                self._ready.pop(key)
+                self.stats["used"] += 1
+        if job is None:
+            return
+
+        future, cancel, urgent = job
+        if future.cancel():
+            with self._lock:
+                self.stats["cancelled"] += 1
+            return
+        urgent.set()
+        try:
+            ready = future.result()
+        except Exception as e:
+            # Трек просто загрузится заново при воспроизведении
+            logger.warning("Предзагрузка %s не удалась: %s", key, e)
+            return None
+        if ready:
+            with self._lock:
+                self._ready.pop(key, None)
+                self.stats["used"] += 1
+
+    def cancel_all(self):
+        """Отменить все предзагрузки"""
+        with self._lock:
+            for key in list(self._jobs):
+                self._cancel(key)
+            self._ready.clear()
+
+    def close(self):
+        """Отменить предзагрузки и освободить поток загрузки"""
+        self.cancel_all()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _cancel(self, key):
+        """Отменить одну загрузку (вызывается под блокировкой)"""
+        future, cancel, _ = self._jobs.pop(key)
+        cancel.set()
+        future.cancel()
+        if not future.done() or future.cancelled():
+            self.stats["cancelled"] += 1
+
+    def _download(self, track, cancel, urgent):
+        """Скачать трек в кэш; False, если загрузку отменили или она не удалась"""
+        started = time.monotonic()
+        first = []
+        name = f"{track.get('artist', '')} - {track.get('title', '')}"
+        task_id = activity.start(f"Предзагрузка: {name}")
+
+        def progress(received, total):
+            if cancel.is_set():
+                raise DownloadError("Предзагрузка отменена")
+            if not first:
+                first.append(received)
+            if total:
+                activity.update(task_id, f"Предзагрузка: {name} {received * 100 // total}%")
+            if self.max_rate and not urgent.is_set():
+                # Притормаживаем, если скачали больше, чем позволяет лимит скорости
+                ahead = (received - first[0]) / self.max_rate - (time.monotonic() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+        try:
+            path = self.audio_cache.download(self.vk_manager, track, progress)
+            size = os.path.getsize(path)
+        except DownloadError:
+            return False
+        except Exception as e:
+            logger.warning("Не удалось загрузить заранее %s: %s", name, e)
+            return False
+        finally:
+            activity.finish(task_id)
+
+        with self._lock:
+            self.stats["prefetched"] += 1
+            self.stats["bytes"] += size
+            wanted = track_key(track) in self._jobs
+            if wanted:
+                self._jobs.pop(track_key(track))
+                self._ready[track_key(track)] = size
+        if wanted and self.on_ready:
+            self.on_ready(track, path)
+        return True
@@ -0,0 +1,35 @@
+import threading
+import time
+
+class TokenBucket:
+    """Ограничитель частоты запросов по алгоритму token bucket"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Занять токен и вернуть, сколько секунд нужно подождать перед запросом
+
+        Токен занимается сразу (баланс может уйти в минус), поэтому одним
+        ограничителем могут пользоваться и потоки, и asyncio-корутины.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def acquire(self):
+        """Дождаться своей очереди и вернуть время ожидания в секундах"""
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+        return delay
@@ -0,0 +1,118 @@
+import json
+import os
+import requests
+from errors import DownloadError
+
+# Как часто сохранять состояние загрузки в служебный файл
+STATE_SAVE_INTERVAL = 1024 * 1024
+
+def part_paths(filename):
+    """Пути к недокачанному файлу и к файлу с его состоянием"""
+    return f"{filename}.part", f"{filename}.part.json"
+
+def load_state(state_path):
+    """Прочитать состояние прерванной загрузки"""
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_state(state_path, state):
+    """Сохранить состояние загрузки"""
+    try:
+        with open(state_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+    except OSError:
+        pass
+
+def download_file(http, url, filename, progress=None):
+    """Скачать файл с докачкой после обрыва
+
+    Данные пишутся в <filename>.part, рядом в <filename>.part.json хранятся
+    ссылка, ETag/Last-Modified, ожидаемый размер и число полученных байт.
+    Если загрузку прервали, следующий вызов продолжит ее запросом Range.
+    В итоговый файл .part переименовывается, только когда получен весь
+    ожидаемый объем. Возвращает размер файла, при ошибке бросает DownloadError.
+    """
+    part_path, state_path = part_paths(filename)
+    state = load_state(state_path) if os.path.exists(part_path) else None
+    offset = os.path.getsize(part_path) if state else 0
+
+    # Без валидатора докачка безопасна только с той же ссылки
+    validator = state and (state.get("etag") or state.get("last_modified"))
+    if state and not validator and state.get("url") != url:
+        offset = 0
+
+    headers = {'Accept-Encoding': 'identity'}
+    if offset:
+        headers['Range'] = f"bytes={offset}-"
+        if validator:
+            headers['If-Range'] = validator
+
+    try:
+        with http.stream_audio(url, headers=headers) as response:
+            if response.status_code == 416:
+                if state and offset == state.get("total"):
+                    # Все байты уже были получены, осталось только переименовать
+                    os.replace(part_path, filename)
+                    os.remove(state_path)
+                    return offset
+                # Недокачанный файл не соответствует серверному - начинаем заново
+                os.remove(part_path)
+                os.remove(state_path)
+                return download_file(http, url, filename, progress)
+
+            if response.status_code == 206:
+                content_range = response.headers.get('content-range', '')
+                if not content_range.startswith(f"bytes {offset}-"):
+                    raise DownloadError(f"Сервер вернул неожиданный диапазон: {content_range}", 206)
+                total = int(content_range.rsplit('/', 1)[-1]) if not content_range.endswith('/*') else None
+                mode = 'ab'
+            elif response.status_code == 200:
+                # Сервер не поддерживает Range или файл изменился - начинаем заново
+                offset = 0
+                length = response.headers.get('content-length')
+                total = int(length) if length else None
+                mode = 'wb'
+            else:
+                raise DownloadError(f"Ошибка HTTP: {response.status_code}", response.status_code)
+
+            previous = state if mode == 'ab' else {}
+            state = {
+                "url": url,
+                "etag": response.headers.get('etag') or previous.get("etag"),
+                "last_modified": response.headers.get('last-modified') or previous.get("last_modified"),
+                "total": total,
+                "received": offset
+            }
+            save_state(state_path, state)
+
+            received = offset
+            saved_at = offset
+            try:
+                with open(part_path, mode) as f:
+                    for chunk in response.iter_content(chunk_size=65536):
+                        if chunk:
+                            f.write(chunk)
+                            received += len(chunk)
+                            if progress:
+                                progress(received, total or 0)
+                            if received - saved_at >= STATE_SAVE_INTERVAL:
+                                state["received"] = received
+                                save_state(state_path, state)
+                                saved_at = received
+            finally:
+                state["received"] = received
+                save_state(state_path, state)
+
+        if total is not None and received != total:
+            raise DownloadError(f"Загрузка прервана: получено {received} из {total} байт")
+
+        os.replace(part_path, filename)
+        os.remove(state_path)
+        return received
+    except requests.exceptions.RequestException as e:
+        raise DownloadError(f"Ошибка соединения: {e}") from e
+    except OSError as e:
+        raise DownloadError(f"Ошибка записи файла: {e}") from e
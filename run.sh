@@ -19,7 +19,7 @@ if ! python3 -c "import requests" &> /dev/null; then
 fi
 
 # Запуск программы
-python3 main.py
+python3 main.py "$@"
 
 # Деактивация виртуального окружения
 if [ -n "$VIRTUAL_ENV" ]; then
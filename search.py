@@ -0,0 +1,134 @@
+import threading
+import time
+from config import CACHE_TTLS, SEARCH_PAGE_SIZE, SEARCH_MAX_RESULTS
+from ledger import track_key
+from search_index import normalize
+
+def normalize_query(query):
+    """Запрос в нижнем регистре без лишних пробелов - ключ кэша поиска"""
+    return " ".join(normalize(query))
+
+def track_identity(track):
+    """Исполнитель и название без регистра и знаков - для поиска дублей"""
+    return " ".join(normalize(track.get('artist'))) + " - " + " ".join(normalize(track.get('title')))
+
+class SearchResults:
+    """Результаты поиска, подгружаемые страницами по мере прокрутки
+
+    items - уже загруженные треки без дублей (по идентификатору трека и по
+    исполнителю с названием); список только растет, поэтому его можно
+    сразу отдать плееру. Всего загружается не больше max_results.
+    """
+
+    def __init__(self, vk_manager, query, max_results=SEARCH_MAX_RESULTS, items=None, exhausted=False):
+        self.vk_manager = vk_manager
+        # В VK уходит запрос как его ввели: "AC/DC" и "acdc" ищутся по-разному
+        self.query = " ".join(query.split())
+        self.key = normalize_query(query)
+        self.max_results = max_results
+        self.items = []
+        self.total_count = 0
+        self.offset = 0
+        self.exhausted = exhausted
+        self.created = time.time()
+        self._keys = set()
+        self._identities = set()
+        self._lock = threading.Lock()
+        if items:
+            self._add(items)
+            self.total_count = len(self.items)
+
+    @property
+    def has_more(self):
+        return not self.exhausted and self.offset < self.max_results
+
+    def load_more(self, pages=1):
+        """Загрузить следующие страницы; список новых треков
+
+        Ошибки VK API пробрасываются (VKAPIError).
+        """
+        added = []
+        with self._lock:
+            for _ in range(pages):
+                if not self.has_more:
+                    break
+                response = self.vk_manager.search_page(
+                    self.query, self.offset, min(SEARCH_PAGE_SIZE, self.max_results - self.offset)
+                )
+                page = response.get("items", [])
+                self.total_count = response.get("count", 0)
+                self.offset += len(page)
+                if not page or self.offset >= self.total_count:
+                    self.exhausted = True
+                added.extend(self._add(page))
+        return added
+
+    def _add(self, tracks):
+        added = []
+        for track in tracks:
+            key = track_key(track)
+            identity = track_identity(track)
+            if (key and key in self._keys) or identity in self._identities:
+                continue
+            if key:
+                self._keys.add(key)
+            self._identities.add(identity)
+            self.items.append(track)
+            added.append(track)
+        return added
+
+    def refine(self, query):
+        """Результаты уточненного запроса из уже загруженных, если это возможно
+
+        Если все результаты этого запроса загружены, а новый запрос содержит
+        все его слова, ответ фильтруется локально без обращения к VK.
+        Иначе None.
+        """
+        words = normalize(query)
+        if not words or not self.exhausted or not set(normalize(self.query)) <= set(words):
+            return None
+        matches = [
+            track for track in self.items
+            if all(any(part.startswith(word) for part in normalize(f"{track.get('artist')} {track.get('title')}"))
+                   for word in words)
+        ]
+        return SearchResults(self.vk_manager, query, self.max_results, matches, exhausted=True)
+
+class SearchCache:
+    """Недавние результаты поиска по нормализованному запросу, с TTL"""
+
+    def __init__(self, ttl=CACHE_TTLS.get("audio.search", 0)):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._results = {}
+        self.stats = {"hits": 0, "refined": 0, "misses": 0}
+
+    def get(self, vk_manager, query):
+        """SearchResults запроса: из кэша, уточнением прежнего или новые"""
+        key = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            for cached_key, results in list(self._results.items()):
+                if now - results.created > self.ttl:
+                    del self._results[cached_key]
+
+            results = self._results.get(key)
+            if results is not None:
+                self.stats["hits"] += 1
+                return results
+
+            for cached in self._results.values():
+                results = cached.refine(query)
+                if results is not None:
+                    self.stats["refined"] += 1
+                    break
+            else:
+                self.stats["misses"] += 1
+                results = SearchResults(vk_manager, query)
+            self._results[key] = results
+        return results
+
+    def discard(self, query):
+        """Забыть результаты запроса (например, после ошибки загрузки)"""
+        with self._lock:
+            self._results.pop(normalize_query(query), None)
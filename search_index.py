@@ -0,0 +1,186 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from config import SEARCH_INDEX_FILE, SEARCH_INDEX_LIMIT
+from ledger import track_key, LOOKUP_CHUNK
+
+logger = logging.getLogger(__name__)
+
+WORD_RE = re.compile(r"\w+")
+
+def fold(text):
+    """Текст в нижнем регистре, ё -> е"""
+    return (text or "").lower().replace("ё", "е")
+
+def normalize(text):
+    """Слова текста в нижнем регистре, ё -> е"""
+    return WORD_RE.findall(fold(text))
+
+def edit_distance(a, b, limit):
+    """Расстояние Левенштейна; limit + 1, если оно больше limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+class SearchIndex:
+    """Локальный полнотекстовый индекс загруженных треков (SQLite FTS5)
+
+    Индексируются исполнитель, название и альбом всех списков, которые
+    получала программа: моя музыка, плейлисты, музыка друзей. Для каждого
+    трека запоминается, откуда он взялся. Поиск идет по началу слов, а если
+    ничего не нашлось - по исправленным опечаткам. Запросов к VK нет.
+    """
+
+    def __init__(self, path=SEARCH_INDEX_FILE):
+        self._lock = threading.Lock()
+        self._vocab = None
+
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("Не удалось открыть поисковый индекс %s: %s", path, e)
+            self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+
+        with self._lock:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS tracks (key TEXT PRIMARY KEY, data TEXT)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sources (key TEXT, source TEXT, PRIMARY KEY (key, source))"
+            )
+            try:
+                self._conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS tracks_fts USING fts5("
+                    "key UNINDEXED, artist, title, album, "
+                    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+                )
+                self._conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS tracks_vocab USING fts5vocab(tracks_fts, 'row')")
+                self.fts = True
+            except sqlite3.OperationalError as e:
+                # SQLite без FTS5 - ищем простым перебором по LIKE. Встроенный
+                # LOWER меняет регистр только латиницы, поэтому регистр
+                # приводится функцией Python
+                logger.warning("FTS5 недоступен, поиск по индексу будет медленнее: %s", e)
+                self._conn.create_function("fold", 1, fold, deterministic=True)
+                self.fts = False
+            self._conn.commit()
+
+    def add(self, tracks, source):
+        """Добавить треки списка source (например, "Моя музыка")"""
+        tracks = {track_key(track): track for track in tracks if track_key(track)}
+        if not tracks:
+            return
+
+        with self._lock:
+            keys = list(tracks)
+            known = set()
+            for start in range(0, len(keys), LOOKUP_CHUNK):
+                chunk = keys[start:start + LOOKUP_CHUNK]
+                rows = self._conn.execute(
+                    f"SELECT key FROM tracks WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                known.update(row[0] for row in rows)
+
+            # Данные трека обновляем всегда (свежая ссылка), текст индексируем один раз
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO tracks (key, data) VALUES (?, ?)",
+                [(key, json.dumps(track, ensure_ascii=False)) for key, track in tracks.items()]
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO sources (key, source) VALUES (?, ?)",
+                [(key, source) for key in tracks]
+            )
+            if self.fts:
+                self._conn.executemany(
+                    "INSERT INTO tracks_fts (key, artist, title, album) VALUES (?, ?, ?, ?)",
+                    [
+                        (key, track.get("artist", ""), track.get("title", ""),
+                         (track.get("album") or {}).get("title", ""))
+                        for key, track in tracks.items() if key not in known
+                    ]
+                )
+                if len(known) < len(tracks):
+                    self._vocab = None
+            self._conn.commit()
+
+    def search(self, query, limit=SEARCH_INDEX_LIMIT):
+        """Найти треки; список словарей track, sources и флаг corrected
+
+        corrected - True, если результаты найдены после исправления опечаток.
+        """
+        terms = normalize(query)
+        if not terms:
+            return []
+
+        with self._lock:
+            rows = self._match(terms, limit)
+            corrected = False
+            if not rows and self.fts:
+                fixed = [self._correct(term) for term in terms]
+                if fixed != terms:
+                    rows = self._match(fixed, limit)
+                    corrected = True
+
+            results = []
+            for key, data in rows:
+                sources = [row[0] for row in self._conn.execute(
+                    "SELECT source FROM sources WHERE key = ? ORDER BY source", (key,)
+                )]
+                results.append({"track": json.loads(data), "sources": sources, "corrected": corrected})
+        return results
+
+    def _match(self, terms, limit):
+        """Треки, где каждое слово запроса - начало какого-то слова"""
+        if self.fts:
+            expression = " ".join(f'"{term}"*' for term in terms)
+            return self._conn.execute(
+                "SELECT t.key, t.data FROM tracks_fts f JOIN tracks t ON t.key = f.key "
+                "WHERE tracks_fts MATCH ? ORDER BY bm25(tracks_fts) LIMIT ?",
+                (expression, limit)
+            ).fetchall()
+
+        condition = " AND ".join("fold(data) LIKE ?" for _ in terms)
+        return self._conn.execute(
+            f"SELECT key, data FROM tracks WHERE {condition} LIMIT ?",
+            [f"%{term}%" for term in terms] + [limit]
+        ).fetchall()
+
+    def _correct(self, term):
+        """Ближайшее к term слово словаря индекса (или сам term)
+
+        Сравниваем и со словом целиком, и с его началом той же длины,
+        чтобы исправлять опечатки в недописанном слове.
+        """
+        if self._vocab is None:
+            self._vocab = {}
+            for word, count in self._conn.execute("SELECT term, doc FROM tracks_vocab"):
+                self._vocab.setdefault(word[:1], []).append((word, count))
+
+        candidates = self._vocab.get(term[:1], [])
+        if any(word.startswith(term) for word, _ in candidates):
+            return term
+
+        limit = 1 if len(term) <= 4 else 2
+        best, best_key = term, None
+        for word, count in candidates:
+            distance = min(edit_distance(term, word, limit), edit_distance(term, word[:len(term)], limit))
+            if distance <= limit and (best_key is None or (distance, -count) < best_key):
+                best, best_key = word, (distance, -count)
+        return best
+
+    def summary(self):
+        """Сколько треков и источников в индексе"""
+        with self._lock:
+            tracks = self._conn.execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+            sources = self._conn.execute("SELECT COUNT(DISTINCT source) FROM sources").fetchone()[0]
+        return {"tracks": tracks, "sources": sources}
@@ -0,0 +1,290 @@
+import errno
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import requests
+from config import STREAM_PLAYERS, STREAM_CHUNK_SIZE, STREAM_START_TIMEOUT
+
+# Строка, которую mpv печатает в момент начала воспроизведения
+PLAYING_MARKER = "VK_MUSIC_PLAYING"
+
+# Аргументы плееров для чтения аудио из stdin
+PLAYER_ARGS = {
+    "mpv": ["--no-video", "--quiet", "--no-input-terminal", f"--term-playing-msg={PLAYING_MARKER}", "-"],
+    "ffplay": ["-nodisp", "-autoexit", "-loglevel", "quiet", "-i", "-"],
+}
+
+def find_player():
+    """Команда первого найденного плеера, умеющего играть поток из stdin, или None"""
+    for name in STREAM_PLAYERS:
+        path = shutil.which(name)
+        if path:
+            return [path] + PLAYER_ARGS[name]
+    return None
+
+def play_file(backend, path, timeout=STREAM_START_TIMEOUT):
+    """Открыть локальный файл в mpv целиком (с перемоткой)
+
+    Возвращает время до начала воспроизведения или None, если оно не началось.
+    """
+    started = time.monotonic()
+    state = {"opened": False, "start": None}
+    ready = threading.Event()
+
+    def listener(event):
+        name = event.get("event")
+        if name == "start-file":
+            state["opened"] = True
+        elif state["opened"] and name in ("playback-restart", "end-file"):
+            if name == "playback-restart":
+                state["start"] = time.monotonic() - started
+            ready.set()
+
+    backend.add_listener(listener)
+    try:
+        if backend.play(path):
+            ready.wait(timeout)
+    finally:
+        backend.remove_listener(listener)
+    return state["start"]
+
+class StreamPlayback:
+    """Воспроизведение трека по мере загрузки
+
+    Байты с CDN передаются в stdin плеера сразу по получении и одновременно
+    пишутся в tee_path (через .stream.part), так что воспроизведение
+    и сохранение обходятся одной загрузкой. Вместо ссылки можно передать
+    source_path - тогда трек играется из локального файла.
+
+    Если передан backend (MPVBackend), поток идет в уже запущенный mpv через
+    именованный канал, иначе запускается отдельный процесс command. Замеряется время до первого байта и до
+    начала воспроизведения: mpv сообщает о нем сам, для остальных плееров
+    это момент передачи плееру первого фрагмента.
+    """
+
+    def __init__(self, http, url, command=None, tee_path=None, on_complete=None, metrics=None,
+                 source_path=None, backend=None):
+        self.http = http
+        self.backend = backend
+        self.metrics = metrics
+        self.url = url
+        self.source_path = source_path
+        self.command = command
+        self.tee_path = tee_path
+        self.on_complete = on_complete
+
+        self.ttfb = None
+        self.playback_start = None
+        self.status_code = None
+        self.result = None
+
+        self._process = None
+        self._fifo_dir = None
+        self._listener = None
+        self._file_opened = False
+        self._started = threading.Event()
+        self._done = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Запустить плеер и загрузку в фоновом потоке"""
+        self._thread = threading.Thread(target=self._run, name="stream-playback", daemon=True)
+        self._thread.start()
+
+    def wait_started(self, timeout=None):
+        """Дождаться начала воспроизведения; False, если оно не началось"""
+        self._started.wait(timeout)
+        return self.playback_start is not None
+
+    def wait(self, timeout=None):
+        """Дождаться окончания загрузки и вернуть результат"""
+        self._done.wait(timeout)
+        return self.result
+
+    def stop(self):
+        """Остановить воспроизведение и загрузку"""
+        self._stop.set()
+        if self._process and self._process.poll() is None:
+            self._process.terminate()
+
+    def _mark_started(self, started):
+        """Зафиксировать начало воспроизведения"""
+        if self.playback_start is None:
+            self.playback_start = time.monotonic() - started
+            self._started.set()
+
+    def _watch_player(self, started):
+        """Ждать от mpv сообщения о начале воспроизведения"""
+        for line in self._process.stdout:
+            if PLAYING_MARKER in line.decode(errors="ignore"):
+                self._mark_started(started)
+        # Плеер завершился, не начав играть
+        self._started.set()
+
+    def _on_player_event(self, started, event):
+        """Отметить начало воспроизведения по событию mpv"""
+        name = event.get("event")
+        if name == "start-file":
+            # События до start-file относятся к предыдущему треку
+            self._file_opened = True
+            return
+        if not self._file_opened:
+            return
+        if name == "playback-restart":
+            self._mark_started(started)
+        elif name == "end-file":
+            # Файл закрыт, не начав играть
+            self._started.set()
+        else:
+            return
+        self.backend.remove_listener(self._listener)
+
+    def _open_backend_sink(self, started):
+        """Создать именованный канал, отдать его mpv и открыть на запись"""
+        self._fifo_dir = tempfile.mkdtemp(prefix="vk-music-")
+        fifo_path = os.path.join(self._fifo_dir, "stream.mp3")
+        os.mkfifo(fifo_path)
+
+        self._listener = lambda event: self._on_player_event(started, event)
+        self.backend.add_listener(self._listener)
+        if not self.backend.play(fifo_path):
+            raise OSError("mpv не принял трек")
+
+        # Открытие канала на запись ждет, пока mpv откроет его на чтение
+        deadline = time.monotonic() + STREAM_START_TIMEOUT
+        while True:
+            try:
+                fd = os.open(fifo_path, os.O_WRONLY | os.O_NONBLOCK)
+                break
+            except OSError as e:
+                if e.errno != errno.ENXIO or time.monotonic() > deadline or self._stop.is_set():
+                    raise
+                time.sleep(0.02)
+        os.set_blocking(fd, True)
+        return os.fdopen(fd, 'wb')
+
+    @staticmethod
+    def _prepend(first_chunk, chunks):
+        """Вернуть уже прочитанный первый фрагмент в начало потока"""
+        yield first_chunk
+        yield from chunks
+
+    def _chunks(self):
+        """Фрагменты трека из локального файла или с CDN"""
+        if self.source_path:
+            with open(self.source_path, 'rb') as f:
+                yield from iter(lambda: f.read(STREAM_CHUNK_SIZE), b'')
+            return
+
+        with self.http.stream_audio(self.url, headers={'Accept-Encoding': 'identity'}) as response:
+            self.status_code = response.status_code
+            if response.status_code != 200:
+                raise OSError(f"Ошибка HTTP: {response.status_code}")
+            yield from response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+
+    def _run(self):
+        started = time.monotonic()
+        reports_start = self.backend is not None or PLAYING_MARKER in " ".join(self.command)
+        # Свой суффикс: .part и .part.json того же пути принадлежат докачке (resumable)
+        part_path = f"{self.tee_path}.stream.part" if self.tee_path else None
+        received = 0
+        error = None
+        tee = None
+        player = None
+
+        try:
+            if part_path:
+                os.makedirs(os.path.dirname(part_path) or ".", exist_ok=True)
+                tee = open(part_path, 'wb')
+
+            # mpv уже запущен, поэтому трек отдается ему только после первого
+            # фрагмента: если запрос не удался, играющий трек не прерывается
+            chunks = self._chunks()
+            if self.backend is not None:
+                first_chunk = next(chunks, b'')
+                player = self._open_backend_sink(started)
+                chunks = self._prepend(first_chunk, chunks)
+            else:
+                # Плеер запускается параллельно с запросом, чтобы не ждать его старта после первого байта
+                self._process = subprocess.Popen(
+                    self.command,
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE if reports_start else subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL
+                )
+                if reports_start:
+                    threading.Thread(target=self._watch_player, args=(started,), daemon=True).start()
+                player = self._process.stdin
+
+            for chunk in chunks:
+                if self._stop.is_set():
+                    error = "Воспроизведение остановлено"
+                    break
+                if not chunk:
+                    continue
+                if self.ttfb is None:
+                    self.ttfb = time.monotonic() - started
+
+                if tee:
+                    tee.write(chunk)
+                if player:
+                    try:
+                        player.write(chunk)
+                        player.flush()
+                        if not reports_start:
+                            self._mark_started(started)
+                    except (BrokenPipeError, OSError):
+                        # Плеер закрыли - дописываем файл, если его сохраняем
+                        player = None
+                        if not tee:
+                            error = "Плеер закрыт"
+                            break
+                received += len(chunk)
+            chunks.close()
+        except (requests.exceptions.RequestException, OSError) as e:
+            error = str(e)
+        finally:
+            if tee:
+                tee.close()
+            # Закрытый канал - сигнал плееру доиграть полученное
+            if player:
+                try:
+                    player.close()
+                except OSError:
+                    pass
+            if self._fifo_dir:
+                shutil.rmtree(self._fifo_dir, ignore_errors=True)
+            if error is not None or not reports_start:
+                # Воспроизведение уже не начнется - не держим ожидающих
+                self._started.set()
+
+        path = None
+        if part_path:
+            if error is None:
+                os.replace(part_path, self.tee_path)
+                path = self.tee_path
+            else:
+                try:
+                    os.remove(part_path)
+                except OSError:
+                    pass
+
+        self.result = {
+            "success": error is None,
+            "bytes": received,
+            "path": path,
+            "ttfb": self.ttfb,
+            "playback_start": self.playback_start,
+            "error": error
+        }
+        self._done.set()
+
+        if self.metrics and not self.source_path:
+            # В статистике audio.stream время ответа - это время до первого байта
+            self.metrics.record("audio.stream", self.ttfb or 0.0, received, "ok" if error is None else "error")
+        if self.on_complete:
+            self.on_complete(self.result)
@@ -0,0 +1,55 @@
+import requests
+from requests.adapters import HTTPAdapter
+from config import (
+    VK_API_URL,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    HTTP_API_POOL_SIZE,
+    HTTP_CDN_POOL_SIZE,
+    CDN_HEADERS
+)
+
+class HTTPTransport:
+    """Общий HTTP-транспорт с пулами соединений для API и CDN"""
+
+    def __init__(self, headers, api_pool_size=HTTP_API_POOL_SIZE, cdn_pool_size=HTTP_CDN_POOL_SIZE,
+                 connect_timeout=HTTP_CONNECT_TIMEOUT, read_timeout=HTTP_READ_TIMEOUT):
+        self.timeout = (connect_timeout, read_timeout)
+
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+
+        # api.vk.com - один хост, поэтому один пул на нужное число соединений
+        self.api_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=api_pool_size)
+        # Аудио раздается с множества хостов CDN - держим пул на каждый
+        self.cdn_adapter = HTTPAdapter(pool_connections=cdn_pool_size, pool_maxsize=cdn_pool_size)
+
+        # requests выбирает адаптер по самому длинному префиксу URL
+        self.session.mount(VK_API_URL, self.api_adapter)
+        self.session.mount("https://", self.cdn_adapter)
+        self.session.mount("http://", self.cdn_adapter)
+
+    def get(self, url, params=None, headers=None, stream=False, timeout=None):
+        """GET-запрос через общий пул соединений"""
+        return self.session.get(
+            url,
+            params=params,
+            headers=headers,
+            stream=stream,
+            timeout=timeout or self.timeout
+        )
+
+    def api_get(self, method, params):
+        """GET-запрос к методу VK API"""
+        return self.get(VK_API_URL + method, params=params)
+
+    def stream_audio(self, url, headers=None):
+        """Открыть потоковую загрузку аудио с CDN"""
+        request_headers = dict(CDN_HEADERS)
+        if headers:
+            request_headers.update(headers)
+        return self.get(url, headers=request_headers, stream=True)
+
+    def close(self):
+        """Закрыть все соединения"""
+        self.session.close()
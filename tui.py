@@ -0,0 +1,341 @@
+import logging
+import os
+import re
+import sys
+import threading
+from activity import activity
+from config import Colors, UI_MODE, TUI_REFRESH_INTERVAL, TUI_SCROLLBACK
+from ui import ConsoleUI
+
+try:
+    import curses
+except ImportError:
+    curses = None
+
+# Escape-последовательности, которые выводит ConsoleUI
+ANSI_RE = re.compile(r"\x1b\[([0-9;]*)([A-Za-z])")
+
+def tui_available():
+    """Можно ли запустить полноэкранный интерфейс в этом терминале"""
+    return (curses is not None and sys.stdout.isatty() and sys.stdin.isatty()
+            and os.getenv("TERM", "dumb") != "dumb")
+
+class ScreenModel:
+    """Содержимое экрана в виде строк из цветных фрагментов
+
+    Текст с ANSI-кодами разбирается в фрагменты (текст, цвет, фон, стили).
+    \\r перезаписывает текущую строку, \\033[2J очищает экран. Хранится не
+    больше scrollback строк.
+    """
+
+    def __init__(self, scrollback=TUI_SCROLLBACK):
+        self.scrollback = scrollback
+        self.lines = []
+        self.current = []
+        self.style = (-1, -1, frozenset())
+        self._overwrite = False
+
+    def clear(self):
+        """Очистить экран"""
+        self.lines = []
+        self.current = []
+        self._overwrite = False
+
+    def feed(self, text):
+        """Добавить выведенный текст"""
+        position = 0
+        for match in ANSI_RE.finditer(text):
+            self._add_text(text[position:match.start()])
+            self._escape(match.group(1), match.group(2))
+            position = match.end()
+        self._add_text(text[position:])
+
+    def rows(self, count):
+        """Последние count строк экрана"""
+        if count <= 0:
+            return []
+        rows = self.lines[-count:]
+        if self.current:
+            rows = (rows + [self.current])[-count:]
+        return rows
+
+    def _add_text(self, text):
+        for part in re.split(r"(\r|\n)", text):
+            if part == "\n":
+                self.lines.append(self.current)
+                self.current = []
+                self._overwrite = False
+                if len(self.lines) > self.scrollback:
+                    del self.lines[:len(self.lines) - self.scrollback]
+            elif part == "\r":
+                self._overwrite = True
+            elif part:
+                if self._overwrite:
+                    # Прогресс-бары перерисовывают строку через \r
+                    self.current = []
+                    self._overwrite = False
+                self.current.append((part,) + self.style)
+
+    def _escape(self, params, command):
+        if command == "J" and params in ("2", "3"):
+            self.clear()
+        elif command == "m":
+            self.style = self._apply_sgr(self.style, params)
+
+    @staticmethod
+    def _apply_sgr(style, params):
+        """Применить коды SGR (цвета и стили)"""
+        fg, bg, flags = style
+        flags = set(flags)
+        for code in (int(p) for p in params.split(";") if p.isdigit()) if params else [0]:
+            if code == 0:
+                fg, bg, flags = -1, -1, set()
+            elif code in (1, 2, 4, 7):
+                flags.add(code)
+            elif 30 <= code <= 37:
+                fg = code - 30
+            elif 90 <= code <= 97:
+                fg = code - 90 + 8
+            elif code == 39:
+                fg = -1
+            elif 40 <= code <= 47:
+                bg = code - 40
+            elif 100 <= code <= 107:
+                bg = code - 100 + 8
+            elif code == 49:
+                bg = -1
+        return fg, bg, frozenset(flags)
+
+class ScreenWriter:
+    """Замена sys.stdout, которая пишет в модель экрана"""
+
+    encoding = "utf-8"
+
+    def __init__(self, tui):
+        self.tui = tui
+
+    def write(self, text):
+        self.tui.write(text)
+        return len(text)
+
+    def flush(self):
+        self.tui.refresh()
+
+    def isatty(self):
+        return True
+
+class CursesUI(ConsoleUI):
+    """Полноэкранный интерфейс на curses
+
+    Все, что программа выводит через print и ConsoleUI, попадает в модель
+    экрана, а на терминал перерисовываются только изменившиеся строки.
+    Внизу строка состояния с фоновыми задачами (загрузки, предзагрузка,
+    обновление кэша) и строка ввода; строка состояния обновляется фоновым
+    потоком, пока программа ждет ввода или занята.
+    """
+
+    def __init__(self):
+        self.model = ScreenModel()
+        self.screen = None
+        self._lock = threading.RLock()
+        self._drawn = []
+        self._pairs = {}
+        self._dirty = True
+        self._prompt = ""
+        self._prompt_style = (-1, -1, frozenset())
+        self._buffer = ""
+        self._status = None
+        self._stop = threading.Event()
+        self._streams = None
+        self._log_handlers = []
+
+    def start(self):
+        """Перевести терминал в полноэкранный режим"""
+        self.screen = curses.initscr()
+        curses.noecho()
+        curses.cbreak()
+        self.screen.keypad(True)
+        self.screen.nodelay(True)
+        if curses.has_colors():
+            curses.start_color()
+            curses.use_default_colors()
+
+        self._streams = (sys.stdout, sys.stderr)
+        writer = ScreenWriter(self)
+        sys.stdout = sys.stderr = writer
+        # Логи иначе писали бы поверх экрана в настоящий stderr
+        self._log_handlers = [
+            handler for handler in logging.getLogger().handlers
+            if isinstance(handler, logging.StreamHandler) and handler.stream in self._streams
+        ]
+        for handler in self._log_handlers:
+            handler.setStream(writer)
+        threading.Thread(target=self._refresh_loop, name="tui", daemon=True).start()
+
+    def stop(self):
+        """Вернуть терминал в обычный режим"""
+        if self.screen is None:
+            return
+        self._stop.set()
+        with self._lock:
+            sys.stdout, sys.stderr = self._streams
+            for handler in self._log_handlers:
+                handler.setStream(self._streams[1])
+            curses.nocbreak()
+            self.screen.keypad(False)
+            curses.echo()
+            curses.endwin()
+            self.screen = None
+
+    def close(self):
+        self.stop()
+
+    def write(self, text):
+        """Добавить текст в модель экрана"""
+        with self._lock:
+            self.model.feed(text)
+            self._dirty = True
+
+    def refresh(self):
+        """Перерисовать изменившиеся строки"""
+        with self._lock:
+            if self.screen is not None and self._dirty:
+                self._draw()
+
+    def get_input(self, prompt, color=Colors.BRIGHT_YELLOW):
+        """Ввод строки в нижней строке экрана
+
+        Многострочный промпт выводится на экран, в строке ввода остается
+        его последняя строка. Введенная строка остается в истории экрана.
+        """
+        if "\n" in prompt:
+            head, prompt = prompt.rsplit("\n", 1)
+            self.write(head + "\n")
+        match = ANSI_RE.match(color)
+        with self._lock:
+            self._prompt = prompt
+            self._prompt_style = ScreenModel._apply_sgr((-1, -1, frozenset()), match.group(1) if match else "")
+            self._buffer = ""
+            self._dirty = True
+            self._draw()
+
+        while True:
+            with self._lock:
+                try:
+                    key = self.screen.get_wch()
+                except curses.error:
+                    key = None
+                if key is not None:
+                    line = self._edit(key)
+                    if line is not None:
+                        self.model.feed(f"{color}{prompt}{Colors.RESET}{line}\n")
+                        self._prompt = self._buffer = ""
+                        self._dirty = True
+                        self._draw()
+                        return line
+            if key is None:
+                self._stop.wait(0.02)
+
+    def _edit(self, key):
+        """Обработать нажатие в строке ввода; введенная строка по Enter"""
+        if key in ("\n", "\r", curses.KEY_ENTER):
+            return self._buffer
+        if key in ("\b", "\x7f", curses.KEY_BACKSPACE):
+            self._buffer = self._buffer[:-1]
+        elif key == "\x15":
+            self._buffer = ""
+        elif key == curses.KEY_RESIZE:
+            curses.update_lines_cols()
+            self._drawn = []
+        elif isinstance(key, str) and key.isprintable():
+            self._buffer += key
+        self._dirty = True
+        self._draw()
+        return None
+
+    def _refresh_loop(self):
+        """Обновлять строку состояния и выведенный фоновыми потоками текст"""
+        while not self._stop.wait(TUI_REFRESH_INTERVAL):
+            status = self._status_text()
+            with self._lock:
+                if self.screen is None:
+                    return
+                if status != self._status:
+                    self._dirty = True
+                if self._dirty:
+                    self._draw()
+
+    @staticmethod
+    def _status_text():
+        tasks = activity.snapshot()
+        if not tasks:
+            return " Фоновых задач нет"
+        return " ⟳ " + " · ".join(tasks)
+
+    def _attr(self, fg, bg, flags):
+        """Атрибут curses для цвета и стилей фрагмента"""
+        attr = 0
+        if fg >= 8 and curses.COLORS < 16:
+            fg -= 8
+            attr |= curses.A_BOLD
+        if bg >= 8 and curses.COLORS < 16:
+            bg -= 8
+        if (fg, bg) != (-1, -1) and curses.has_colors():
+            pair = self._pairs.get((fg, bg))
+            if pair is None and len(self._pairs) + 1 < curses.COLOR_PAIRS:
+                pair = len(self._pairs) + 1
+                curses.init_pair(pair, fg, bg)
+                self._pairs[(fg, bg)] = pair
+            if pair:
+                attr |= curses.color_pair(pair)
+        for code, flag in ((1, curses.A_BOLD), (2, curses.A_DIM), (4, curses.A_UNDERLINE), (7, curses.A_REVERSE)):
+            if code in flags:
+                attr |= flag
+        return attr
+
+    def _draw(self):
+        """Вывести на терминал строки, отличающиеся от уже нарисованных
+
+        Вызывается под блокировкой.
+        """
+        height, width = self.screen.getmaxyx()
+        self._status = self._status_text()
+        content = self.model.rows(height - 2)
+        wanted = [tuple(row) for row in content] + [()] * (height - 2 - len(content))
+        wanted.append(((self._status.ljust(width), -1, -1, frozenset({7})),))
+        wanted.append(((self._prompt,) + self._prompt_style, (self._buffer, -1, -1, frozenset())))
+
+        if len(self._drawn) != len(wanted):
+            self._drawn = [None] * len(wanted)
+        for y, row in enumerate(wanted):
+            if self._drawn[y] == row:
+                continue
+            self.screen.move(y, 0)
+            self.screen.clrtoeol()
+            x = 0
+            for text, fg, bg, flags in row:
+                text = text[:max(0, width - 1 - x)]
+                if not text:
+                    break
+                try:
+                    self.screen.addstr(y, x, text, self._attr(fg, bg, flags))
+                except curses.error:
+                    pass
+                x += len(text)
+            self._drawn[y] = row
+
+        cursor = min(len(self._prompt) + len(self._buffer), width - 1)
+        try:
+            self.screen.move(height - 1, cursor)
+        except curses.error:
+            pass
+        self.screen.refresh()
+        self._dirty = False
+
+def create_ui(mode=UI_MODE):
+    """Создать интерфейс: полноэкранный, если он запрошен и терминал его поддерживает"""
+    if mode == "tui" and tui_available():
+        ui = CursesUI()
+        ui.start()
+        return ui
+    return ConsoleUI()
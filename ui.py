@@ -1,13 +1,20 @@
 import os
-from config import Colors
+import shutil
+import sys
+from config import Colors, LIST_RESERVED_LINES, LIST_MIN_PAGE_SIZE
 
 class ConsoleUI:
     """Класс для красивого консольного интерфейса"""
     
     @staticmethod
     def clear_screen():
-        """Очистка экрана"""
-        os.system('cls' if os.name == 'nt' else 'clear')
+        """Очистка экрана escape-последовательностью, без запуска cls/clear"""
+        if sys.stdout.isatty() and os.getenv('TERM') != 'dumb':
+            sys.stdout.write("\033[2J\033[H")
+            sys.stdout.flush()
+        else:
+            # Простой терминал или вывод в файл - просто отделяем экраны
+            print()
     
     @staticmethod
     def print_header(title):
@@ -85,4 +92,84 @@ class ConsoleUI:
     @staticmethod
     def get_input(prompt, color=Colors.BRIGHT_YELLOW):
         """Получение ввода с цветным промптом"""
-        return input(f"{color}{prompt}{Colors.RESET}")
\ No newline at end of file
+        return input(f"{color}{prompt}{Colors.RESET}")
+
+    def close(self):
+        """Вернуть терминал в обычный режим (обычному выводу нечего возвращать)"""
+
+class ListView:
+    """Постраничный вывод длинного списка
+
+    Форматируется только видимая страница (по высоте терминала), готовые
+    строки кэшируются, а кадр выводится одной записью в stdout.
+    format_row(number, item, selected) возвращает строку для элемента.
+    """
+
+    def __init__(self, items, format_row, reserved_lines=LIST_RESERVED_LINES):
+        self.items = items
+        self.format_row = format_row
+        self.reserved_lines = reserved_lines
+        self.page = 0
+        self._rows = {}
+
+    def page_size(self):
+        """Сколько строк списка помещается в терминал"""
+        lines = shutil.get_terminal_size((80, 24)).lines
+        return max(LIST_MIN_PAGE_SIZE, lines - self.reserved_lines)
+
+    def page_count(self):
+        """Число страниц"""
+        return max(1, -(-len(self.items) // self.page_size()))
+
+    def show_index(self, index):
+        """Перейти на страницу с элементом index"""
+        self.page = index // self.page_size()
+
+    def invalidate(self):
+        """Сбросить кэш строк после изменения списка"""
+        self._rows.clear()
+
+    def render(self, selected=None):
+        """Строки текущей страницы и строка навигации
+
+        selected - индекс выделенного элемента.
+        """
+        size = self.page_size()
+        self.page = min(self.page, self.page_count() - 1)
+        start = self.page * size
+        lines = []
+        for index in range(start, min(start + size, len(self.items))):
+            key = (index, index == selected)
+            row = self._rows.get(key)
+            if row is None:
+                row = self.format_row(index + 1, self.items[index], index == selected)
+                self._rows[key] = row
+            lines.append(row)
+
+        if len(self.items) > size:
+            lines.append(
+                f"{Colors.BRIGHT_BLACK}Страница {self.page + 1}/{self.page_count()} "
+                f"({start + 1}-{min(start + size, len(self.items))} из {len(self.items)}) · "
+                f"] / [ - следующая / предыдущая, g[номер] - перейти к номеру{Colors.RESET}"
+            )
+        return lines
+
+    def handle_command(self, choice):
+        """Обработать команду навигации; True, если команда относилась к списку"""
+        if choice == ']':
+            self.page = min(self.page + 1, self.page_count() - 1)
+        elif choice == '[':
+            self.page = max(self.page - 1, 0)
+        elif choice.startswith('g') and choice[1:].isdigit():
+            number = int(choice[1:])
+            if 1 <= number <= len(self.items):
+                self.show_index(number - 1)
+        else:
+            return False
+        return True
+
+
+def write_frame(lines):
+    """Вывести кадр одной записью в stdout"""
+    sys.stdout.write("\n".join(lines) + "\n")
+    sys.stdout.flush()
@@ -1,65 +1,83 @@
-import tempfile
 import webbrowser
 import subprocess
 import sys
 import os
 import re
-import shutil
+import threading
+import logging
 from datetime import datetime
-from config import Colors, PROGRAM_INFO
-from ui import ConsoleUI
+from config import (
+    Colors,
+    PROGRAM_INFO,
+    DOWNLOAD_WORKERS,
+    STREAM_START_TIMEOUT,
+    PLAYER_SEEK_STEP,
+    PLAYER_VOLUME_STEP,
+    PLAYER_RESERVED_LINES,
+    URL_REFRESH_BATCH,
+    URL_EXPIRED_STATUSES
+)
+from ui import ConsoleUI, ListView, write_frame
+from errors import DownloadError, VKAPIError
+from streaming import StreamPlayback, find_player, play_file
+from player import create_backend
+from audiocache import export_file
+from playqueue import PlayQueue, Prefetcher
 
-def play_audio(track_url, track_name, vk_manager, auto_download=False):
-    """Воспроизвести аудиозапись с возможностью скачивания"""
+logger = logging.getLogger(__name__)
+
+def get_player(vk_manager):
+    """Плеер программы: создается при первом воспроизведении и дальше переиспользуется"""
+    if vk_manager.player is None:
+        vk_manager.player = create_backend()
+    return vk_manager.player
+
+def play_audio(track_url, track_name, vk_manager, auto_download=False, track=None, on_started=None,
+               download_dir="downloads"):
+    """Воспроизвести аудиозапись с возможностью скачивания
+
+    on_started() вызывается, когда трек начал играть; сохраняется трек
+    в download_dir.
+    """
+    track = track or {'url': track_url}
+    
+    # Если есть плеер, читающий поток, играем по мере загрузки
+    player = get_player(vk_manager)
+    if player.controllable or find_player():
+        return stream_audio(track_url, track_name, vk_manager, auto_download, track, on_started, download_dir)
+    
     try:
         vk_manager.ui.print_playing(f"Воспроизведение: {track_name}")
         
-        # Создаем временный файл
-        import tempfile
-        temp_file = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False)
-        temp_filename = temp_file.name
-        temp_file.close()
-        
-        vk_manager.ui.print_downloading("Скачивание трека...")
-        
-        # Скачиваем трек
-        headers = vk_manager.headers.copy()
-        headers.update({
-            'Referer': 'https://vk.com/',
-            'Origin': 'https://vk.com'
-        })
-        
+        # Трек берем из кэша аудио, а если его там нет - скачиваем в кэш
         try:
-            import requests
-            response = requests.get(track_url, stream=True, headers=headers)
-            if response.status_code == 200:
-                with open(temp_filename, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                
-                # Воспроизводим
-                if os.name == 'nt':
-                    os.startfile(temp_filename)
-                elif os.name == 'posix':
-                    if sys.platform == 'darwin':
-                        subprocess.run(['open', temp_filename])
-                    else:
-                        subprocess.run(['xdg-open', temp_filename])
-                
-                vk_manager.ui.print_success(f"Аудио открыто в медиаплеере: {track_name}")
-                
-                # Предлагаем сохранить
-                if not auto_download:
-                    save = vk_manager.ui.get_input("\nСохранить файл? (y/n): ").strip().lower()
-                    if save == 'y':
-                        save_track_with_name(track_name, temp_filename, vk_manager)
-                
-                return True
+            audio_path = vk_manager.audio_cache.get(track)
+            if audio_path:
+                vk_manager.ui.print_info("Трек найден в кэше")
+            else:
+                vk_manager.ui.print_downloading("Скачивание трека...")
+                audio_path = vk_manager.audio_cache.download(vk_manager, track)
+            
+            # Воспроизводим
+            player.play(audio_path)
+            
+            vk_manager.ui.print_success(f"Аудио открыто в медиаплеере: {track_name}")
+            if on_started:
+                on_started()
+            
+            # Предлагаем сохранить
+            if auto_download:
+                save_track_with_name(track_name, audio_path, vk_manager, track, keep_source=True, download_dir=download_dir)
             else:
-                vk_manager.ui.print_error(f"Ошибка при скачивании: {response.status_code}")
-                return False
+                save = vk_manager.ui.get_input("\nСохранить файл? (y/n): ").strip().lower()
+                if save == 'y':
+                    save_track_with_name(track_name, audio_path, vk_manager, track, keep_source=True, download_dir=download_dir)
+            
+            return True
                 
+        except DownloadError as e:
+            vk_manager.ui.print_error(f"Ошибка при скачивании: {e.reason}")
+            return False
         except Exception as e:
             vk_manager.ui.print_error(f"Ошибка скачивания: {e}")
             return False
@@ -68,8 +86,108 @@ def play_audio(track_url, track_name, vk_manager, auto_download=False):
         vk_manager.ui.print_error(f"Ошибка при воспроизведении аудио: {e}")
         return False
 
-def save_track_with_name(track_name, source_path, vk_manager):
-    """Сохранить трек с правильным именем"""
+def stream_audio(track_url, track_name, vk_manager, auto_download=False, track=None, on_started=None,
+                 download_dir="downloads"):
+    """Воспроизвести трек потоком через mpv/ffplay, сохраняя его той же загрузкой"""
+    vk_manager.ui.print_playing(f"Воспроизведение: {track_name}")
+    
+    # Предыдущий трек останавливаем
+    if vk_manager.playback:
+        vk_manager.playback.stop()
+    
+    # Управляемый плеер (mpv) один на всю программу, иначе на каждый трек запускается свой
+    player = get_player(vk_manager)
+    backend = player if player.controllable else None
+    command = None if backend else find_player()
+    
+    audio_cache = vk_manager.audio_cache
+    cached_path = audio_cache.get(track)
+    
+    def on_complete(result):
+        # Загруженный трек попадает в кэш, при "воспроизвести и скачать" - и в папку загрузок
+        if not result["success"]:
+            return
+        audio_cache.add(track)
+        if not auto_download:
+            return
+        # Вызывается в потоке загрузки: ошибку некому показать, кроме журнала
+        try:
+            if vk_manager.ledger.get(track):
+                return
+            os.makedirs(download_dir, exist_ok=True)
+            filepath = vk_manager.get_track_download_path(track, download_dir)
+            export_file(result["path"], filepath, keep_source=True)
+            vk_manager.add_id3_tags(filepath, track, quiet=True)
+            vk_manager.ledger.record(track, filepath)
+        except Exception as e:
+            logger.warning("Не удалось сохранить %s в %s: %s", track_name, download_dir, e)
+    
+    if cached_path and backend:
+        # Файл из кэша mpv открывает сам, тогда по треку работает перемотка
+        vk_manager.playback = None
+        playback_start = play_file(backend, cached_path)
+        if playback_start is None:
+            vk_manager.ui.print_error("Ошибка при воспроизведении: плеер не начал воспроизведение")
+            return False
+    else:
+        if cached_path:
+            playback = StreamPlayback(vk_manager.http, track_url, command, source_path=cached_path)
+        else:
+            playback = StreamPlayback(vk_manager.http, track_url, command, audio_cache.path_for(track),
+                                      on_complete=on_complete, metrics=vk_manager.metrics, backend=backend)
+        vk_manager.playback = playback
+        playback.start()
+        
+        if not playback.wait_started(STREAM_START_TIMEOUT):
+            playback.stop()
+            # Ссылка устарела - получаем новую и пробуем еще раз
+            if (playback.status_code in URL_EXPIRED_STATUSES and track.get('url') == track_url
+                    and vk_manager.links.refresh([track])):
+                vk_manager.ui.print_info("Ссылка на трек устарела, получена новая")
+                return stream_audio(track['url'], track_name, vk_manager, auto_download, track, on_started, download_dir)
+            error = playback.result["error"] if playback.result else "плеер не начал воспроизведение"
+            vk_manager.ui.print_error(f"Ошибка при воспроизведении: {error}")
+            if backend:
+                backend.stop()
+            return False
+        playback_start = playback.playback_start
+    
+    if on_started:
+        on_started()
+    
+    if cached_path:
+        vk_manager.ui.print_success(f"Играет из кэша: {track_name} (звук через {playback_start:.2f} с)")
+        if auto_download:
+            save_track_with_name(track_name, cached_path, vk_manager, track, keep_source=True, download_dir=download_dir)
+            return True
+    else:
+        vk_manager.ui.print_success(
+            f"Играет: {track_name} (первый байт через {playback.ttfb:.2f} с, "
+            f"звук через {playback.playback_start:.2f} с)"
+        )
+        if auto_download:
+            vk_manager.ui.print_info("Трек будет сохранен в папку загрузок после загрузки")
+            return True
+    
+    save = vk_manager.ui.get_input("\nСохранить файл? (y/n): ").strip().lower()
+    if save != 'y':
+        return True
+    
+    if not cached_path:
+        vk_manager.ui.print_info("Дожидаюсь окончания загрузки...")
+        result = playback.wait()
+        if not result["success"]:
+            vk_manager.ui.print_error(f"Ошибка при скачивании: {result['error']}")
+            return False
+        cached_path = result["path"]
+    return save_track_with_name(track_name, cached_path, vk_manager, track, keep_source=True, download_dir=download_dir)
+
+def save_track_with_name(track_name, source_path, vk_manager, track=None, keep_source=False, download_dir="downloads"):
+    """Сохранить трек с правильным именем
+
+    Файл выносится в папку загрузок жесткой ссылкой (keep_source, для файлов
+    из кэша аудио) или переименованием, без копирования данных.
+    """
     try:
         # Очищаем имя файла
         def clean_filename(name):
@@ -85,7 +203,6 @@ def save_track_with_name(track_name, source_path, vk_manager):
             return name
         
         # Создаем папку для загрузок
-        download_dir = "downloads"
         os.makedirs(download_dir, exist_ok=True)
         
         # Создаем имя файла
@@ -100,15 +217,11 @@ def save_track_with_name(track_name, source_path, vk_manager):
             filepath = f"{name}_{counter}{ext}"
             counter += 1
         
-        # Копируем файл
-        shutil.copy2(source_path, filepath)
+        export_file(source_path, filepath, keep_source)
         vk_manager.ui.print_success(f"Файл сохранен: {filepath}")
         
-        # Удаляем временный файл
-        try:
-            os.unlink(source_path)
-        except:
-            pass
+        if track:
+            vk_manager.ledger.record(track, filepath)
             
         return True
         
@@ -116,14 +229,111 @@ def save_track_with_name(track_name, source_path, vk_manager):
         vk_manager.ui.print_error(f"Ошибка при сохранении: {e}")
         return False
 
-def interactive_audio_player(audio_list, title, vk_manager):
-    """Интерактивный плеер для прослушивания и скачивания аудиозаписей"""
+def save_track(track, vk_manager, download_dir="downloads"):
+    """Скачать трек в папку загрузок через кэш аудио"""
+    entry = vk_manager.ledger.get(track)
+    if entry:
+        vk_manager.ui.print_info(f"Трек уже скачан: {entry['path']}")
+        return True
+    
+    track_name = f"{track.get('artist', 'Unknown Artist')} - {track.get('title', 'Unknown Title')}"
+    try:
+        cached_path = vk_manager.audio_cache.fetch(vk_manager, track)
+    except DownloadError as e:
+        vk_manager.ui.print_error(e.reason)
+        return False
+    return save_track_with_name(track_name, cached_path, vk_manager, track, keep_source=True, download_dir=download_dir)
+
+def play_queue_track(track, vk_manager, play_queue, prefetcher, auto_download=False, download_dir="downloads"):
+    """Воспроизвести трек очереди и начать предзагрузку следующих"""
+    # Истекающие ссылки этого и следующих треков обновляем одним запросом
+    vk_manager.links.refresh_expiring([track] + play_queue.upcoming(URL_REFRESH_BATCH - 1))
+    track_url = track.get('url')
+    if not track_url:
+        vk_manager.ui.print_error("У этого трека нет ссылки для воспроизведения")
+        return False
+    
+    # Если трек уже загружается заранее, дожидаемся его, а не качаем второй раз
+    prefetcher.take(track)
+    track_name = f"{track.get('artist', 'Unknown Artist')} - {track.get('title', 'Unknown Title')}"
+    return play_audio(
+        track_url, track_name, vk_manager, auto_download=auto_download, track=track,
+        on_started=lambda: prefetcher.prefetch(play_queue.upcoming(prefetcher.depth)),
+        download_dir=download_dir
+    )
+
+def format_track_row(number, track, selected):
+    """Строка трека в списке плеера"""
+    artist = track.get('artist', 'Unknown Artist')
+    title_track = track.get('title', 'Unknown Title')
+    duration = track.get('duration', 0)
+    duration_str = f"{duration // 60}:{duration % 60:02d}"
+    
+    # Чередование цветов для строк
+    color = Colors.BRIGHT_WHITE if number % 2 == 0 else Colors.WHITE
+    # Маркер для текущего трека
+    marker = "▶ " if selected else "  "
+    
+    return (f"{Colors.BRIGHT_YELLOW}{number:3d}.{Colors.RESET} {marker}{color}{artist} - {title_track} "
+            f"{Colors.BRIGHT_BLACK}({duration_str}){Colors.RESET}")
+
+def format_time(seconds):
+    """Время в секундах в виде м:сс"""
+    if seconds is None:
+        return "-:--"
+    seconds = int(seconds)
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+def interactive_audio_player(audio_list, title, vk_manager, search=None):
+    """Интерактивный плеер для прослушивания и скачивания аудиозаписей
+
+    search - результаты поиска (SearchResults), которые подгружаются при
+    прокрутке к концу списка; audio_list тогда - это search.items.
+    """
     if not audio_list:
         vk_manager.ui.print_info("Нет аудиозаписей для воспроизведения")
         return
     
-    current_track = None
+    play_queue = PlayQueue(audio_list)
+    player = get_player(vk_manager)
+    # Треки, поставленные в очередь mpv: путь в кэше -> трек. Словарь меняют
+    # поток предзагрузки и поток событий mpv, поэтому доступ - под блокировкой
+    queued_tracks = {}
+    queued_lock = threading.Lock()
+    
+    def on_prefetched(track, path):
+        # Загруженный заранее следующий трек сразу ставим в очередь плеера,
+        # чтобы он заиграл без паузы после текущего
+        upcoming = play_queue.upcoming(1)
+        if player.controllable and player.status().get("path") and upcoming and upcoming[0] is track:
+            with queued_lock:
+                queued_tracks[path] = track
+            player.enqueue(path)
+    
+    def on_player_event(event):
+        # mpv сам перешел к треку из своей очереди - сдвигаем и нашу
+        if event.get("event") == "property-change" and event.get("name") == "path":
+            with queued_lock:
+                track = queued_tracks.pop(event.get("data"), None)
+            if track is not None and play_queue.advance_to(track):
+                prefetcher.take(track)
+                prefetcher.prefetch(play_queue.upcoming(prefetcher.depth))
+    
+    def load_more_results():
+        # Следующая страница поиска дописывается в конец списка и очереди
+        try:
+            added = search.load_more()
+        except VKAPIError as e:
+            vk_manager.ui.print_error(f"Не удалось загрузить результаты: {e.error_msg}")
+            return
+        if added:
+            play_queue.extend()
+    
+    prefetcher = Prefetcher(vk_manager, on_ready=on_prefetched)
+    player.add_listener(on_player_event)
     download_dir = "downloads"
+    download_workers = DOWNLOAD_WORKERS
+    track_view = ListView(audio_list, format_track_row, reserved_lines=PLAYER_RESERVED_LINES)
     
     # Создаем директорию для загрузок
     os.makedirs(download_dir, exist_ok=True)
@@ -131,127 +341,105 @@ def interactive_audio_player(audio_list, title, vk_manager):
     vk_manager.ui.print_header(title)
     
     while True:
-        print(f"\n{Colors.BRIGHT_CYAN}📊 Статистика:{Colors.RESET}")
-        print(f"   {Colors.BRIGHT_WHITE}Доступно треков:{Colors.RESET} {Colors.BRIGHT_GREEN}{len(audio_list)}{Colors.RESET}")
-        print(f"   {Colors.BRIGHT_WHITE}Папка загрузок:{Colors.RESET} {Colors.BRIGHT_BLUE}{download_dir}{Colors.RESET}")
+        # Кадр собирается целиком и выводится одной записью
+        frame = [
+            f"\n{Colors.BRIGHT_CYAN}📊 Статистика:{Colors.RESET}",
+            f"   {Colors.BRIGHT_WHITE}Загружено:{Colors.RESET} {Colors.BRIGHT_GREEN}{len(audio_list)}{Colors.RESET} из {search.total_count}"
+            if search else
+            f"   {Colors.BRIGHT_WHITE}Доступно треков:{Colors.RESET} {Colors.BRIGHT_GREEN}{len(audio_list)}{Colors.RESET}",
+            f"   {Colors.BRIGHT_WHITE}Папка загрузок:{Colors.RESET} {Colors.BRIGHT_BLUE}{download_dir}{Colors.RESET}",
+            f"   {Colors.BRIGHT_WHITE}Потоков загрузки:{Colors.RESET} {Colors.BRIGHT_BLUE}{download_workers}{Colors.RESET}",
+            f"   {Colors.BRIGHT_WHITE}Порядок:{Colors.RESET} {Colors.BRIGHT_BLUE}{'вперемешку' if play_queue.shuffle else 'по порядку'}{Colors.RESET}"
+        ]
+        if prefetcher.stats["prefetched"]:
+            frame.append(f"   {Colors.BRIGHT_WHITE}Загружено заранее:{Colors.RESET} {prefetcher.stats['prefetched']}"
+                         f" (пригодилось {prefetcher.stats['used']}, отменено {prefetcher.stats['cancelled']})")
         
-        print(f"\n{Colors.BRIGHT_CYAN}🎵 Список треков:{Colors.RESET}")
-        print(f"{Colors.BRIGHT_BLACK}{'─' * 80}{Colors.RESET}")
+        status = player.status()
+        if status.get("path"):
+            position = format_time(status.get("position"))
+            duration = format_time(status.get("duration"))
+            state = "пауза" if status.get("paused") else "играет"
+            frame.append(f"   {Colors.BRIGHT_WHITE}Плеер:{Colors.RESET} {Colors.BRIGHT_GREEN}{state} {position} / {duration}{Colors.RESET}"
+                         f", громкость {status.get('volume') or 0:.0f}%")
         
-        for i, track in enumerate(audio_list, 1):
-            artist = track.get('artist', 'Unknown Artist')
-            title_track = track.get('title', 'Unknown Title')
-            duration = track.get('duration', 0)
-            
-            minutes = duration // 60
-            seconds = duration % 60
-            duration_str = f"{minutes}:{seconds:02d}"
-            
-            # Чередование цветов для строк
-            if i % 2 == 0:
-                color = Colors.BRIGHT_WHITE
-            else:
-                color = Colors.WHITE
-            
-            # Маркер для текущего трека
-            marker = "▶ " if track == current_track else "  "
-            
-            print(f"{Colors.BRIGHT_YELLOW}{i:3d}.{Colors.RESET} {marker}{color}{artist} - {title_track} {Colors.BRIGHT_BLACK}({duration_str}){Colors.RESET}")
+        frame.append(f"\n{Colors.BRIGHT_CYAN}🎵 Список треков:{Colors.RESET}")
+        frame.append(f"{Colors.BRIGHT_BLACK}{'─' * 80}{Colors.RESET}")
+        current_index = play_queue.current_index()
+        frame.extend(track_view.render(selected=current_index))
         
-        print(f"\n{Colors.BRIGHT_CYAN}🎮 Управление:{Colors.RESET}")
-        print(f"   {Colors.BRIGHT_YELLOW}[1-{len(audio_list)}]{Colors.RESET} - Выбрать трек")
-        print(f"   {Colors.BRIGHT_YELLOW}p{Colors.RESET} - Воспроизвести текущий/случайный трек")
-        print(f"   {Colors.BRIGHT_YELLOW}d[номер]{Colors.RESET} - Скачать трек (пример: d5)")
-        print(f"   {Colors.BRIGHT_YELLOW}da{Colors.RESET} - Скачать все треки")
-        print(f"   {Colors.BRIGHT_YELLOW}dir{Colors.RESET} - Изменить папку загрузки")
-        print(f"   {Colors.BRIGHT_YELLOW}o{Colors.RESET} - Открыть папку загрузок")
-        print(f"   {Colors.BRIGHT_YELLOW}q{Colors.RESET} - Выход в меню")
+        frame.append(f"\n{Colors.BRIGHT_CYAN}🎮 Управление:{Colors.RESET}")
+        frame.append(f"   {Colors.BRIGHT_YELLOW}[1-{len(audio_list)}]{Colors.RESET} - Выбрать трек")
+        frame.append(f"   {Colors.BRIGHT_YELLOW}p{Colors.RESET} - Воспроизвести текущий трек")
+        frame.append(f"   {Colors.BRIGHT_YELLOW}n{Colors.RESET} / {Colors.BRIGHT_YELLOW}b{Colors.RESET} - Следующий / предыдущий трек")
+        frame.append(f"   {Colors.BRIGHT_YELLOW}s{Colors.RESET} - Перемешать / по порядку")
+        if player.controllable:
+            frame.append(f"   {Colors.BRIGHT_YELLOW}pp{Colors.RESET} - Пауза / продолжить, {Colors.BRIGHT_YELLOW}x{Colors.RESET} - Стоп")
+            frame.append(f"   {Colors.BRIGHT_YELLOW}<{Colors.RESET} / {Colors.BRIGHT_YELLOW}>{Colors.RESET} - Перемотка на {PLAYER_SEEK_STEP} с, "
+                         f"{Colors.BRIGHT_YELLOW}+{Colors.RESET} / {Colors.BRIGHT_YELLOW}-{Colors.RESET} - Громкость")
+        frame.append(f"   {Colors.BRIGHT_YELLOW}d[номер]{Colors.RESET} - Скачать трек (пример: d5)")
+        frame.append(f"   {Colors.BRIGHT_YELLOW}da{Colors.RESET} - Скачать все треки")
+        frame.append(f"   {Colors.BRIGHT_YELLOW}dir{Colors.RESET} - Изменить папку загрузки")
+        frame.append(f"   {Colors.BRIGHT_YELLOW}w{Colors.RESET} - Изменить число параллельных загрузок")
+        frame.append(f"   {Colors.BRIGHT_YELLOW}o{Colors.RESET} - Открыть папку загрузок")
+        frame.append(f"   {Colors.BRIGHT_YELLOW}q{Colors.RESET} - Выход в меню")
+        write_frame(frame)
         
         choice = vk_manager.ui.get_input("\nВаш выбор: ").strip().lower()
         
         if choice == 'q':
+            prefetcher.close()
+            player.remove_listener(on_player_event)
             break
+        
+        elif track_view.handle_command(choice):
+            # Листание списка; на последней странице подгружаем результаты поиска
+            if search and search.has_more and track_view.page >= track_view.page_count() - 1:
+                load_more_results()
+            continue
             
         elif choice == 'p':
-            if current_track:
-                # Воспроизвести текущий трек
-                artist = current_track.get('artist', 'Unknown Artist')
-                title_track = current_track.get('title', 'Unknown Title')
-                track_url = current_track.get('url')
-                
-                if track_url:
-                    track_name = f"{artist} - {title_track}"
-                    play_audio(track_url, track_name, vk_manager)
-                else:
-                    vk_manager.ui.print_error("У этого трека нет ссылки для воспроизведения")
+            # Воспроизвести текущий трек, а если его еще нет - первый в очереди
+            track = play_queue.current() or play_queue.next()
+            track_view.show_index(play_queue.current_index())
+            play_queue_track(track, vk_manager, play_queue, prefetcher)
+            
+        elif choice == 'n':
+            if search and search.has_more and play_queue.is_last():
+                load_more_results()
+            track = play_queue.next()
+            track_view.show_index(play_queue.current_index())
+            play_queue_track(track, vk_manager, play_queue, prefetcher)
+            
+        elif choice == 'b':
+            track = play_queue.previous()
+            track_view.show_index(play_queue.current_index())
+            play_queue_track(track, vk_manager, play_queue, prefetcher)
+            
+        elif player.controllable and choice in ('pp', 'x', '<', '>', '+', '-'):
+            # Управление mpv
+            if choice == 'pp':
+                player.toggle_pause()
+            elif choice == 'x':
+                player.stop()
+            elif choice in ('<', '>'):
+                player.seek(PLAYER_SEEK_STEP if choice == '>' else -PLAYER_SEEK_STEP)
             else:
-                # Воспроизвести случайный трек
-                import random
-                track = random.choice(audio_list)
-                current_track = track
-                artist = track.get('artist', 'Unknown Artist')
-                title_track = track.get('title', 'Unknown Title')
-                track_url = track.get('url')
-                
-                if track_url:
-                    track_name = f"{artist} - {title_track}"
-                    play_audio(track_url, track_name, vk_manager)
-                else:
-                    vk_manager.ui.print_error("У этого трека нет ссылки для воспроизведения")
+                player.change_volume(PLAYER_VOLUME_STEP if choice == '+' else -PLAYER_VOLUME_STEP)
+            
+        elif choice == 's':
+            play_queue.set_shuffle(not play_queue.shuffle)
+            vk_manager.ui.print_info("Треки перемешаны" if play_queue.shuffle else "Треки идут по порядку")
+            # Загруженное заранее для старого порядка больше не нужно
+            if play_queue.current():
+                prefetcher.prefetch(play_queue.upcoming(prefetcher.depth))
                     
         elif choice.startswith('d'):
             if choice == 'da':
-                # Скачать все треки
-                vk_manager.ui.print_info(f"Начинаю скачивание всех {len(audio_list)} треков...")
-                downloaded = 0
-                failed = 0
-                
-                for i, track in enumerate(audio_list, 1):
-                    artist = track.get('artist', 'Unknown Artist')
-                    title_track = track.get('title', 'Unknown Title')
-                    track_url = track.get('url')
-                    
-                    if track_url:
-                        vk_manager.ui.print_info(f"[{i}/{len(audio_list)}] Скачиваю: {artist} - {title_track}")
-                        
-                        # Создаем временный файл
-                        temp_file = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False)
-                        temp_filename = temp_file.name
-                        temp_file.close()
-                        
-                        # Скачиваем
-                        try:
-                            import requests
-                            headers = vk_manager.headers.copy()
-                            headers.update({
-                                'Referer': 'https://vk.com/',
-                                'Origin': 'https://vk.com'
-                            })
-                            
-                            response = requests.get(track_url, stream=True, headers=headers)
-                            if response.status_code == 200:
-                                with open(temp_filename, 'wb') as f:
-                                    for chunk in response.iter_content(chunk_size=8192):
-                                        if chunk:
-                                            f.write(chunk)
-                                
-                                # Сохраняем с правильным именем
-                                track_name = f"{artist} - {title_track}"
-                                if save_track_with_name(track_name, temp_filename, vk_manager):
-                                    downloaded += 1
-                                else:
-                                    failed += 1
-                            else:
-                                failed += 1
-                                
-                        except Exception as e:
-                            vk_manager.ui.print_error(f"Ошибка при скачивании: {e}")
-                            failed += 1
-                    else:
-                        failed += 1
-                
-                vk_manager.ui.print_success(f"Скачивание завершено!")
-                vk_manager.ui.print_info(f"Успешно: {downloaded}, Не удалось: {failed}")
+                # Скачать все треки в фоне - плеером можно пользоваться дальше
+                job = vk_manager.start_download(audio_list, download_dir, download_workers, title)
+                vk_manager.ui.print_info(f"Скачивание {len(audio_list)} треков в {download_workers} потоков "
+                                         f"запущено в фоне (задача #{job.id}). Ход загрузки - в меню фоновых задач")
                 
             elif len(choice) > 1:
                 # Скачать конкретный трек
@@ -267,35 +455,8 @@ def interactive_audio_player(audio_list, title, vk_manager):
                             if track_url:
                                 vk_manager.ui.print_info(f"Скачиваю: {artist} - {title_track}")
                                 
-                                # Создаем временный файл
-                                temp_file = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False)
-                                temp_filename = temp_file.name
-                                temp_file.close()
-                                
-                                # Скачиваем
-                                try:
-                                    import requests
-                                    headers = vk_manager.headers.copy()
-                                    headers.update({
-                                        'Referer': 'https://vk.com/',
-                                        'Origin': 'https://vk.com'
-                                    })
-                                    
-                                    response = requests.get(track_url, stream=True, headers=headers)
-                                    if response.status_code == 200:
-                                        with open(temp_filename, 'wb') as f:
-                                            for chunk in response.iter_content(chunk_size=8192):
-                                                if chunk:
-                                                    f.write(chunk)
-                                        
-                                        # Сохраняем с правильным именем
-                                        track_name = f"{artist} - {title_track}"
-                                        save_track_with_name(track_name, temp_filename, vk_manager)
-                                    else:
-                                        vk_manager.ui.print_error(f"Ошибка HTTP: {response.status_code}")
-                                        
-                                except Exception as e:
-                                    vk_manager.ui.print_error(f"Ошибка при скачивании: {e}")
+                                # Скачиваем через кэш аудио и сохраняем с правильным именем
+                                save_track(track, vk_manager, download_dir)
                             else:
                                 vk_manager.ui.print_error("У трека нет ссылки для скачивания")
                         else:
@@ -312,6 +473,14 @@ def interactive_audio_player(audio_list, title, vk_manager):
                 os.makedirs(download_dir, exist_ok=True)
                 vk_manager.ui.print_success(f"Папка загрузок изменена на: {download_dir}")
                 
+        elif choice == 'w':
+            new_workers = vk_manager.ui.get_input(f"Текущее число потоков: {download_workers}\nНовое число (1-16): ").strip()
+            if new_workers.isdigit() and 1 <= int(new_workers) <= 16:
+                download_workers = int(new_workers)
+                vk_manager.ui.print_success(f"Число параллельных загрузок: {download_workers}")
+            else:
+                vk_manager.ui.print_error("Введите число от 1 до 16")
+                
         elif choice == 'o':
             # Открыть папку загрузок
             try:
@@ -330,8 +499,7 @@ def interactive_audio_player(audio_list, title, vk_manager):
             try:
                 track_index = int(choice) - 1
                 if 0 <= track_index < len(audio_list):
-                    track = audio_list[track_index]
-                    current_track = track
+                    track = play_queue.jump(track_index)
                     artist = track.get('artist', 'Unknown Artist')
                     title_track = track.get('title', 'Unknown Title')
                     track_url = track.get('url')
@@ -349,43 +517,14 @@ def interactive_audio_player(audio_list, title, vk_manager):
                         action = vk_manager.ui.get_input("\nВаш выбор: ").strip()
                         
                         if action == '1':
-                            track_name = f"{artist} - {title_track}"
-                            play_audio(track_url, track_name, vk_manager)
+                            play_queue_track(track, vk_manager, play_queue, prefetcher)
                         elif action == '2':
                             vk_manager.ui.print_info(f"Скачиваю: {artist} - {title_track}")
                             
-                            # Создаем временный файл
-                            temp_file = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False)
-                            temp_filename = temp_file.name
-                            temp_file.close()
-                            
-                            # Скачиваем
-                            try:
-                                import requests
-                                headers = vk_manager.headers.copy()
-                                headers.update({
-                                    'Referer': 'https://vk.com/',
-                                    'Origin': 'https://vk.com'
-                                })
-                                
-                                response = requests.get(track_url, stream=True, headers=headers)
-                                if response.status_code == 200:
-                                    with open(temp_filename, 'wb') as f:
-                                        for chunk in response.iter_content(chunk_size=8192):
-                                            if chunk:
-                                                f.write(chunk)
-                                    
-                                    # Сохраняем с правильным именем
-                                    track_name = f"{artist} - {title_track}"
-                                    save_track_with_name(track_name, temp_filename, vk_manager)
-                                else:
-                                    vk_manager.ui.print_error(f"Ошибка HTTP: {response.status_code}")
-                                    
-                            except Exception as e:
-                                vk_manager.ui.print_error(f"Ошибка при скачивании: {e}")
+                            # Скачиваем через кэш аудио и сохраняем с правильным именем
+                            save_track(track, vk_manager, download_dir)
                         elif action == '3':
-                            track_name = f"{artist} - {title_track}"
-                            play_audio(track_url, track_name, vk_manager, auto_download=True)
+                            play_queue_track(track, vk_manager, play_queue, prefetcher, auto_download=True, download_dir=download_dir)
                         elif action == '4':
                             vk_manager.ui.clear_screen()
                             vk_manager.ui.print_header("ИНФОРМАЦИЯ О ТРЕКЕ")
@@ -453,9 +592,9 @@ def show_program_info():
             color = Colors.WHITE
         print(f"   {color}{feature}{Colors.RESET}")
 
-def show_auth_help():
+def show_auth_help(ui=None):
     """Показать инструкцию по получению токена"""
-    ui = ConsoleUI()
+    ui = ui or ConsoleUI()
     ui.clear_screen()
     
     ui.print_header("ИНСТРУКЦИЯ ПО ПОЛУЧЕНИЮ VK ТОКЕНА")
@@ -485,7 +624,7 @@ def show_auth_help():
         webbrowser.open("https://oauth.vk.com/authorize?client_id=2685278&scope=1073737727&redirect_uri=https://oauth.vk.com/blank.html&display=page&response_type=token&revoke=1")
         ui.print_success("Браузер открыт!")
 
-def show_main_menu():
+def show_main_menu(cache_stats=None, active_jobs=0):
     """Показать главное меню"""
     ui = ConsoleUI()
     
@@ -507,6 +646,7 @@ def show_main_menu():
     print(f"\n{Colors.BRIGHT_GREEN}🎵 МУЗЫКА:{Colors.RESET}")
     ui.print_menu_item("4", "🎵 Моя музыкa")
     ui.print_menu_item("5", "👥 Музыка друзей")
+    ui.print_menu_item("g", "👥 Музыка групп")
     ui.print_menu_item("6", "📋 Мои плейлисты")
     ui.print_menu_item("7", "📻 Рекомендации")
     ui.print_menu_item("8", "🔎 Поиск треков")
@@ -515,6 +655,14 @@ def show_main_menu():
     ui.print_menu_item("9", "💡 Информация о API")
     ui.print_menu_item("10", "📝 О программе")
     ui.print_menu_item("11", "🔧 Диагностика плейлистов")
+    ui.print_menu_item("j", f"⏳ Фоновые задачи ({active_jobs} активно)" if active_jobs else "⏳ Фоновые задачи")
     ui.print_menu_item("12", "🚪 Выход")
     
+    if cache_stats:
+        print(f"\n{Colors.BRIGHT_BLACK}📦 Кэш: {cache_stats['entries']} записей, "
+              f"{cache_stats['bytes'] / 1024 / 1024:.1f} МБ, "
+              f"попаданий {cache_stats['hit_rate'] * 100:.0f}% "
+              f"({cache_stats['hits'] + cache_stats['stale_hits']}/{cache_stats['misses']}), "
+              f"вытеснено {cache_stats['evictions']}{Colors.RESET}")
+    
     print(f"\n{Colors.BRIGHT_BLACK}{'─' * 60}{Colors.RESET}")
@@ -1,13 +1,84 @@
 import requests
+import asyncio
 import logging
 import os
+import time
+import random
 import json
 import shutil
 import tempfile
-from config import Colors, KATE_USER_AGENT, VK_API_VERSION, TOKEN_FILE, POPULAR_QUERIES
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+from activity import activity
+from jobs import JobManager, current_job
+from search import SearchCache, SearchResults
+from search_index import SearchIndex
+from config import (
+    Colors,
+    KATE_USER_AGENT,
+    VK_API_VERSION,
+    TOKEN_FILE,
+    POPULAR_QUERIES,
+    AUDIO_PAGE_SIZE,
+    AUDIO_PAGE_WORKERS,
+    GROUPS_PAGE_SIZE,
+    FRIENDS_PAGE_SIZE,
+    SEARCH_PAGE_SIZE,
+    API_RATE_LIMIT,
+    API_RATE_BURST,
+    API_MAX_RETRIES,
+    API_BACKOFF_BASE,
+    API_BACKOFF_MAX,
+    CACHE_TTLS,
+    CACHE_MAX_STALE,
+    CACHE_MAX_AGES,
+    USE_ASYNC_CLIENT,
+    DOWNLOAD_WORKERS,
+    URL_EXPIRED_STATUSES
+)
+from transport import HTTPTransport
+from cache import ResponseCache
+from ratelimit import TokenBucket
+from metrics import APIMetrics
+from batching import VKBatcher
+from downloader import DownloadManager
+from resumable import download_file
+from ledger import DownloadLedger
+from audiocache import AudioCache
+from linkrefresh import LinkRefresher
+from errors import (
+    VKAPIError,
+    VKAuthError,
+    VKTooManyRequestsError,
+    VKFloodControlError,
+    VKInternalServerError,
+    VKRateLimitError,
+    VKAccessDeniedError,
+    VKNetworkError,
+    VKTimeoutError,
+    VKHTTPError,
+    DownloadError,
+    make_api_error,
+    is_retryable
+)
 
 logger = logging.getLogger(__name__)
 
+def clean_filename(filename):
+    """Очистить имя файла от недопустимых символов"""
+    # Заменяем недопустимые символы
+    invalid_chars = '<>:"/\\|?*'
+    for char in invalid_chars:
+        filename = filename.replace(char, '_')
+    # Убираем лишние пробелы
+    filename = ' '.join(filename.split())
+    # Ограничиваем длину
+    if len(filename) > 200:
+        filename = filename[:200]
+    return filename
+
 class VKMusicManager:
     def __init__(self, ui):
         self.token = None
@@ -21,6 +92,47 @@ class VKMusicManager:
             'Accept-Language': 'ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7',
             'Connection': 'keep-alive'
         }
+        
+        # Единый транспорт с пулом соединений для всех запросов
+        self.http = HTTPTransport(self.headers)
+        self.metrics = APIMetrics()
+        # Не больше API_RATE_LIMIT запросов в секунду на токен
+        self.rate_limiter = TokenBucket(API_RATE_LIMIT, API_RATE_BURST)
+        self.max_retries = API_MAX_RETRIES
+        
+        # Кэш ответов и фоновое обновление устаревших записей
+        self.cache = ResponseCache()
+        self._revalidator = ThreadPoolExecutor(max_workers=2)
+        self._revalidating = set()
+        self._revalidating_lock = threading.Lock()
+        # Журнал скачанных треков
+        self.ledger = DownloadLedger()
+        # Кэш прослушанных треков
+        self.audio_cache = AudioCache()
+        # Обновление устаревших ссылок на треки
+        self.links = LinkRefresher(self)
+        # Локальный поисковый индекс всех полученных списков треков
+        self.search_index = SearchIndex()
+        self._indexer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="index")
+        # Имена друзей и названия плейлистов - для подписи источника в индексе
+        self._friend_names = {}
+        self._playlist_titles = {}
+        self._group_names = {}
+        self._playlist_strategies = {}  # (owner_id, playlist_id) -> способ, которым открылся плейлист
+        # Недавние результаты поиска для повторных и уточненных запросов
+        self.searches = SearchCache()
+        # Фоновые задачи: загрузки списков и скачивание
+        self.jobs = JobManager()
+        # Плеер (создается при первом воспроизведении) и текущее потоковое воспроизведение
+        self.player = None
+        self.playback = None
+        
+        # Асинхронный клиент, которому можно делегировать запросы меню
+        self.use_async = USE_ASYNC_CLIENT
+        self._async_loop = None
+        self._async_manager = None
+        # Очередь независимых вызовов, отправляемых пачками через execute
+        self.batcher = VKBatcher(self)
 
     def set_token(self, token):
         """Установить токен"""
@@ -173,177 +285,489 @@ class VKMusicManager:
         
         return True
 
-    def check_token_validity(self):
-        """Проверить валидность токена"""
-        if not self.token:
-            return {"valid": False, "error_msg": "Токен не установлен"}
+    def _request(self, method, **params):
+        """Выполнить запрос к VK API и вернуть ответ целиком
         
-        url = "https://api.vk.com/method/users.get"
-        params = {
+        Запросы проходят через ограничитель частоты, а при временных ошибках
+        (6, 9, 10, 28, HTTP 5xx) повторяются с экспоненциальной паузой.
+        """
+        attempt = 0
+        while True:
+            waited = self.rate_limiter.acquire()
+            if waited > 0:
+                self.metrics.increment("throttled")
+                self.metrics.increment("throttle_wait", waited)
+            
+            try:
+                return self._send_request(method, params)
+            except VKAPIError as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                
+                # Экспоненциальная пауза со случайным разбросом, чтобы
+                # параллельные запросы не повторялись одновременно
+                delay = min(API_BACKOFF_MAX, API_BACKOFF_BASE * 2 ** attempt)
+                delay = delay / 2 + random.uniform(0, delay / 2)
+                attempt += 1
+                self.metrics.increment("retried")
+                logger.info("%s: %s, повтор %d через %.1f с", method, e, attempt, delay)
+                time.sleep(delay)
+
+    def _send_request(self, method, params):
+        """Одна попытка запроса к VK API с записью статистики"""
+        request_params = {
             "access_token": self.token,
-            "v": VK_API_VERSION,
-            "fields": "first_name,last_name,photo_200"
+            "v": VK_API_VERSION
         }
+        request_params.update({key: value for key, value in params.items() if value is not None})
         
+        started = time.monotonic()
+        size = 0
+        status = "ok"
         try:
-            response = requests.get(url, params=params, headers=self.headers)
-            data = response.json()
+            try:
+                response = self.http.api_get(method, request_params)
+                size = len(response.content)
+                if response.status_code >= 500:
+                    raise VKHTTPError(response.status_code, method)
+                data = response.json()
+            except requests.exceptions.Timeout as e:
+                raise VKTimeoutError(f"Таймаут при подключении к VK: {e}", method) from e
+            except requests.exceptions.RequestException as e:
+                raise VKNetworkError(f"Ошибка запроса: {e}", method) from e
+            except ValueError as e:
+                raise VKNetworkError(f"Некорректный ответ сервера: {e}", method) from e
             
-            if "response" in data:
-                self.user_info = data["response"][0]
-                # Обновляем user_id из ответа API
-                self.user_id = self.user_info.get('id')
-                return {"valid": True, "user_info": self.user_info}
-            else:
-                error_msg = data.get("error", {}).get("error_msg", "Неизвестная ошибка")
-                error_code = data.get("error", {}).get("error_code", 0)
-                
-                if error_code == 5:
-                    error_msg = "Токен недействителен (ошибка 5: Invalid token)"
-                elif error_code == 10:
-                    error_msg = "Внутренняя ошибка сервера (ошибка 10)"
-                elif error_code == 28:
-                    error_msg = "Превышено количество запросов (ошибка 28)"
-                
-                return {"valid": False, "error_msg": error_msg}
-                
-        except requests.exceptions.ConnectionError:
-            return {"valid": False, "error_msg": "Нет подключения к интернету"}
-        except requests.exceptions.Timeout:
+            if "error" in data:
+                raise make_api_error(data["error"], method)
+            if "response" not in data:
+                raise VKNetworkError("Ответ сервера не содержит данных", method)
+            
+            return data
+        except VKAPIError as e:
+            status = e.error_code or "network"
+            raise
+        finally:
+            self.metrics.record(method, time.monotonic() - started, size, status)
+
+    def call(self, method, refresh=False, **params):
+        """Вызвать метод VK API и вернуть содержимое поля response
+        
+        Ответы методов из CACHE_TTLS берутся из кэша. Устаревший ответ
+        (в пределах CACHE_MAX_STALE или CACHE_MAX_AGES) отдается сразу
+        и обновляется в фоне; refresh=True игнорирует кэш.
+        """
+        ttl = CACHE_TTLS.get(method)
+        if ttl is None:
+            return self._request(method, **params)["response"]
+        
+        key = self.cache.make_key(method, params, self.user_id)
+        if not refresh:
+            cached = self.cache.get(key)
+            if cached is not None:
+                value, created = cached
+                age = time.time() - created
+                if age < ttl:
+                    self.cache.count("hits")
+                    return value
+                if age < CACHE_MAX_AGES.get(method, ttl + CACHE_MAX_STALE):
+                    self.cache.count("stale_hits")
+                    self._revalidate(key, method, params)
+                    return value
+        
+        self.cache.count("misses")
+        value = self._request(method, **params)["response"]
+        self.cache.set(key, method, value)
+        return value
+
+    def _revalidate(self, key, method, params):
+        """Обновить устаревшую запись кэша в фоне"""
+        with self._revalidating_lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+        
+        def revalidate():
+            task_id = activity.start(f"Обновление кэша: {method}")
+            try:
+                value = self._request(method, **params)["response"]
+                self.cache.set(key, method, value)
+                self.cache.count("revalidations")
+            except VKAPIError as e:
+                logger.info("Не удалось обновить кэш %s: %s", method, e)
+            finally:
+                activity.finish(task_id)
+                with self._revalidating_lock:
+                    self._revalidating.discard(key)
+        
+        self._revalidator.submit(revalidate)
+
+    def execute(self, code):
+        """Выполнить VKScript через метод execute
+        
+        Возвращает пару (response, execute_errors): ошибки отдельных
+        вызовов внутри скрипта VK возвращает отдельным списком.
+        """
+        data = self._request("execute", code=code)
+        return data["response"], data.get("execute_errors", [])
+
+    def run_async(self, name, *args, **kwargs):
+        """Выполнить метод AsyncVKMusicManager и дождаться результата
+        
+        Цикл событий работает в отдельном потоке и живет вместе с менеджером,
+        поэтому соединения aiohttp переиспользуются между вызовами.
+        """
+        if self._async_manager is None:
+            from async_vk_api import AsyncVKMusicManager
+            self._async_manager = AsyncVKMusicManager.from_manager(self)
+            self._async_loop = asyncio.new_event_loop()
+            threading.Thread(target=self._async_loop.run_forever, name="vk-async", daemon=True).start()
+        
+        self._async_manager.token = self.token
+        self._async_manager.user_id = self.user_id
+        coroutine = getattr(self._async_manager, name)(*args, **kwargs)
+        return asyncio.run_coroutine_threadsafe(coroutine, self._async_loop).result()
+
+    def check_token_validity(self):
+        """Проверить валидность токена"""
+        if not self.token:
+            return {"valid": False, "error_msg": "Токен не установлен"}
+        
+        try:
+            response = self.call("users.get", fields="first_name,last_name,photo_200")
+            self.user_info = response[0]
+            # Обновляем user_id из ответа API
+            self.user_id = self.user_info.get('id')
+            return {"valid": True, "user_info": self.user_info}
+        except VKAuthError:
+            return {"valid": False, "error_msg": "Токен недействителен (ошибка 5: Invalid token)"}
+        except VKInternalServerError:
+            return {"valid": False, "error_msg": "Внутренняя ошибка сервера (ошибка 10)"}
+        except VKRateLimitError as e:
+            return {"valid": False, "error_msg": f"Превышено количество запросов (ошибка {e.error_code})"}
+        except VKTimeoutError:
             return {"valid": False, "error_msg": "Таймаут при подключении к VK"}
-        except Exception as e:
-            return {"valid": False, "error_msg": f"Ошибка запроса: {e}"}
+        except VKNetworkError as e:
+            return {"valid": False, "error_msg": e.error_msg}
+        except VKAPIError as e:
+            return {"valid": False, "error_msg": e.error_msg}
 
     def get_friends_list(self):
         """Получить список друзей"""
+        if self.use_async:
+            return self._remember_friends(self.run_async("get_friends_list"))
+        
         if not self.token or not self.user_id:
             return {"success": False, "error": "Токен не установлен или user_id не определен"}
         
-        url = "https://api.vk.com/method/friends.get"
+        try:
+            friends = []
+            while True:
+                response = self.call(
+                    "friends.get",
+                    count=FRIENDS_PAGE_SIZE,
+                    offset=len(friends),
+                    fields="first_name,last_name,photo_100",
+                    order="name"
+                )
+                friends.extend(response["items"])
+                if not response["items"] or len(friends) >= response["count"]:
+                    break
+            return self._remember_friends({"success": True, "friends": friends})
+        except VKAPIError as e:
+            return {"success": False, "error": e.error_msg}
+
+    def submit_cached(self, method, **params):
+        """Как batcher.submit, но с кэшем ответов для методов из CACHE_TTLS
+        
+        Свежий ответ из кэша возвращается готовым Future без запроса,
+        полученный через execute ответ сохраняется в кэш.
+        """
+        ttl = CACHE_TTLS.get(method)
+        if ttl is None:
+            return self.batcher.submit(method, **params)
+        
+        key = self.cache.make_key(method, params, self.user_id)
+        cached = self.cache.get(key)
+        if cached is not None and time.time() - cached[1] < ttl:
+            self.cache.count("hits")
+            future = Future()
+            future.set_result(cached[0])
+            return future
+        
+        self.cache.count("misses")
+        
+        def store(future):
+            if future.exception() is None:
+                self.cache.set(key, method, future.result())
+        
+        future = self.batcher.submit(method, **params)
+        future.add_done_callback(store)
+        return future
+
+    def _remember_friends(self, result):
+        """Запомнить имена друзей для подписей в поисковом индексе"""
+        for friend in result.get("friends", []):
+            self._friend_names[friend.get('id')] = f"{friend.get('first_name', '')} {friend.get('last_name', '')}".strip()
+        return result
+
+    def _remember_playlists(self, result):
+        """Запомнить названия плейлистов для подписей в поисковом индексе"""
+        for playlist in result.get("playlists", []):
+            self._playlist_titles[(playlist.get('owner_id'), playlist.get('id'))] = playlist.get('title')
+        return result
+
+    def _remember_groups(self, result):
+        """Запомнить названия групп для подписей в поисковом индексе"""
+        for group in result.get("groups", []):
+            self._group_names[group.get('id')] = group.get('name')
+        return result
+
+    def _indexed(self, result, source):
+        """Добавить полученный список треков в поисковый индекс (в фоне)"""
+        if result.get("success") and result.get("audio_list"):
+            def report(future):
+                if future.exception():
+                    logger.warning("Не удалось обновить поисковый индекс: %s", future.exception())
+            
+            self._indexer.submit(self.search_index.add, result["audio_list"], source).add_done_callback(report)
+        return result
+
+    def iter_audio_pages(self, owner_id, album_id=None, access_key=None,
+                         page_size=AUDIO_PAGE_SIZE, max_workers=AUDIO_PAGE_WORKERS, first_page=None):
+        """Постранично получать аудиозаписи через audio.get (генератор страниц)
+        
+        Каждая страница - словарь с ключами offset, items и count (всего треков).
+        После первой страницы общее число известно, и остальные запрашиваются
+        параллельно (не более max_workers одновременно), но отдаются по порядку.
+        Уже полученную первую страницу можно передать в first_page.
+        """
         params = {
-            "access_token": self.token,
-            "v": VK_API_VERSION,
-            "count": 100,
-            "fields": "first_name,last_name,photo_100",
-            "order": "name"
+            "owner_id": owner_id,
+            "album_id": album_id,
+            "access_key": access_key,
+            "count": page_size
         }
         
+        if first_page is None:
+            first_page = self.call("audio.get", offset=0, **params)
+        total = first_page.get("count", 0)
+        items = first_page.get("items", [])
+        yield {"offset": 0, "items": items, "count": total}
+        
+        if not items or len(items) >= total:
+            return
+        
+        if max_workers <= 1:
+            offset = len(items)
+            while offset < total:
+                page = self.call("audio.get", offset=offset, **params)
+                items = page.get("items", [])
+                if not items:
+                    return
+                yield {"offset": offset, "items": items, "count": total}
+                offset += len(items)
+            return
+        
+        offsets = iter(range(len(items), total, page_size))
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        pending = deque()
         try:
-            response = requests.get(url, params=params, headers=self.headers)
-            data = response.json()
+            for offset in islice(offsets, max_workers):
+                pending.append((offset, executor.submit(self.call, "audio.get", offset=offset, **params)))
             
-            if "response" in data:
-                return {"success": True, "friends": data["response"]["items"]}
-            else:
-                error_msg = data.get("error", {}).get("error_msg", "Неизвестная ошибка")
-                return {"success": False, "error": error_msg}
+            while pending:
+                offset, future = pending.popleft()
+                page = future.result()
                 
-        except Exception as e:
-            return {"success": False, "error": f"Ошибка запроса: {e}"}
+                # Ставим следующую страницу в очередь до того, как отдать текущую
+                next_offset = next(offsets, None)
+                if next_offset is not None:
+                    pending.append((next_offset, executor.submit(self.call, "audio.get", offset=next_offset, **params)))
+                
+                items = page.get("items", [])
+                if items:
+                    yield {"offset": offset, "items": items, "count": total}
+        finally:
+            # Генератор могли закрыть досрочно - не тратим запросы на ненужные страницы
+            for _, future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def iter_audio(self, owner_id, album_id=None, access_key=None,
+                   page_size=AUDIO_PAGE_SIZE, max_workers=AUDIO_PAGE_WORKERS, first_page=None):
+        """Получать аудиозаписи владельца по одной по мере загрузки страниц
+
+        Внутри фоновой задачи сообщает ей прогресс и прерывается при отмене.
+        """
+        job = current_job()
+        received = 0
+        for page in self.iter_audio_pages(owner_id, album_id, access_key, page_size, max_workers, first_page):
+            received += len(page["items"])
+            if job:
+                job.update(done=received, total=page["count"])
+                job.check()
+            yield from page["items"]
 
     def get_friend_audio_list(self, friend_id):
         """Получить список аудиозаписей друга"""
+        source = f"Друг: {self._friend_names.get(friend_id, friend_id)}"
+        if self.use_async:
+            return self._indexed(self.run_async("get_friend_audio_list", friend_id), source)
+        
         if not self.token:
             return {"success": False, "error": "Токен не установлен"}
         
-        url = "https://api.vk.com/method/audio.get"
-        params = {
-            "access_token": self.token,
-            "v": VK_API_VERSION,
-            "count": 100,
-            "owner_id": friend_id
-        }
+        try:
+            return self._indexed({"success": True, "audio_list": list(self.iter_audio(friend_id))}, source)
+        except VKAPIError as e:
+            return {"success": False, "error": e.error_msg, "closed": isinstance(e, VKAccessDeniedError)}
+
+    def get_friends_audio_lists(self, friend_ids, page_size=AUDIO_PAGE_SIZE):
+        """Получить аудиозаписи нескольких друзей
+        
+        Возвращает словарь friend_id -> результат как у get_friend_audio_list.
+        """
+        return self._get_audio_lists(
+            {friend_id: f"Друг: {self._friend_names.get(friend_id, friend_id)}" for friend_id in friend_ids},
+            page_size
+        )
+
+    def _get_audio_lists(self, sources, page_size=AUDIO_PAGE_SIZE):
+        """Получить библиотеки нескольких владельцев (owner_id -> источник для индекса)
+        
+        Первые страницы всех библиотек запрашиваются пачками через execute
+        (или берутся из кэша), остальные страницы догружаются только для
+        больших библиотек. Возвращает словарь owner_id -> результат.
+        """
+        if not self.token:
+            return {owner_id: {"success": False, "error": "Токен не установлен"} for owner_id in sources}
+        
+        futures = [
+            (owner_id, self.submit_cached("audio.get", owner_id=owner_id, offset=0, count=page_size))
+            for owner_id in sources
+        ]
+        self.batcher.flush()
+        
+        results = {}
+        for owner_id, future in futures:
+            try:
+                audio_list = []
+                for page in self.iter_audio_pages(owner_id, page_size=page_size, first_page=future.result()):
+                    audio_list.extend(page["items"])
+                results[owner_id] = self._indexed({"success": True, "audio_list": audio_list}, sources[owner_id])
+            except VKAPIError as e:
+                results[owner_id] = {"success": False, "error": e.error_msg,
+                                     "closed": isinstance(e, VKAccessDeniedError)}
+        
+        return results
+
+    def get_groups_list(self):
+        """Получить список групп пользователя (все страницы groups.get)"""
+        if not self.token or not self.user_id:
+            return {"success": False, "error": "Токен не установлен или user_id не определен"}
         
         try:
-            response = requests.get(url, params=params, headers=self.headers)
-            data = response.json()
-            
-            if "response" in data:
-                return {"success": True, "audio_list": data["response"]["items"]}
-            else:
-                error_msg = data.get("error", {}).get("error_msg", "Неизвестная ошибка")
-                return {"success": False, "error": error_msg}
-                
-        except Exception as e:
-            return {"success": False, "error": f"Ошибка запроса: {e}"}
+            groups = []
+            while True:
+                response = self.call(
+                    "groups.get",
+                    user_id=self.user_id,
+                    extended=1,
+                    count=GROUPS_PAGE_SIZE,
+                    offset=len(groups)
+                )
+                groups.extend(response["items"])
+                if not response["items"] or len(groups) >= response["count"]:
+                    break
+            return self._remember_groups({"success": True, "groups": groups})
+        except VKAPIError as e:
+            return {"success": False, "error": e.error_msg}
+
+    def get_group_audio_list(self, group_id):
+        """Получить список аудиозаписей группы"""
+        if not self.token:
+            return {"success": False, "error": "Токен не установлен"}
+        
+        group_id = abs(group_id)
+        try:
+            return self._indexed(
+                {"success": True, "audio_list": list(self.iter_audio(-group_id))},
+                f"Группа: {self._group_names.get(group_id, group_id)}"
+            )
+        except VKAPIError as e:
+            return {"success": False, "error": e.error_msg, "closed": isinstance(e, VKAccessDeniedError)}
+
+    def get_groups_audio_lists(self, group_ids, page_size=AUDIO_PAGE_SIZE):
+        """Получить аудиозаписи нескольких групп
+        
+        Возвращает словарь group_id -> результат как у get_group_audio_list.
+        """
+        results = self._get_audio_lists(
+            {-abs(group_id): f"Группа: {self._group_names.get(abs(group_id), abs(group_id))}" for group_id in group_ids},
+            page_size
+        )
+        return {-owner_id: result for owner_id, result in results.items()}
 
     def get_my_audio_list(self):
         """Получить список моих аудиозаписей"""
         if not self.token or not self.user_id:
             return {"success": False, "error": "Токен не установлен или user_id не определен"}
         
-        url = "https://api.vk.com/method/audio.get"
-        params = {
-            "access_token": self.token,
-            "v": VK_API_VERSION,
-            "count": 100,
-            "owner_id": self.user_id
-        }
-        
         try:
-            response = requests.get(url, params=params, headers=self.headers)
-            data = response.json()
-            
-            if "response" in data:
-                return {"success": True, "audio_list": data["response"]["items"]}
-            else:
-                error_msg = data.get("error", {}).get("error_msg", "Неизвестная ошибка")
-                return {"success": False, "error": error_msg}
-                
-        except Exception as e:
-            return {"success": False, "error": f"Ошибка запроса: {e}"}
+            return self._indexed({"success": True, "audio_list": list(self.iter_audio(self.user_id))}, "Моя музыка")
+        except VKAPIError as e:
+            return {"success": False, "error": e.error_msg}
 
-    def get_playlists(self):
+    def get_playlists(self, refresh=False):
         """Получить список плейлистов"""
         if not self.token or not self.user_id:
             return {"success": False, "error": "Токен не установлен или user_id не определен"}
         
-        url = "https://api.vk.com/method/audio.getPlaylists"
-        params = {
-            "access_token": self.token,
-            "v": VK_API_VERSION,
-            "owner_id": self.user_id,
-            "count": 50,
-            "extended": 1
-        }
-        
         try:
-            response = requests.get(url, params=params, headers=self.headers)
-            data = response.json()
+            response = self.call("audio.getPlaylists", refresh=refresh, owner_id=self.user_id, count=50, extended=1)
+        except VKNetworkError as e:
+            self.ui.print_error(f"Ошибка при получении плейлистов: {e.error_msg}")
+            return {"success": False, "error": e.error_msg}
+        except VKAPIError as e:
+            self.ui.print_warning(f"Не удалось получить плейлисты: {e.error_msg}")
             
-            if "response" in data:
-                items = data["response"]["items"]
-                
-                # Форматируем данные плейлистов
-                playlists = []
-                for item in items:
-                    playlist = {
-                        'id': item.get('id'),
-                        'owner_id': item.get('owner_id'),
-                        'title': item.get('title', 'Без названия'),
-                        'description': item.get('description', ''),
-                        'count': item.get('count', 0),
-                        'followers': item.get('followers', 0),
-                        'plays': item.get('plays', 0),
-                        'photo': item.get('photo', {}),
-                        'access_key': item.get('access_key', '')
-                    }
-                    playlists.append(playlist)
-                
-                return {"success": True, "playlists": playlists}
-            else:
-                error_msg = data.get("error", {}).get("error_msg", "Неизвестная ошибка")
-                self.ui.print_warning(f"Не удалось получить плейлисты: {error_msg}")
-                
-                # Возвращаем пустой список, если плейлистов нет
-                return {"success": True, "playlists": []}
-                
-        except Exception as e:
-            self.ui.print_error(f"Ошибка при получении плейлистов: {e}")
-            return {"success": False, "error": f"Ошибка запроса: {e}"}
+            # Возвращаем пустой список, если плейлистов нет
+            return {"success": True, "playlists": []}
+        
+        # Форматируем данные плейлистов
+        playlists = []
+        for item in response["items"]:
+            playlist = {
+                'id': item.get('id'),
+                'owner_id': item.get('owner_id'),
+                'title': item.get('title', 'Без названия'),
+                'description': item.get('description', ''),
+                'count': item.get('count', 0),
+                'followers': item.get('followers', 0),
+                'plays': item.get('plays', 0),
+                'photo': item.get('photo', {}),
+                'access_key': item.get('access_key', '')
+            }
+            playlists.append(playlist)
+        
+        return self._remember_playlists({"success": True, "playlists": playlists})
 
     def get_playlist_tracks(self, playlist_id, owner_id=None, access_key=None):
-        """Получить треки из плейлиста - ИСПРАВЛЕННЫЙ МЕТОД"""
+        """Получить треки из плейлиста и добавить их в поисковый индекс"""
+        if owner_id is None:
+            owner_id = self.user_id
+        title = self._playlist_titles.get((owner_id, playlist_id)) or f"{owner_id}_{playlist_id}"
+        return self._indexed(self._fetch_playlist_tracks(playlist_id, owner_id, access_key), f"Плейлист: {title}")
+
+    def _fetch_playlist_tracks(self, playlist_id, owner_id=None, access_key=None):
+        """Получить треки из плейлиста
+        
+        Плейлист можно открыть по album_id, по album_id с access_key
+        (плейлисты, на которые пользователь подписан) или отбором из всех
+        треков владельца. Сработавший способ запоминается для плейлиста,
+        и при следующих открытиях плейлист сразу загружается постранично им.
+        """
         if not self.token:
             return {"success": False, "error": "Токен не установлен"}
         
@@ -351,93 +775,100 @@ class VKMusicManager:
         if owner_id is None:
             owner_id = self.user_id
         
-        url = "https://api.vk.com/method/audio.get"
-        params = {
-            "access_token": self.token,
-            "v": VK_API_VERSION,
-            "count": 100,
-            "owner_id": owner_id
-        }
-        
-        # Пробуем два разных подхода для получения треков из плейлиста
+        key = (owner_id, playlist_id)
+        if self.use_async:
+            result = self.run_async("get_playlist_tracks", playlist_id, owner_id, access_key,
+                                    strategy=self._playlist_strategies.get(key))
+            strategy = result.pop("strategy", None)
+            if strategy:
+                self._playlist_strategies[key] = strategy
+            elif result.get("success"):
+                self._playlist_strategies.pop(key, None)
+            return result
         
         try:
-            # ПОДХОД 1: Используем альбом ID (работает для некоторых аккаунтов)
-            params_with_album = params.copy()
-            params_with_album["album_id"] = playlist_id
+            strategy = self._playlist_strategies.get(key)
+            if strategy in ("album", "access_key"):
+                tracks = list(self.iter_audio(owner_id, **self._playlist_params(strategy, playlist_id, access_key)))
+                if tracks:
+                    return {"success": True, "audio_list": tracks}
+                # Способ перестал работать - выбираем заново
+                del self._playlist_strategies[key]
             
-            response1 = requests.get(url, params=params_with_album, headers=self.headers)
-            data1 = response1.json()
-            
-            if "response" in data1 and data1["response"]["items"]:
-                return {"success": True, "audio_list": data1["response"]["items"]}
-            
-            # ПОДХОД 2: Используем access_key если есть
-            if access_key:
-                params_with_access = params.copy()
-                params_with_access["album_id"] = playlist_id
-                params_with_access["access_key"] = access_key
-                
-                response2 = requests.get(url, params=params_with_access, headers=self.headers)
-                data2 = response2.json()
-                
-                if "response" in data2 and data2["response"]["items"]:
-                    return {"success": True, "audio_list": data2["response"]["items"]}
+            if strategy != "filter":
+                strategy, first_page = self._probe_playlist(playlist_id, owner_id, access_key)
+                if strategy is not None:
+                    self._playlist_strategies[key] = strategy
+                    tracks = list(self.iter_audio(
+                        owner_id, first_page=first_page, **self._playlist_params(strategy, playlist_id, access_key)
+                    ))
+                    return {"success": True, "audio_list": tracks}
+                self.ui.print_warning("Прямой доступ к плейлисту недоступен. Использую обходной путь...")
             
-            # ПОДХОД 3: Пробуем получить все треки и фильтровать (запасной вариант)
-            self.ui.print_warning("Прямой доступ к плейлисту недоступен. Использую обходной путь...")
-            
-            # Получаем все треки пользователя
-            all_tracks_response = requests.get(url, params=params, headers=self.headers)
-            all_tracks_data = all_tracks_response.json()
-            
-            if "response" in all_tracks_data:
-                all_tracks = all_tracks_data["response"]["items"]
-                
-                # Фильтруем треки, которые относятся к нужному плейлисту
-                # В VK API треки могут иметь поле album_id
-                playlist_tracks = []
-                for track in all_tracks:
-                    if str(track.get('album_id', '')) == str(playlist_id):
-                        playlist_tracks.append(track)
-                
-                if playlist_tracks:
-                    return {"success": True, "audio_list": playlist_tracks}
+            # Запасной вариант: все треки владельца с нужным album_id
+            playlist_tracks = [
+                track for track in self.iter_audio(owner_id)
+                if str(track.get('album_id', '')) == str(playlist_id)
+            ]
+            if playlist_tracks:
+                self._playlist_strategies[key] = "filter"
+                return {"success": True, "audio_list": playlist_tracks}
             
-            # Если ничего не помогло, возвращаем пустой список
+            self._playlist_strategies.pop(key, None)
             self.ui.print_info("Плейлист пуст или доступ ограничен")
             return {"success": True, "audio_list": []}
             
-        except Exception as e:
-            self.ui.print_error(f"Ошибка при получении треков из плейлиста: {e}")
-            return {"success": False, "error": f"Ошибка запроса: {e}"}
+        except VKAPIError as e:
+            self.ui.print_error(f"Ошибка при получении треков из плейлиста: {e.error_msg}")
+            return {"success": False, "error": e.error_msg}
+
+    @staticmethod
+    def _playlist_params(strategy, playlist_id, access_key):
+        """Параметры audio.get для способа открытия плейлиста"""
+        if strategy == "access_key":
+            return {"album_id": playlist_id, "access_key": access_key}
+        return {"album_id": playlist_id}
+
+    def _probe_playlist(self, playlist_id, owner_id, access_key):
+        """Выбрать способ открытия плейлиста по первой странице
+        
+        Первые страницы всех способов запрашиваются одновременно (одним
+        execute). Возвращает (способ, первая страница) для первого способа
+        с треками или (None, None).
+        """
+        strategies = ["album", "access_key"] if access_key else ["album"]
+        futures = [
+            (strategy, self.submit_cached("audio.get", owner_id=owner_id, offset=0, count=AUDIO_PAGE_SIZE,
+                                          **self._playlist_params(strategy, playlist_id, access_key)))
+            for strategy in strategies
+        ]
+        self.batcher.flush()
+        
+        for strategy, future in futures:
+            # Ошибка API означает, что способ не сработал; сетевые ошибки пробрасываем
+            try:
+                page = future.result()
+            except VKNetworkError:
+                raise
+            except VKAPIError:
+                continue
+            if page.get("items"):
+                return strategy, page
+        return None, None
 
     def get_recommendations(self):
         """Получить рекомендации через метод audio.getRecommendations"""
         if not self.token:
             return {"success": False, "error": "Токен не установлен"}
         
-        url = "https://api.vk.com/method/audio.getRecommendations"
-        params = {
-            "access_token": self.token,
-            "v": VK_API_VERSION,
-            "count": 200,
-            "shuffle": 1
-        }
-        
         try:
-            response = requests.get(url, params=params, headers=self.headers)
-            data = response.json()
-            
-            if "response" in data:
-                return {"success": True, "audio_list": data["response"]["items"]}
-            else:
-                error_msg = data.get("error", {}).get("error_msg", "Неизвестная ошибка")
-                self.ui.print_warning(f"Метод getRecommendations не доступен: {error_msg}")
-                return self.get_popular_music()
-                
-        except Exception as e:
-            self.ui.print_warning(f"Ошибка в getRecommendations: {e}")
+            response = self.call("audio.getRecommendations", count=200, shuffle=1)
+            return self._indexed({"success": True, "audio_list": response["items"]}, "Рекомендации")
+        except VKNetworkError as e:
+            self.ui.print_warning(f"Ошибка в getRecommendations: {e.error_msg}")
+            return self.get_popular_music()
+        except VKAPIError as e:
+            self.ui.print_warning(f"Метод getRecommendations не доступен: {e.error_msg}")
             return self.get_popular_music()
 
     def get_popular_music(self):
@@ -445,59 +876,88 @@ class VKMusicManager:
         import random
         query = random.choice(POPULAR_QUERIES)
         
-        url = "https://api.vk.com/method/audio.search"
-        params = {
-            "access_token": self.token,
-            "v": VK_API_VERSION,
-            "q": query,
-            "count": 100,
-            "auto_complete": 1,
-            "sort": 2
-        }
-        
         try:
-            response = requests.get(url, params=params, headers=self.headers)
-            data = response.json()
-            
-            if "response" in data:
-                return {"success": True, "audio_list": data["response"]["items"]}
-            else:
-                error_msg = data.get("error", {}).get("error_msg", "Неизвестная ошибка")
-                return {"success": False, "error": error_msg}
-                
-        except Exception as e:
-            return {"success": False, "error": f"Ошибка запроса: {e}"}
+            response = self.call("audio.search", q=query, count=100, auto_complete=1, sort=2)
+            return {"success": True, "audio_list": response["items"]}
+        except VKAPIError as e:
+            return {"success": False, "error": e.error_msg}
 
     def search_audio(self, query):
-        """Поиск музыки"""
+        """Поиск музыки
+
+        Загружается первая страница; остальные подгружает плеер через
+        results["search"].load_more() по мере прокрутки.
+        """
         if not self.token:
             return {"success": False, "error": "Токен не установлен"}
         
-        url = "https://api.vk.com/method/audio.search"
-        params = {
-            "access_token": self.token,
-            "v": VK_API_VERSION,
-            "q": query,
-            "count": 100,
-            "auto_complete": 1
+        # Повторный или уточненный запрос отдается из уже загруженного
+        search = self.searches.get(self, query)
+        try:
+            if not search.items and search.has_more:
+                search.load_more()
+        except VKAPIError as e:
+            self.searches.discard(query)
+            return {"success": False, "error": e.error_msg}
+        return {
+            "success": True,
+            "results": search.items,
+            "total_count": search.total_count,
+            "search": search
         }
+
+    def search_page(self, query, offset, count):
+        """Одна страница audio.search (через асинхронный клиент, если он включен)"""
+        params = {"q": query, "auto_complete": 1, "offset": offset, "count": count}
+        if self.use_async:
+            return self.run_async("call", "audio.search", **params)
+        return self.call("audio.search", **params)
+
+    def iter_search(self, query, limit=SEARCH_PAGE_SIZE):
+        """Результаты поиска по одному, без дублей, не больше limit"""
+        search = SearchResults(self, query, max_results=limit)
+        while search.has_more:
+            yield from search.load_more()
+
+    def fetch_audio(self, audio_url, filename, progress=None):
+        """Скачать аудио по ссылке в файл без вопросов пользователю
         
+        Загрузка идет через <filename>.part и после обрыва продолжается
+        с места остановки (см. resumable.download_file).
+        progress(downloaded, total_size) вызывается после каждого блока.
+        Возвращает число байт в файле, при ошибке бросает DownloadError.
+        """
+        return download_file(self.http, audio_url, filename, progress)
+
+    def fetch_track(self, track, filename, progress=None, neighbours=()):
+        """Скачать трек в файл, обновляя устаревшую ссылку
+        
+        Истекающая ссылка обновляется до загрузки (вместе с истекающими
+        ссылками neighbours), а после ответа 403/410 - обновляется и
+        загрузка повторяется. Возвращает число байт, при ошибке бросает
+        DownloadError.
+        """
+        self.links.ensure_fresh(track, neighbours)
+        track_url = track.get('url')
         try:
-            response = requests.get(url, params=params, headers=self.headers)
-            data = response.json()
-            
-            if "response" in data:
-                return {
-                    "success": True, 
-                    "results": data["response"]["items"],
-                    "total_count": data["response"]["count"]
-                }
-            else:
-                error_msg = data.get("error", {}).get("error_msg", "Неизвестная ошибка")
-                return {"success": False, "error": error_msg}
-                
-        except Exception as e:
-            return {"success": False, "error": f"Ошибка запроса: {e}"}
+            return self.fetch_audio(track_url, filename, progress)
+        except DownloadError as e:
+            if e.status_code not in URL_EXPIRED_STATUSES:
+                raise
+            self.links.refresh([track] + list(neighbours)[:self.links.batch_size - 1])
+            if track.get('url') == track_url:
+                raise
+            return self.fetch_audio(track['url'], filename, progress)
+
+    def print_download_progress(self, downloaded, total_size):
+        """Показать прогресс-бар загрузки"""
+        if total_size:
+            self.ui.print_progress_bar(
+                downloaded, 
+                total_size, 
+                prefix='Загрузка:', 
+                suffix=f'{downloaded/1024/1024:.1f}MB/{total_size/1024/1024:.1f}MB'
+            )
 
     def download_audio(self, audio_url, filename):
         """Скачать аудиозапись в указанный файл"""
@@ -505,81 +965,43 @@ class VKMusicManager:
             # Создаем директорию, если её нет
             os.makedirs(os.path.dirname(filename), exist_ok=True)
             
-            headers = self.headers.copy()
-            headers.update({
-                'Referer': 'https://vk.com/',
-                'Origin': 'https://vk.com'
-            })
-            
-            response = requests.get(audio_url, stream=True, headers=headers)
-            if response.status_code == 200:
-                total_size = int(response.headers.get('content-length', 0))
-                downloaded = 0
-                
-                with open(filename, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                            downloaded += len(chunk)
-                            if total_size:
-                                self.ui.print_progress_bar(
-                                    downloaded, 
-                                    total_size, 
-                                    prefix='Загрузка:', 
-                                    suffix=f'{downloaded/1024/1024:.1f}MB/{total_size/1024/1024:.1f}MB'
-                                )
-                
-                return True
-            else:
-                self.ui.print_error(f"Ошибка HTTP: {response.status_code}")
-                return False
+            self.fetch_audio(audio_url, filename, self.print_download_progress)
+            return True
+        except DownloadError as e:
+            self.ui.print_error(e.reason)
+            return False
         except Exception as e:
             self.ui.print_error(f"Ошибка при скачивании: {e}")
             return False
 
-    def get_playlists_with_access(self):
+    def get_playlists_with_access(self, refresh=False):
         """Получить плейлисты с дополнительной информацией"""
         if not self.token or not self.user_id:
             return {"success": False, "error": "Токен не установлен или user_id не определен"}
         
-        url = "https://api.vk.com/method/audio.getPlaylists"
-        params = {
-            "access_token": self.token,
-            "v": VK_API_VERSION,
-            "owner_id": self.user_id,
-            "count": 100,
-            "extended": 1
-        }
-        
         try:
-            response = requests.get(url, params=params, headers=self.headers)
-            data = response.json()
-            
-            if "response" in data:
-                playlists = data["response"]["items"]
-                
-                # Создаем кэш для быстрого поиска
-                playlist_info = []
-                for playlist in playlists:
-                    info = {
-                        'id': playlist.get('id'),
-                        'owner_id': playlist.get('owner_id'),
-                        'title': playlist.get('title', f'Плейлист #{playlist.get("id")}'),
-                        'description': playlist.get('description', ''),
-                        'count': playlist.get('count', 0),
-                        'followers': playlist.get('followers', 0),
-                        'access_key': playlist.get('access_key', ''),
-                        'url': f"https://vk.com/music/playlist/{playlist.get('owner_id')}_{playlist.get('id')}"
-                    }
-                    playlist_info.append(info)
-                
-                return {"success": True, "playlists": playlist_info, "raw_data": playlists}
-            else:
-                error_msg = data.get("error", {}).get("error_msg", "Неизвестная ошибка")
-                return {"success": False, "error": error_msg}
-                
-        except Exception as e:
-            return {"success": False, "error": f"Ошибка запроса: {e}"}
+            response = self.call("audio.getPlaylists", refresh=refresh, owner_id=self.user_id, count=100, extended=1)
+        except VKAPIError as e:
+            return {"success": False, "error": e.error_msg}
+        
+        playlists = response["items"]
+        
+        # Создаем кэш для быстрого поиска
+        playlist_info = []
+        for playlist in playlists:
+            info = {
+                'id': playlist.get('id'),
+                'owner_id': playlist.get('owner_id'),
+                'title': playlist.get('title', f'Плейлист #{playlist.get("id")}'),
+                'description': playlist.get('description', ''),
+                'count': playlist.get('count', 0),
+                'followers': playlist.get('followers', 0),
+                'access_key': playlist.get('access_key', ''),
+                'url': f"https://vk.com/music/playlist/{playlist.get('owner_id')}_{playlist.get('id')}"
+            }
+            playlist_info.append(info)
+        
+        return self._remember_playlists({"success": True, "playlists": playlist_info, "raw_data": playlists})
 
     def download_track_with_name(self, track, download_dir="downloads"):
         """Скачать трек с правильным именем файла"""
@@ -597,18 +1019,11 @@ class VKMusicManager:
                 self.ui.print_error("У трека нет ссылки для скачивания")
                 return False
             
-            # Очищаем имя файла от недопустимых символов
-            def clean_filename(filename):
-                # Заменяем недопустимые символы
-                invalid_chars = '<>:"/\\|?*'
-                for char in invalid_chars:
-                    filename = filename.replace(char, '_')
-                # Убираем лишние пробелы
-                filename = ' '.join(filename.split())
-                # Ограничиваем длину
-                if len(filename) > 200:
-                    filename = filename[:200]
-                return filename
+            # Проверяем по журналу, не скачан ли уже этот трек
+            entry = self.ledger.get(track)
+            if entry:
+                self.ui.print_info(f"Трек уже скачан: {entry['path']}")
+                return True
             
             # Создаем имя файла в формате "Исполнитель - Название.mp3"
             filename = f"{artist} - {title}"
@@ -618,63 +1033,38 @@ class VKMusicManager:
             # Создаем директорию, если её нет
             os.makedirs(download_dir, exist_ok=True)
             
-            # Проверяем, не скачан ли уже файл
-            if os.path.exists(filepath):
-                self.ui.print_warning(f"Файл уже существует: {filepath}")
-                overwrite = self.ui.get_input("Перезаписать? (y/n): ").strip().lower()
-                if overwrite != 'y':
-                    # Генерируем уникальное имя
-                    counter = 1
-                    name, ext = os.path.splitext(filepath)
-                    while os.path.exists(filepath):
-                        filepath = f"{name}_{counter}{ext}"
-                        counter += 1
-            
-            headers = self.headers.copy()
-            headers.update({
-                'Referer': 'https://vk.com/',
-                'Origin': 'https://vk.com'
-            })
+            # Файл с таким именем принадлежит другому треку - генерируем уникальное имя
+            counter = 1
+            name, ext = os.path.splitext(filepath)
+            while os.path.exists(filepath):
+                filepath = f"{name}_{counter}{ext}"
+                counter += 1
             
             self.ui.print_downloading(f"Скачивание: {artist} - {title}")
             
-            response = requests.get(track_url, stream=True, headers=headers)
-            if response.status_code == 200:
-                total_size = int(response.headers.get('content-length', 0))
-                downloaded = 0
-                
-                with open(filepath, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                            downloaded += len(chunk)
-                            if total_size:
-                                self.ui.print_progress_bar(
-                                    downloaded, 
-                                    total_size, 
-                                    prefix='Загрузка:', 
-                                    suffix=f'{downloaded/1024/1024:.1f}MB/{total_size/1024/1024:.1f}MB'
-                                )
-                
-                self.ui.print_success(f"Аудио успешно скачано: {os.path.basename(filepath)}")
-                self.ui.print_info(f"Путь: {filepath}")
-                
-                # Добавляем метаданные ID3 теги если возможно
-                try:
-                    self.add_id3_tags(filepath, track)
-                except:
-                    pass  # Пропускаем если не удалось добавить теги
-                
-                return True
-            else:
-                self.ui.print_error(f"Ошибка HTTP: {response.status_code}")
+            try:
+                self.fetch_track(track, filepath, self.print_download_progress)
+            except DownloadError as e:
+                self.ui.print_error(e.reason)
                 return False
+            
+            self.ui.print_success(f"Аудио успешно скачано: {os.path.basename(filepath)}")
+            self.ui.print_info(f"Путь: {filepath}")
+            
+            # Добавляем метаданные ID3 теги если возможно
+            try:
+                self.add_id3_tags(filepath, track)
+            except:
+                pass  # Пропускаем если не удалось добавить теги
+            
+            self.ledger.record(track, filepath)
+            return True
                 
         except Exception as e:
             self.ui.print_error(f"Ошибка при скачивании: {e}")
             return False
 
-    def add_id3_tags(self, filepath, track_info):
+    def add_id3_tags(self, filepath, track_info, quiet=False):
         """Добавить ID3 теги к аудиофайлу"""
         try:
             # Пробуем импортировать mutagen
@@ -708,45 +1098,50 @@ class VKMusicManager:
             
             # Сохраняем теги
             audio.save(filepath)
-            self.ui.print_info("✅ ID3 теги добавлены")
+            if not quiet:
+                self.ui.print_info("✅ ID3 теги добавлены")
             
         except ImportError:
             # mutagen не установлен
-            self.ui.print_info("⚠️  Для добавления ID3 тегов установите библиотеку mutagen")
-            self.ui.print_info("   pip install mutagen")
+            if not quiet:
+                self.ui.print_info("⚠️  Для добавления ID3 тегов установите библиотеку mutagen")
+                self.ui.print_info("   pip install mutagen")
         except Exception as e:
             # Любая другая ошибка
-            self.ui.print_info(f"⚠️  Не удалось добавить ID3 теги: {e}")
+            if not quiet:
+                self.ui.print_info(f"⚠️  Не удалось добавить ID3 теги: {e}")
 
-    def download_multiple_tracks(self, tracks, download_dir="downloads"):
-        """Скачать несколько треков"""
+    def download_multiple_tracks(self, tracks, download_dir="downloads", workers=DOWNLOAD_WORKERS):
+        """Скачать несколько треков параллельно"""
         if not tracks:
             self.ui.print_error("Нет треков для скачивания")
             return {"success": False, "downloaded": 0, "failed": 0}
         
-        total = len(tracks)
-        downloaded = 0
-        failed = 0
+        self.ui.print_info(f"Начинаю скачивание {len(tracks)} треков в {workers} потоков...")
         
-        self.ui.print_info(f"Начинаю скачивание {total} треков...")
-        
-        for i, track in enumerate(tracks, 1):
-            artist = track.get('artist', 'Unknown Artist')
-            title = track.get('title', 'Unknown Title')
-            
-            self.ui.print_info(f"[{i}/{total}] Скачиваю: {artist} - {title}")
-            
-            if self.download_track_with_name(track, download_dir):
-                downloaded += 1
-            else:
-                failed += 1
-        
-        return {
-            "success": True,
-            "downloaded": downloaded,
-            "failed": failed,
-            "total": total
-        }
+        downloader = DownloadManager(self, workers=workers)
+        summary = downloader.download_all(tracks, download_dir, on_result=downloader.print_result)
+        downloader.print_summary(summary)
+        return summary
+
+    def start_download(self, tracks, download_dir="downloads", workers=DOWNLOAD_WORKERS, title="Скачивание"):
+        """Скачать треки фоновой задачей и сразу вернуть ее"""
+        def download(job):
+            downloader = DownloadManager(self, workers=workers)
+            job.on_cancel(downloader.cancel)
+            job.update(total=len(tracks))
+            lock = threading.Lock()
+
+            def on_result(result, done, total):
+                with lock:
+                    job.update(done=done, bytes_done=job.bytes + result["bytes"])
+
+            summary = downloader.download_all(tracks, download_dir, on_result=on_result)
+            job.detail = (f"скачано {summary['downloaded']}, уже были {summary['existing']}, "
+                          f"ошибок {summary['failed']}")
+            return summary
+
+        return self.jobs.submit(f"{title}: {len(tracks)} треков", download)
 
     def get_formatted_track_info(self, track):
         """Получить отформатированную информацию о треке"""
@@ -778,16 +1173,6 @@ class VKMusicManager:
         track_info = self.get_formatted_track_info(track)
         filename = f"{track_info['artist']} - {track_info['title']}.mp3"
         
-        # Очистка имени файла
-        def clean_filename(name):
-            invalid_chars = '<>:"/\\|?*'
-            for char in invalid_chars:
-                name = name.replace(char, '_')
-            name = ' '.join(name.split())
-            if len(name) > 200:
-                name = name[:200]
-            return name
-        
         filename = clean_filename(filename)
         filepath = os.path.join(download_dir, filename)
         
@@ -815,50 +1200,13 @@ class VKMusicManager:
         else:
             test_results.append({"test": "Токен", "success": False, "error": validity.get('error_msg')})
         
-        # Тест 2: Проверка метода getPlaylists
-        url = "https://api.vk.com/method/audio.getPlaylists"
-        params = {
-            "access_token": self.token,
-            "v": VK_API_VERSION,
-            "owner_id": self.user_id,
-            "count": 1
-        }
-        
-        try:
-            response = requests.get(url, params=params, headers=self.headers)
-            data = response.json()
-            
-            if "response" in data:
-                count = data["response"]["count"]
-                test_results.append({"test": "audio.getPlaylists", "success": True, "count": count})
-            else:
-                error_msg = data.get("error", {}).get("error_msg", "Неизвестная ошибка")
-                error_code = data.get("error", {}).get("error_code", 0)
-                test_results.append({"test": "audio.getPlaylists", "success": False, "error": error_msg, "code": error_code})
-        except Exception as e:
-            test_results.append({"test": "audio.getPlaylists", "success": False, "error": str(e)})
-        
-        # Тест 3: Проверка метода audio.get
-        url2 = "https://api.vk.com/method/audio.get"
-        params2 = {
-            "access_token": self.token,
-            "v": VK_API_VERSION,
-            "owner_id": self.user_id,
-            "count": 1
-        }
-        
-        try:
-            response2 = requests.get(url2, params=params2, headers=self.headers)
-            data2 = response2.json()
-            
-            if "response" in data2:
-                count2 = data2["response"]["count"]
-                test_results.append({"test": "audio.get", "success": True, "count": count2})
-            else:
-                error_msg2 = data2.get("error", {}).get("error_msg", "Неизвестная ошибка")
-                error_code2 = data2.get("error", {}).get("error_code", 0)
-                test_results.append({"test": "audio.get", "success": False, "error": error_msg2, "code": error_code2})
-        except Exception as e:
-            test_results.append({"test": "audio.get", "success": False, "error": str(e)})
+        # Тест 2 и 3: Проверка методов getPlaylists и audio.get
+        for method in ("audio.getPlaylists", "audio.get"):
+            try:
+                # Диагностика проверяет доступ сейчас, а не по ответу из кэша
+                response = self.call(method, refresh=True, owner_id=self.user_id, count=1)
+                test_results.append({"test": method, "success": True, "count": response["count"]})
+            except VKAPIError as e:
+                test_results.append({"test": method, "success": False, "error": e.error_msg, "code": e.error_code})
         
         return {"success": True, "tests": test_results}